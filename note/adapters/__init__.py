@@ -1,15 +1,24 @@
+import bisect
 import os.path
+import queue
+import threading
+import time
 from contextlib import contextmanager
 
-import requests
-from django.conf import settings
+from django.db import connections
 
 from note.adapters.base_adapter import BaseAdapter
 from note.adapters.django_server_adapter import DjangoServerAdapter
 from note.adapters.firestore_adapter import FirestoreAdapter
 from note.adapters.github_adapter import GithubAdapter
+from note.adapters.http_client import get_http_client
+from note.adapters.registry import storage_registry
 from note.adapters.typesense_adapter import TypesenseAdapter
 
+COPY_QUEUE_TIMEOUT = 0.5
+COPY_MODE_FULL = 'full'
+COPY_MODE_DIFF = 'diff'
+
 
 def download_from_github_directory(owner, repo, directory, token):
     graphql = """query getStartAndEndPoints {{
@@ -28,7 +37,7 @@ def download_from_github_directory(owner, repo, directory, token):
     }}
   }}
 }}""".format(owner, repo, directory)
-    response = requests.post('https://api.github.com/graphql', json={'query': graphql}, headers={
+    response = get_http_client('github').post('https://api.github.com/graphql', json={'query': graphql}, headers={
         'Content-Type': 'application/json',
         'Authorization': 'bearer {}'.format(token),
         'User-Agent': 'test',
@@ -52,29 +61,153 @@ def download_from_github_directory(owner, repo, directory, token):
             yield file_name, file_content
 
 
-def run_initiator(source_from, source_to):
-    portion_size = 0
-    total_size = 0
-    count_on_page = 100
-    with get_storage_service(source_from) as (downloader, _), get_storage_service(source_to) as (uploader, _):
-        uploader.clear()
-
-        notes, meta = downloader.get_list(1, count_on_page)
-        for num_page in range(1, meta['num_pages'] + 1):
-            for note in downloader.get_list(num_page, count_on_page)[0] if num_page > 1 else notes:
-                file_name, file_content = note['title'], note['content']
-                uploader.add_to_portion(file_name, file_content)
-                portion_size += 1
-                if portion_size == uploader.MAX_PORTION_SIZE:
-                    uploader.commit()
-                    total_size += portion_size
-                    portion_size = 0
-                    yield total_size
-
-        if portion_size:
-            uploader.commit()
+def get_changed_titles(downloader, uploader):
+    """Compare hashes of notes of two storages.
+
+    :return: titles of notes which are new or changed in `downloader`, and titles of notes absent in it
+    """
+    hashes_from = downloader.get_hashes()
+    hashes_to = uploader.get_hashes()
+    changed_titles = sorted(title for title, content_hash in hashes_from.items() if hashes_to.get(title) != content_hash)
+    removed_titles = sorted(hashes_to.keys() - hashes_from.keys())
+    return changed_titles, removed_titles
+
+
+def run_initiator(source_from, source_to, concurrency=None, mode=COPY_MODE_FULL, after=None):
+    """Copy all notes from one storage into another one.
+
+    In the full mode, the storage `source_to` is cleared and all notes are copied. In the differential mode,
+    hashes of contents are compared, and only new and changed notes are copied, and notes absent
+    in `source_from` are deleted, so cost of the copying depends on the size of the change.
+
+    Reading overlaps with writing: a producer thread reads notes by portions into a bounded queue,
+    and `concurrency` consumer threads write portions, each by its own adapter. By default, concurrency is
+    taken from the adapter of `source_to`. The queue keeps not more than two portions per consumer,
+    so a fast source waits for a slow destination.
+    Yields total count of copied notes, speed in notes per second and the cursor after every written portion.
+    The cursor is a title such that all notes up to it are written. Pass it as `after` to resume the copying:
+    the storage `source_to` isn't cleared again then.
+    """
+    changed_titles = None
+    with get_storage_service(source_to, shared=False) as (uploader, _):
+        portion_size = uploader.MAX_PORTION_SIZE
+        concurrency = concurrency or uploader.get_write_concurrency()
+        if mode == COPY_MODE_DIFF:
+            with get_storage_service(source_from, shared=False) as (downloader, _):
+                changed_titles, removed_titles = get_changed_titles(downloader, uploader)
+
+            if after is not None:
+                changed_titles = changed_titles[bisect.bisect_right(changed_titles, after):]
+
+            for index in range(0, len(removed_titles), portion_size):
+                uploader.delete_many(removed_titles[index:index + portion_size])
+        elif after is None:
+            uploader.clear()
+
+    portions = queue.Queue(maxsize=concurrency * 2)
+    results = queue.Queue()
+    stop_event = threading.Event()
+
+    def put_portion(portion):
+        while not stop_event.is_set():
+            try:
+                portions.put(portion, timeout=COPY_QUEUE_TIMEOUT)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def produce():
+        # portions are numbered to know which ones are written before the cursor
+        number = 0
+        try:
+            with get_storage_service(source_from, shared=False) as (downloader, _):
+                if changed_titles is not None:
+                    for index in range(0, len(changed_titles), portion_size):
+                        titles = changed_titles[index:index + portion_size]
+                        if not put_portion((number, titles[-1], downloader.get_many(titles))):
+                            return
+
+                        number += 1
+
+                    return
+
+                portion = []
+                for note in downloader.iter_notes(after=after, limit=portion_size):
+                    portion.append(note)
+                    if len(portion) == portion_size:
+                        if not put_portion((number, portion[-1]['title'], portion)):
+                            return
+
+                        number += 1
+                        portion = []
+
+                if portion:
+                    put_portion((number, portion[-1]['title'], portion))
+        except Exception as error:
+            results.put(error)
+        finally:
+            for _ in range(concurrency):
+                put_portion(None)
+
+            connections.close_all()
+
+    def consume():
+        try:
+            with get_storage_service(source_to, shared=False) as (uploader, _):
+                while not stop_event.is_set():
+                    try:
+                        portion = portions.get(timeout=COPY_QUEUE_TIMEOUT)
+                    except queue.Empty:
+                        continue
+
+                    if portion is None:
+                        break
+
+                    number, cursor, notes = portion
+                    for note in notes:
+                        uploader.add_to_portion(note['title'], note['content'])
 
-    yield total_size + portion_size
+                    uploader.commit()
+                    results.put((number, cursor, len(notes)))
+        except Exception as error:
+            results.put(error)
+        finally:
+            results.put(None)
+            connections.close_all()
+
+    threads = [threading.Thread(target=produce)]
+    threads.extend(threading.Thread(target=consume) for _ in range(concurrency))
+    start_time = time.monotonic()
+    for thread in threads:
+        thread.start()
+
+    total_count = 0
+    finished_count = 0
+    written_cursors = {}
+    next_number = 0
+    cursor = after
+    try:
+        while finished_count < concurrency:
+            result = results.get()
+            if result is None:
+                finished_count += 1
+            elif isinstance(result, Exception):
+                raise result
+            else:
+                number, portion_cursor, count = result
+                written_cursors[number] = portion_cursor
+                while next_number in written_cursors:
+                    cursor = written_cursors.pop(next_number)
+                    next_number += 1
+
+                total_count += count
+                yield total_count, total_count / max(time.monotonic() - start_time, 1e-6), cursor
+    finally:
+        stop_event.set()
+        for thread in threads:
+            thread.join()
 
 
 def get_service_names(add_class=False):
@@ -92,30 +225,21 @@ def service_name_to_class(service_name):
 
 
 @contextmanager
-def get_storage_service(source=None, user=None):
-    """Функция получения объекта базы заметок"""
-    from note.models import NoteStorageServiceModel
-
-    storage = None
-    if user and user.is_authenticated and source:
-        storage = NoteStorageServiceModel.objects.filter(user=user, source=source).first()
-    elif user and user.is_authenticated:
-        storage = NoteStorageServiceModel.objects.filter(user=user, is_default=True).first()
-    elif source:
-        storage = NoteStorageServiceModel.objects.filter(source=source).first()
-
-    if not storage:
-        storage = NoteStorageServiceModel.objects.filter(source=settings.DEFAULT_SOURCE_CODE).first()
-        if not storage:
-            raise Exception(f'not found default knowledge base "{settings.DEFAULT_SOURCE_CODE}"')
-
-    service_name = storage.service
-    service_credentials = storage.credentials
-    source = storage.source
-
-    uploader_class = service_name_to_class(service_name)
-    uploader = uploader_class(storage, **service_credentials)
+def get_storage_service(source=None, user=None, shared=True):
+    """Функция получения объекта базы заметок.
+
+    By default, the adapter is shared between requests by `storage_registry` and isn't closed after using.
+    Use `shared=False` for long operations which keep a state in the adapter, e.g. portions of copying.
+    """
+    storage = storage_registry.get_storage(source, user)
+    if shared:
+        with storage_registry.use_adapter(storage) as uploader:
+            yield uploader, storage.source
+
+        return
+
+    uploader = storage_registry.build_adapter(storage)
     try:
-        yield uploader, source
+        yield uploader, storage.source
     finally:
         uploader.close()
@@ -1,8 +1,17 @@
 from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import resolve_url
 
+COUNT_CACHE_TIMEOUT = 60
+
+
+def get_count_cache_key(storage_id):
+    return f'note:count:{storage_id}'
+
 
 class BaseAdapter:
+    WRITE_CONCURRENCY = 1
+
     def __init__(self, storage):
         from note.models import Note
         self.storage = storage
@@ -11,9 +20,51 @@ class BaseAdapter:
     def close(self):
         pass
 
+    def get_write_concurrency(self):
+        """Return count of threads which may write portions into the storage at once.
+
+        It may be set per adapter by `NOTE_WRITE_CONCURRENCY` setting, e.g. `{'Firestore': 8}`
+        """
+        concurrency = getattr(settings, 'NOTE_WRITE_CONCURRENCY', {})
+        return concurrency.get(self.__class__.__name__[:-7], self.WRITE_CONCURRENCY)
+
     @staticmethod
     def total_count_objects_to_count_pages(count_objects, count_on_page):
-        return (count_objects // count_on_page) + 1 if count_objects % count_on_page > 0 else 0
+        return (count_objects + count_on_page - 1) // count_on_page
+
+    def get_cached_count(self, count_function):
+        """Return total count of notes of a storage. It is cached until notes are added or deleted"""
+        key = get_count_cache_key(self.storage.pk)
+        count = cache.get(key)
+        if count is None:
+            count = count_function()
+            cache.set(key, count, COUNT_CACHE_TIMEOUT)
+
+        return count
+
+    def drop_cached_count(self):
+        cache.delete(get_count_cache_key(self.storage.pk))
+
+    @staticmethod
+    def paginate(objects, page_number, count_on_page, with_count=True, count=None):
+        """Return objects of the page and meta of pagination.
+
+        Without counting, one extra object is fetched to know if the next page exists,
+        so meta contains `has_next` only.
+        """
+        from django.core.paginator import Paginator
+        if with_count:
+            paginator = Paginator(objects, count_on_page)
+            if count is not None:
+                paginator.count = count
+
+            page = paginator.page(page_number)
+            meta = {'num_pages': paginator.num_pages, 'count': paginator.count, 'has_next': page.has_next()}
+            return list(page.object_list), meta
+
+        offset = (max(page_number, 1) - 1) * count_on_page
+        objects = list(objects[offset:offset + count_on_page + 1])
+        return objects[:count_on_page], {'has_next': len(objects) > count_on_page}
 
     def get_note_url(self, title):
         """Return a note URL by `title`"""
@@ -35,7 +86,8 @@ class BaseAdapter:
         :param title: title of a note. Must be unique value
         :param content: content of a note
         :param user: creator of a note
-        :return: `dict` like `{'title': '', 'content': ''}`
+        :return: `dict` like `{'title': '', 'content': ''}`. Adapters keeping notes in `Note` add the created
+            instance as `instance`
         """
         raise NotImplementedError('Adding notes is not supported by this adapter')
 
@@ -47,6 +99,126 @@ class BaseAdapter:
         """Delete a note from a storage by `title`"""
         raise NotImplementedError('Deleting notes is not supported by this adapter')
 
-    def get_list(self, page_number: int, count_on_page: int) -> tuple[dict, dict]:
-        """Return a list of notes from a storage by """
+    def get_list(self, page_number: int, count_on_page: int, with_count: bool = True) -> tuple[dict, dict]:
+        """Return a list of notes from a storage by a page.
+
+        :return: notes and meta like `{'num_pages': 0, 'count': 0, 'has_next': False}`.
+          If `with_count` is `False`, only `has_next` is guaranteed
+        """
         raise NotImplementedError('Getting notes\' list is not supported by this adapter')
+
+    def get_page_by_ids(self, note_ids, page_number, count_on_page, fields, with_count):
+        """Return notes of the page of the ordered queryset of their ids and meta of pagination"""
+        note_ids, meta = self.paginate(note_ids, page_number, count_on_page, with_count)
+        values = self.queryset.filter(pk__in=note_ids).values('pk', *{'title', *fields})
+        notes_by_id = {note['pk']: note for note in values}
+        notes = [notes_by_id[note_id] for note_id in note_ids if note_id in notes_by_id]
+        for note in notes:
+            del note['pk']
+            note['url'] = self.get_note_url(note['title'])
+            if 'title' not in fields:
+                del note['title']
+
+        return notes, meta
+
+    def search_fuzzy(
+        self,
+        operator,
+        count_on_page,
+        page_number,
+        fields,
+        file_name=None,
+        file_content=None,
+        with_count=True,
+    ) -> tuple[list, dict]:
+        """Search notes tolerating typos, the most similar notes first. Arguments are the same as of `search`.
+
+        This implementation searches as usual, adapters override it if they have a trigram index.
+        """
+        return self.search(operator, count_on_page, page_number, fields, file_name, file_content, with_count)
+
+    def search_by_tag(
+        self, tag: str, count_on_page: int, page_number: int, fields, with_count: bool = True,
+    ) -> tuple[list, dict]:
+        """Return notes with the hashtag `tag` by a page, ordered by title.
+
+        This implementation reads all notes, adapters override it if tags are indexed,
+        e.g. by `NoteTagsIndexMixin` for notes kept in the database.
+
+        :param tag: hashtag with or without the leading `#`
+        :return: notes and meta like `get_list`
+        """
+        from note.models import get_note_tags, normalize_tag
+        tag = normalize_tag(tag)
+        notes = [note for note in self.iter_notes(limit=500) if tag in get_note_tags(note['content'])]
+        notes, meta = self.paginate(notes, page_number, count_on_page, with_count)
+        return [
+            {**{field: note[field] for field in fields if field in note}, 'url': self.get_note_url(note['title'])}
+            for note in notes
+        ], meta
+
+    def get_tag_counts(self, limit: int) -> list:
+        """Return the most used hashtags of a storage with counts of their notes.
+
+        This implementation reads all notes, adapters override it if tags are indexed.
+
+        :return: `list` of `dict` like `{'tag': '', 'count': 0}`
+        """
+        from collections import Counter
+        from note.models import get_note_tags
+        counts = Counter()
+        for note in self.iter_notes(limit=500):
+            counts.update(get_note_tags(note['content']))
+
+        tags = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [{'tag': tag, 'count': count} for tag, count in tags]
+
+    def suggest(self, prefix: str, limit: int) -> list:
+        """Return titles of notes starting with `prefix` ignoring case.
+
+        This implementation looks up titles of notes kept in the database, i.e. notes of the own storage
+        and mirrored notes of an external storage.
+        """
+        from note.suggest import title_indexes
+        return title_indexes.get(self.storage.pk).find(prefix, limit)
+
+    def get_hashes(self) -> dict:
+        """Return hashes of contents of all notes of a storage by their titles.
+
+        It's used as a manifest of a storage for a differential copying. This implementation reads all notes,
+        adapters override it if hashes are stored.
+        """
+        from note.models import get_content_hash
+        return {note['title']: get_content_hash(note['content']) for note in self.iter_notes(limit=500)}
+
+    def get_many(self, titles: list) -> list:
+        """Return notes by titles. Not existing notes are skipped
+
+        :return: `list` of `dict` like `{'title': '', 'content': ''}`
+        """
+        notes = (self.get(title) for title in titles)
+        return [{'title': note['title'], 'content': note['content']} for note in notes if note]
+
+    def delete_many(self, titles: list):
+        """Delete notes from a storage by titles"""
+        for title in titles:
+            self.delete(title)
+
+    def iter_notes(self, after: str = None, limit: int = 100):
+        """Iterate over all notes of a storage ordered by title, starting after the note with title `after`.
+
+        Notes are fetched by portions of `limit` notes. The title of the last yielded note is the cursor
+        to continue the iteration. Adapters override it with native keyset pagination;
+        this implementation falls back to `get_list`.
+
+        :return: generator of `dict` like `{'title': '', 'content': ''}`
+        """
+        page_number = 1
+        meta = None
+        while meta is None or page_number <= meta['num_pages']:
+            notes, meta = self.get_list(page_number, limit)
+            for note in notes:
+                if after is None or note['title'] > after:
+                    yield note
+
+            page_number += 1
@@ -1,29 +1,566 @@
-from django.db.models import Q
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Max, Q, Sum, When
+from django.db.models.expressions import RawSQL
 
 from note.adapters.base_adapter import BaseAdapter
+from note.adapters.mixins import NoteTagsIndexMixin
 
 
-class DjangoServerAdapter(BaseAdapter):
+class ContainsSearchBackend:
+    """Search by a substring of `search_title` and `search_content`. It is supported by every database engine.
+
+    The fuzzy search expands every token of a query to similar terms of the vocabulary `NoteTerm`,
+    finds candidates containing the terms by the index of the backend, and ranks them by similarity.
+    """
+    name = 'contains'
+    FUZZY_SIMILARITY_THRESHOLD = 0.3
+    FUZZY_MAX_TERMS = 10
+    FUZZY_MAX_CANDIDATES = 1000
+    FUZZY_TITLE_WEIGHT = 2
+
+    def install(self, schema_editor):
+        """Create database objects of the backend. It must be safe to call it repeatedly"""
+
+    def uninstall(self, schema_editor):
+        """Drop database objects of the backend"""
+
+    def repair(self):
+        """Reinstall database objects of the backend, which are lost after migrations. Return `True` if repaired"""
+        return False
+
+    def install_fuzzy(self, schema_editor):
+        """Create the index of the fuzzy search. It must be safe to call it repeatedly"""
+        from note.models import NoteTerm
+        NoteTerm.rebuild()
+
+    def rebuild(self):
+        """Rebuild the index from existing notes"""
+        from note.models import NoteTerm
+        NoteTerm.rebuild()
+
+    def index_notes(self, notes):
+        """Update the index for the saved notes. Deleted notes must be dropped from the index by the database"""
+        from note.models import NoteTerm
+        NoteTerm.index_notes(notes)
+
+    def search(self, storage, operator, file_name=None, file_content=None):
+        """Return a queryset of id of found notes of the storage, ordered by relevance"""
+        from note.models import Note, prepare_to_search
+        filter = {}
+        if file_name:
+            file_name = prepare_to_search(file_name)
+            filter['search_title__contains'] = file_name
+
+        if file_content:
+            file_content = prepare_to_search(file_content)
+            filter['search_content__contains'] = file_content
+
+        queryset = Note.objects.filter(storage=storage)
+        if len(filter) == 2 and operator == 'or':
+            queryset = queryset.filter(Q(search_title__contains=file_name) | Q(search_content__contains=file_content))
+        else:
+            queryset = queryset.filter(**filter)
+
+        return queryset.order_by('title').values_list('pk', flat=True)
+
+    def search_fuzzy(self, storage, operator, file_name=None, file_content=None):
+        """Return a list of id of found notes of the storage, ordered by similarity to the query"""
+        from note.models import Note, NoteTerm
+        tokens = self.get_tokens(file_name, file_content)
+        if tokens is None:
+            return []
+
+        title_terms, content_terms = (
+            [
+                dict(NoteTerm.find_similar(storage, token, self.FUZZY_SIMILARITY_THRESHOLD, self.FUZZY_MAX_TERMS))
+                for token in field_tokens
+            ]
+            for field_tokens in tokens
+        )
+        note_ids = list(
+            self.find_fuzzy_candidates(storage, operator, title_terms, content_terms)[:self.FUZZY_MAX_CANDIDATES],
+        )
+        ranks = {}
+        notes = Note.objects.filter(pk__in=note_ids).values_list('pk', 'title', 'search_title', 'search_content')
+        for pk, title, search_title, search_content in notes:
+            rank = 0
+            for weight, value, field_terms in (
+                (self.FUZZY_TITLE_WEIGHT, search_title, title_terms),
+                (1, search_content, content_terms),
+            ):
+                for token_terms in field_terms:
+                    similarities = (similarity for term, similarity in token_terms.items() if term in value)
+                    rank += weight * max(similarities, default=0)
+
+            ranks[pk] = (-rank, title)
+
+        return sorted(ranks, key=ranks.get)
+
+    def find_fuzzy_candidates(self, storage, operator, title_terms, content_terms):
+        """Return a queryset of id of notes of the storage containing terms similar to the tokens of the query.
+
+        Terms of a field are `dict` like `{term: similarity}` per token. A field matches if it contains a similar
+        term for every token. Fields are combined by the operator. A token without similar terms matches nothing.
+        """
+        from note.models import Note
+        conditions = []
+        for field, field_terms in (('search_title', title_terms), ('search_content', content_terms)):
+            if not field_terms:
+                continue
+
+            condition = Q()
+            for token_terms in field_terms:
+                token_condition = Q(pk__in=[])
+                for term in token_terms:
+                    token_condition |= Q(**{f'{field}__contains': term})
+
+                condition &= token_condition
+
+            conditions.append(condition)
+
+        if not conditions:
+            return Note.objects.none().values_list('pk', flat=True)
+
+        return Note.objects.filter(self.combine(operator, conditions), storage=storage).values_list('pk', flat=True)
+
+    @staticmethod
+    def combine(operator, conditions):
+        condition = conditions[0]
+        for other_condition in conditions[1:]:
+            condition = condition | other_condition if operator == 'or' else condition & other_condition
+
+        return condition
+
+    @staticmethod
+    def get_tokens(file_name, file_content):
+        """Return unique tokens of the query fields. `None` means the query can't be searched by tokens"""
+        from note.models import tokenize
+        title_tokens = list(dict.fromkeys(tokenize(file_name))) if file_name else []
+        content_tokens = list(dict.fromkeys(tokenize(file_content))) if file_content else []
+        if (file_name and not title_tokens) or (file_content and not content_tokens):
+            return None
+
+        return title_tokens, content_tokens
+
+
+class TokenSearchBackend(ContainsSearchBackend):
+    """Search by the inverted index, which is kept in `NoteToken`"""
+    name = 'token'
+    TITLE_TOKEN_WEIGHT = 10
+
+    def rebuild(self):
+        from note.models import Note, NoteToken
+        super().rebuild()
+        NoteToken.objects.all().delete()
+        notes = []
+        for note in Note.objects.only('pk', 'storage_id', 'title', 'content').iterator():
+            notes.append(note)
+            if len(notes) == 1000:
+                NoteToken.index_notes(notes)
+                notes = []
+
+        NoteToken.index_notes(notes)
+
+    def index_notes(self, notes):
+        from note.models import NoteToken
+        super().index_notes(notes)
+        NoteToken.index_notes(notes)
+
+    def search(self, storage, operator, file_name=None, file_content=None):
+        """Every token of a field must be a prefix of some token of the field of a note"""
+        from note.models import NoteToken
+        tokens = self.get_tokens(file_name, file_content)
+        if tokens is None:
+            return super().search(storage, operator, file_name, file_content)
+
+        lookup = Q()
+        annotations = {}
+        field_conditions = []
+        for field, field_tokens in zip((NoteToken.FIELD_TITLE, NoteToken.FIELD_CONTENT), tokens):
+            if not field_tokens:
+                continue
+
+            field_condition = Q()
+            for num, token in enumerate(field_tokens):
+                token_lookup = Q(field=field, token__startswith=token)
+                lookup |= token_lookup
+                name = f'hit_{field}_{num}'
+                annotations[name] = Max(Case(When(token_lookup, then=1), default=0, output_field=IntegerField()))
+                field_condition &= Q(**{name: 1})
+
+            field_conditions.append(field_condition)
+
+        if not field_conditions:
+            return super().search(storage, operator, file_name, file_content)
+
+        condition = field_conditions[0]
+        for field_condition in field_conditions[1:]:
+            condition = condition | field_condition if operator == 'or' else condition & field_condition
+
+        rank = Sum(
+            Case(
+                When(field=NoteToken.FIELD_TITLE, then=F('weight') * self.TITLE_TOKEN_WEIGHT),
+                default=F('weight'),
+                output_field=IntegerField(),
+            ),
+        )
+        return (
+            NoteToken.objects
+            .filter(lookup, storage=storage)
+            .values('note')
+            .annotate(rank=rank, **annotations)
+            .filter(condition)
+            .order_by('-rank', 'note')
+            .values_list('note', flat=True)
+        )
+
+    def find_fuzzy_candidates(self, storage, operator, title_terms, content_terms):
+        from note.models import NoteToken
+        lookup = Q()
+        annotations = {}
+        field_conditions = []
+        for field, field_terms in ((NoteToken.FIELD_TITLE, title_terms), (NoteToken.FIELD_CONTENT, content_terms)):
+            if not field_terms:
+                continue
+
+            field_condition = Q()
+            for num, token_terms in enumerate(field_terms):
+                token_lookup = Q(field=field, token__in=list(token_terms))
+                lookup |= token_lookup
+                name = f'hit_{field}_{num}'
+                annotations[name] = Max(Case(When(token_lookup, then=1), default=0, output_field=IntegerField()))
+                field_condition &= Q(**{name: 1})
+
+            field_conditions.append(field_condition)
+
+        if not field_conditions:
+            return NoteToken.objects.none().values_list('note', flat=True)
+
+        return (
+            NoteToken.objects
+            .filter(lookup, storage=storage)
+            .values('note')
+            .annotate(**annotations)
+            .filter(self.combine(operator, field_conditions))
+            .values_list('note', flat=True)
+        )
+
+
+class Fts5SearchBackend(ContainsSearchBackend):
+    """Search by the SQLite FTS5 virtual table, which is kept in sync with notes by triggers.
+
+    SQLite rebuilds a table to alter most of its columns, so triggers are dropped by such a migration
+    of `Note`. They are reinstalled after migrations by `repair`.
+    """
+    name = 'fts5'
+    TABLE = 'note_fts'
+    TRIGGERS = (f'{TABLE}_insert', f'{TABLE}_delete', f'{TABLE}_update')
+    TITLE_WEIGHT = 10.0
+    SQL_INSTALL = (
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+            search_title, search_content,
+            content='app_note_note', content_rowid='id', tokenize='unicode61 remove_diacritics 0'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_insert AFTER INSERT ON app_note_note BEGIN
+            INSERT INTO {TABLE}(rowid, search_title, search_content)
+            VALUES (new.id, new.search_title, new.search_content);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_delete AFTER DELETE ON app_note_note BEGIN
+            INSERT INTO {TABLE}({TABLE}, rowid, search_title, search_content)
+            VALUES ('delete', old.id, old.search_title, old.search_content);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_update AFTER UPDATE OF search_title, search_content
+        ON app_note_note BEGIN
+            INSERT INTO {TABLE}({TABLE}, rowid, search_title, search_content)
+            VALUES ('delete', old.id, old.search_title, old.search_content);
+            INSERT INTO {TABLE}(rowid, search_title, search_content)
+            VALUES (new.id, new.search_title, new.search_content);
+        END""",
+    )
+    SQL_UNINSTALL = (
+        f'DROP TRIGGER IF EXISTS {TABLE}_insert',
+        f'DROP TRIGGER IF EXISTS {TABLE}_delete',
+        f'DROP TRIGGER IF EXISTS {TABLE}_update',
+        f'DROP TABLE IF EXISTS {TABLE}',
+    )
+
+    def install(self, schema_editor):
+        for sql in self.SQL_INSTALL:
+            schema_editor.execute(sql)
+
+        schema_editor.execute(f"INSERT INTO {self.TABLE}({self.TABLE}) VALUES ('rebuild')")
+
+    def uninstall(self, schema_editor):
+        for sql in self.SQL_UNINSTALL:
+            schema_editor.execute(sql)
+
+    def repair(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'app_note_note'")
+            triggers = {row[0] for row in cursor.fetchall()}
+
+        if triggers.issuperset(self.TRIGGERS):
+            return False
+
+        with connection.schema_editor() as schema_editor:
+            self.install(schema_editor)
+
+        return True
+
+    def rebuild(self):
+        super().rebuild()
+        with connection.schema_editor() as schema_editor:
+            self.install(schema_editor)
+
+    @staticmethod
+    def build_match(operator, tokens):
+        parts = []
+        for column, field_tokens in zip(('search_title', 'search_content'), tokens):
+            if field_tokens:
+                phrases = ' AND '.join(f'"{token}"*' for token in field_tokens)
+                parts.append(f'{column} : ({phrases})')
+
+        return f' {operator.upper()} '.join(parts)
+
+    def search(self, storage, operator, file_name=None, file_content=None):
+        tokens = self.get_tokens(file_name, file_content)
+        match = self.build_match(operator, tokens) if tokens is not None else None
+        if not match:
+            return super().search(storage, operator, file_name, file_content)
+
+        from note.models import Note
+        return (
+            Note.objects
+            .filter(storage=storage)
+            .extra(
+                tables=[self.TABLE],
+                where=[f'{self.TABLE}.rowid = app_note_note.id', f'{self.TABLE} MATCH %s'],
+                params=[match],
+            )
+            .annotate(rank=RawSQL(f'bm25({self.TABLE}, %s, 1.0)', (self.TITLE_WEIGHT,)))
+            .order_by('rank', 'title')
+            .values_list('pk', flat=True)
+        )
+
+    def find_fuzzy_candidates(self, storage, operator, title_terms, content_terms):
+        from note.models import Note
+        parts = []
+        for column, field_terms in zip(('search_title', 'search_content'), (title_terms, content_terms)):
+            if not field_terms:
+                continue
+
+            if not all(field_terms):
+                # a token without similar terms matches nothing
+                if operator == 'or':
+                    continue
+
+                return Note.objects.none().values_list('pk', flat=True)
+
+            groups = ' AND '.join(
+                '({})'.format(' OR '.join(f'"{term}"' for term in token_terms)) for token_terms in field_terms
+            )
+            parts.append(f'{column} : ({groups})')
+
+        if not parts:
+            return Note.objects.none().values_list('pk', flat=True)
+
+        return (
+            Note.objects
+            .filter(storage=storage)
+            .extra(
+                tables=[self.TABLE],
+                where=[f'{self.TABLE}.rowid = app_note_note.id', f'{self.TABLE} MATCH %s'],
+                params=[f' {operator.upper()} '.join(parts)],
+            )
+            .values_list('pk', flat=True)
+        )
+
+
+class PostgresSearchBackend(ContainsSearchBackend):
+    """Search by the `tsvector` column with GIN index, which is filled by a trigger.
+
+    The fuzzy search uses GIN trigram indexes of `pg_trgm` extension.
+    """
+    name = 'postgresql'
+    SQL_VECTOR = (
+        "setweight(to_tsvector('simple', coalesce({0}search_title, '')), 'A')"
+        " || setweight(to_tsvector('simple', coalesce({0}search_content, '')), 'B')"
+    )
+    SQL_INSTALL = (
+        'ALTER TABLE app_note_note ADD COLUMN IF NOT EXISTS search_vector tsvector',
+        'CREATE INDEX IF NOT EXISTS index_note_search_vector ON app_note_note USING GIN (search_vector)',
+        f"""CREATE OR REPLACE FUNCTION note_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {SQL_VECTOR.format('NEW.')};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql""",
+        'DROP TRIGGER IF EXISTS note_search_vector_trigger ON app_note_note',
+        """CREATE TRIGGER note_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF search_title, search_content ON app_note_note
+        FOR EACH ROW EXECUTE FUNCTION note_search_vector_update()""",
+    )
+    SQL_UNINSTALL = (
+        'DROP TRIGGER IF EXISTS note_search_vector_trigger ON app_note_note',
+        'DROP FUNCTION IF EXISTS note_search_vector_update()',
+        'ALTER TABLE app_note_note DROP COLUMN IF EXISTS search_vector',
+        'DROP INDEX IF EXISTS index_note_search_title_trgm',
+        'DROP INDEX IF EXISTS index_note_search_content_trgm',
+    )
+    SQL_INSTALL_FUZZY = (
+        'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+        'CREATE INDEX IF NOT EXISTS index_note_search_title_trgm'
+        ' ON app_note_note USING GIN (search_title gin_trgm_ops)',
+        'CREATE INDEX IF NOT EXISTS index_note_search_content_trgm'
+        ' ON app_note_note USING GIN (search_content gin_trgm_ops)',
+    )
+
+    def install(self, schema_editor):
+        for sql in self.SQL_INSTALL:
+            schema_editor.execute(sql)
+
+        self.install_fuzzy(schema_editor)
+        self.fill(schema_editor)
+
+    def install_fuzzy(self, schema_editor):
+        for sql in self.SQL_INSTALL_FUZZY:
+            schema_editor.execute(sql)
+
+    def index_notes(self, notes):
+        """Both indexes are kept by the database"""
+
+    def uninstall(self, schema_editor):
+        for sql in self.SQL_UNINSTALL:
+            schema_editor.execute(sql)
+
+    def fill(self, schema_editor):
+        schema_editor.execute(f'UPDATE app_note_note SET search_vector = {self.SQL_VECTOR.format("")}')
+
+    def rebuild(self):
+        with connection.schema_editor() as schema_editor:
+            self.install(schema_editor)
+
+    @staticmethod
+    def build_query(operator, tokens):
+        parts = []
+        for weight, field_tokens in zip('AB', tokens):
+            if field_tokens:
+                parts.append('({})'.format(' & '.join(f"'{token}':*{weight}" for token in field_tokens)))
+
+        return (' | ' if operator == 'or' else ' & ').join(parts)
+
+    def search(self, storage, operator, file_name=None, file_content=None):
+        tokens = self.get_tokens(file_name, file_content)
+        query = self.build_query(operator, tokens) if tokens is not None else None
+        if not query:
+            return super().search(storage, operator, file_name, file_content)
+
+        from note.models import Note
+        return (
+            Note.objects
+            .filter(storage=storage)
+            .extra(where=["search_vector @@ to_tsquery('simple', %s)"], params=[query])
+            .annotate(rank=RawSQL("ts_rank(search_vector, to_tsquery('simple', %s))", (query,)))
+            .order_by('-rank', 'title')
+            .values_list('pk', flat=True)
+        )
+
+    def search_fuzzy(self, storage, operator, file_name=None, file_content=None):
+        """The title is compared as a whole and the content by its most similar words"""
+        from note.models import Note, prepare_to_search
+        conditions, params, ranks, rank_params = [], [], [], []
+        if file_name:
+            file_name = prepare_to_search(file_name)
+            conditions.append('search_title %% %s')
+            params.append(file_name)
+            ranks.append('similarity(search_title, %s) * %s')
+            rank_params.extend((file_name, self.FUZZY_TITLE_WEIGHT))
+
+        if file_content:
+            file_content = prepare_to_search(file_content)
+            conditions.append('%s <%% search_content')
+            params.append(file_content)
+            ranks.append('word_similarity(%s, search_content)')
+            rank_params.append(file_content)
+
+        if not conditions:
+            return []
+
+        return (
+            Note.objects
+            .filter(storage=storage)
+            .extra(where=[(' OR ' if operator == 'or' else ' AND ').join(conditions)], params=params)
+            .annotate(rank=RawSQL(' + '.join(ranks), rank_params))
+            .order_by('-rank', 'title')
+            .values_list('pk', flat=True)[:self.FUZZY_MAX_CANDIDATES]
+        )
+
+
+SEARCH_BACKENDS = {
+    backend_class.name: backend_class
+    for backend_class in (ContainsSearchBackend, TokenSearchBackend, Fts5SearchBackend, PostgresSearchBackend)
+}
+VENDOR_SEARCH_BACKENDS = {
+    'sqlite': Fts5SearchBackend.name,
+    'postgresql': PostgresSearchBackend.name,
+}
+search_backends = {}
+
+
+def get_search_backend_name(vendor):
+    """Return a name of search backend for the database engine. It may be set by `NOTE_SEARCH_BACKEND` setting"""
+    return getattr(settings, 'NOTE_SEARCH_BACKEND', None) or VENDOR_SEARCH_BACKENDS.get(vendor, TokenSearchBackend.name)
+
+
+def get_search_backend():
+    """Return the search backend for the default database.
+
+    If the native full-text table is not installed (e.g. SQLite is built without FTS5), the token index is used.
+    """
+    backend = search_backends.get(connection.vendor)
+    if backend is None:
+        backend_class = SEARCH_BACKENDS[get_search_backend_name(connection.vendor)]
+        if backend_class is Fts5SearchBackend and Fts5SearchBackend.TABLE not in connection.introspection.table_names():
+            backend_class = TokenSearchBackend
+
+        backend = search_backends[connection.vendor] = backend_class()
+
+    return backend
+
+
+class DjangoServerAdapter(NoteTagsIndexMixin, BaseAdapter):
     verbose_name = 'Микросервис заметок'
     MAX_PORTION_SIZE = 400
-    portion = []
+    WRITE_CONCURRENCY = 4
 
     def __init__(self, storage):
         super().__init__(storage)
+        self.portion = []
+
+    def get_write_concurrency(self):
+        # SQLite allows only one writer at once, so parallel portions would wait for each other
+        return 1 if connection.vendor == 'sqlite' else super().get_write_concurrency()
 
     def clear(self):
         self.queryset.delete()
+        self.drop_cached_count()
 
     def add_to_portion(self, file_name, file_content):
         from note.models import Note
         fields = Note(title=file_name, content=file_content, storage=self.storage)
         fields.fetch_search_fields()
+        fields.fetch_html_fields()
         self.portion.append(fields)
 
     def commit(self):
-        from note.models import Note
-        Note.objects.bulk_create(self.portion, self.MAX_PORTION_SIZE)
+        from note.models import Note, NoteLink, NoteTag
+        notes = Note.bulk_upsert(self.storage, self.portion, self.MAX_PORTION_SIZE)
+        get_search_backend().index_notes(notes)
+        NoteLink.index_notes(notes)
+        NoteTag.index_notes(notes)
         self.portion.clear()
+        self.drop_cached_count()
 
     def search(
         self,
@@ -33,44 +570,41 @@ class DjangoServerAdapter(BaseAdapter):
         fields,
         file_name=None,
         file_content=None,
+        with_count=True,
     ):
-        from django.core.paginator import Paginator
-        from note.models import prepare_to_search
-        filter = {}
-        if file_name:
-            file_name = prepare_to_search(file_name)
-            filter['search_title__contains'] = file_name
-
-        if file_content:
-            file_content = prepare_to_search(file_content)
-            filter['search_content__contains'] = file_content
-
-        notes = self.queryset
-        if len(filter) == 2 and operator == 'or':
-            notes = notes.filter(Q(search_title__contains=file_name) | Q(search_content__contains=file_content))
+        if file_name or file_content:
+            note_ids = get_search_backend().search(self.storage, operator, file_name, file_content)
         else:
-            notes = notes.filter(**filter)
+            note_ids = self.queryset.order_by('title').values_list('pk', flat=True)
 
-        paginator = Paginator(notes, count_on_page)
-        page = paginator.page(page_number)
+        return self.get_page_by_ids(note_ids, page_number, count_on_page, fields, with_count)
 
-        notes = list(page.object_list.values(*fields))
-        for note in notes:
-            note['url'] = self.get_note_url(note['title'])
-
-        return notes, {'num_pages': paginator.num_pages, 'count': paginator.count}
+    def search_fuzzy(
+        self,
+        operator,
+        count_on_page,
+        page_number,
+        fields,
+        file_name=None,
+        file_content=None,
+        with_count=True,
+    ):
+        note_ids = get_search_backend().search_fuzzy(self.storage, operator, file_name, file_content)
+        return self.get_page_by_ids(note_ids, page_number, count_on_page, fields, with_count)
 
     def get(self, title):
         notes = self.queryset.filter(title=title)
         note = notes.first()
-        return {'title': note.title, 'content': note.content, 'user': note.user} if note else None
+        if note:
+            return {'title': note.title, 'content': note.content, 'user': note.user, 'content_html': note.content_html}
 
     def add(self, title, content, user=None):
         from note.models import Note
         note = Note(title=title, content=content, storage=self.storage, user=user)
         note.fetch_search_fields()
+        note.fetch_html_fields()
         note.save()
-        return {'title': note.title, 'content': note.content}
+        return {'title': note.title, 'content': note.content, 'instance': note}
 
     def edit(self, title, new_title=None, new_content=None):
         note = self.queryset.get(title=title)
@@ -81,6 +615,7 @@ class DjangoServerAdapter(BaseAdapter):
 
         if new_content and note.content != new_content:
             note.content = new_content
+            note.fetch_html_fields()
             updated_fields.append('content')
 
         if updated_fields:
@@ -93,15 +628,47 @@ class DjangoServerAdapter(BaseAdapter):
         note = self.queryset.get(title=title)
         note.delete()
 
-    def get_list(self, page_number, count_on_page):
-        from django.core.paginator import Paginator
+    def get_list(self, page_number, count_on_page, with_count=True):
         notes = self.queryset.order_by('title')
-        paginator = Paginator(notes, count_on_page)
-        page = paginator.page(page_number)
+        count = self.get_cached_count(self.queryset.count) if with_count else None
+        notes, meta = self.paginate(notes, page_number, count_on_page, with_count, count)
         return (
             [
-                {'title': note.title, 'content': note.content, 'url': self.get_note_url(note.title)}
-                for note in page.object_list
+                {
+                    'title': note.title,
+                    'content': note.content,
+                    'excerpt_html': note.excerpt_html,
+                    'url': self.get_note_url(note.title),
+                }
+                for note in notes
             ],
-            {'num_pages': paginator.num_pages},
+            meta,
         )
+
+    def get_hashes(self):
+        from note.models import Note, get_content_hash
+        notes = self.queryset.filter(content_hash__isnull=True).only('pk', 'content')
+        while portion := list(notes[:self.MAX_PORTION_SIZE]):
+            for note in portion:
+                note.content_hash = get_content_hash(note.content)
+
+            Note.objects.bulk_update(portion, ['content_hash'])
+
+        return dict(self.queryset.values_list('title', 'content_hash'))
+
+    def get_many(self, titles):
+        return list(self.queryset.filter(title__in=titles).values('title', 'content'))
+
+    def delete_many(self, titles):
+        self.queryset.filter(title__in=titles).delete()
+        self.drop_cached_count()
+
+    def iter_notes(self, after=None, limit=100):
+        notes = self.queryset.order_by('title').values('title', 'content')
+        while True:
+            portion = list((notes.filter(title__gt=after) if after is not None else notes)[:limit])
+            yield from portion
+            if len(portion) < limit:
+                break
+
+            after = portion[-1]['title']
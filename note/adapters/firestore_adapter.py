@@ -1,3 +1,5 @@
+import uuid
+
 from firebase_admin import credentials, delete_app, firestore, initialize_app
 
 from note.adapters.base_adapter import BaseAdapter
@@ -9,13 +11,16 @@ class FirestoreAdapter(NoteBackuperMixin, BaseAdapter):
     verbose_name = 'Firestore'
     serializer = UploaderFirestoreSerializer
     MAX_PORTION_SIZE = 500
+    WRITE_CONCURRENCY = 4
 
     def __init__(self, storage, certificate):
         super().__init__(storage)
         cred = credentials.Certificate(certificate)
-        self.app = initialize_app(cred)
-        self.db = firestore.client()
+        # every adapter has its own app, so adapters of several storages may live together
+        self.app = initialize_app(cred, name=f'note-storage-{uuid.uuid4()}')
+        self.db = firestore.client(self.app)
         self.batch = None
+        self.portion = []
         self.collection = self.db.collection('knowledge')
         self.field = 'text'
 
@@ -24,6 +29,7 @@ class FirestoreAdapter(NoteBackuperMixin, BaseAdapter):
 
     def clear(self):
         self.b_clear()
+        self.drop_cached_count()
 
     def add_to_portion(self, file_name, file_content):
         ref = self.collection.document(file_name)
@@ -31,10 +37,34 @@ class FirestoreAdapter(NoteBackuperMixin, BaseAdapter):
             self.batch = self.db.batch()
 
         self.batch.set(ref, {self.field: file_content})
+        self.portion.append({'title': file_name, 'content': file_content})
 
     def commit(self):
         if self.batch is not None:
             self.batch.commit()
+            self.b_upsert_many(self.portion)
+            self.batch = None
+            self.portion = []
+            self.drop_cached_count()
+
+    def get_hashes(self):
+        return self.b_get_hashes()
+
+    def get_many(self, titles):
+        documents = self.db.get_all([self.collection.document(title) for title in titles])
+        return [{'title': document.id, 'content': document.get(self.field)} for document in documents if document.exists]
+
+    def delete_many(self, titles):
+        titles = list(titles)
+        for index in range(0, len(titles), self.MAX_PORTION_SIZE):
+            batch = self.db.batch()
+            for title in titles[index:index + self.MAX_PORTION_SIZE]:
+                batch.delete(self.collection.document(title))
+
+            batch.commit()
+
+        self.b_delete_many(titles)
+        self.drop_cached_count()
 
     def get(self, title):
         ref_document = self.collection.document(title)
@@ -45,12 +75,12 @@ class FirestoreAdapter(NoteBackuperMixin, BaseAdapter):
             return {'title': ref_document.id, 'content': content, 'user': None}
 
     def add(self, title, content, user=None):
-        self.b_add(title, content, user)
         self.collection.document(title).set({self.field: content})
+        self.b_add(title, content, user)
+        self.drop_cached_count()
         return {'title': title, 'content': content}
 
     def edit(self, title, new_title=None, new_content=None):
-        self.b_edit(title, new_title, new_content)
         ref_document = self.collection.document(title)
         document = ref_document.get()
         updated_fields = []
@@ -66,19 +96,38 @@ class FirestoreAdapter(NoteBackuperMixin, BaseAdapter):
 
             updated_fields.append('content')
 
+        self.b_edit(title, new_title, new_content or document.get(self.field))
         return updated_fields
 
-    def get_list(self, page_number, count_on_page):
-        notes = []
+    def get_list(self, page_number, count_on_page, with_count=True):
         offset = (page_number - 1) * count_on_page
-        for ref_document in self.collection.limit(count_on_page).offset(offset).get():
+        limit = count_on_page if with_count else count_on_page + 1
+        notes = []
+        for ref_document in self.collection.limit(limit).offset(offset).get():
             notes.append({'title': ref_document.id, 'content': ref_document.get(self.field)})
 
-        num_pages = self.total_count_objects_to_count_pages(self.collection.count().get()[0][0].value, count_on_page)
+        if not with_count:
+            return notes[:count_on_page], {'has_next': len(notes) > count_on_page}
+
+        count = self.get_cached_count(lambda: self.collection.count().get()[0][0].value)
+        num_pages = self.total_count_objects_to_count_pages(count, count_on_page)
         return (
             notes,
-            {'num_pages': num_pages},
+            {'num_pages': num_pages, 'count': count, 'has_next': page_number < num_pages},
         )
 
+    def iter_notes(self, after=None, limit=100):
+        query = self.collection.order_by('__name__').limit(limit)
+        while True:
+            documents = (query.start_after({'__name__': after}) if after is not None else query).get()
+            for ref_document in documents:
+                yield {'title': ref_document.id, 'content': ref_document.get(self.field)}
+
+            if len(documents) < limit:
+                break
+
+            after = documents[-1].id
+
     def delete(self, title: str):
         self.b_delete(title)
+        self.drop_cached_count()
@@ -1,69 +1,91 @@
+import itertools
+import logging
 import os
-import zipfile
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import quote
 
-import requests
+from django.conf import settings
 
 from note.adapters.base_adapter import BaseAdapter
+from note.adapters.github_archive import GithubArchive
+from note.adapters.http_client import get_http_client
 from note.serializers_uploader import UploaderGithubSerializer
 
+logger = logging.getLogger(__name__)
+
 
 class GithubAdapter(BaseAdapter):
     verbose_name = 'Github'
     serializer = UploaderGithubSerializer
-    URL_ARCHIVE = 'https://github.com/{}/{}/archive/refs/heads/{}.zip'
     URL_NOTE = 'https://raw.githubusercontent.com/{}/{}/{}{}/{}.md'
+    URL_FILE = 'https://raw.githubusercontent.com/{}/{}/{}/{}'
+    DEFAULT_FETCH_WORKERS = 8
+    MAX_PORTION_SIZE = 400
 
-    def __init__(self, storage, owner, repo, branch, directory):
+    def __init__(self, storage, owner, repo, branch, directory, webhook_secret=None):
         super().__init__(storage)
         self.owner = owner
         self.repo = repo
         self.branch = branch
         self.directory = directory
+        self.webhook_secret = webhook_secret
+        self.archive = None
 
     def get(self, title):
-        response = requests.get(self.URL_NOTE.format(self.owner, self.repo, self.branch, self.directory, quote(title)))
+        url = self.URL_NOTE.format(self.owner, self.repo, self.branch, self.directory, quote(title))
+        response = get_http_client('github').get(url)
         return None if response.status_code == 404 else {'title': title, 'content': response.text, 'user': None}
 
-    def load_archive(self):
-        archive_dir = Path(__file__).resolve().parent.parent / 'cache_archives'
-        archive_path = archive_dir / '{}.zip'.format('__'.join((self.owner, self.repo, self.branch)))
-        if not os.path.exists(archive_dir):
-            os.mkdir(archive_dir)
-
-        if not os.path.exists(archive_path):
-            response = requests.get(self.URL_ARCHIVE.format(self.owner, self.repo, self.branch))
-            with open(archive_path, 'wb') as archive_file:
-                archive_file.write(response.content)
-
-        return archive_path
-
-    def get_list(self, page_number, count_on_page):
-        archive_path = self.load_archive()
-        notes = []
-        path_to_notes = '{}-{}{}'.format(self.repo, self.branch, self.directory)
-        total_count = 0
-        with zipfile.ZipFile(archive_path) as archive_object:
-            for member_info in archive_object.infolist():
-                filename = member_info.filename
-                if not filename.startswith(path_to_notes) or not filename.endswith('.md') or member_info.is_dir():
-                    continue
-
-                total_count += 1
-                if len(notes) >= count_on_page:
-                    continue
-
-                current_page = (total_count // count_on_page) + 1 if total_count % count_on_page > 0 else 0
-                if current_page != page_number:
-                    continue
-
-                with archive_object.open(member_info) as member_file:
-                    file_name, _ = os.path.splitext(os.path.basename(filename))
-                    file_content = str(member_file.read(), 'utf-8')
-                    notes.append({'title': file_name, 'content': file_content})
-
-        return notes, {'num_pages': self.total_count_objects_to_count_pages(total_count, count_on_page)}
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+    def get_archive(self):
+        if self.archive is None:
+            self.archive = GithubArchive(self.owner, self.repo, self.branch, self.directory)
+
+        return self.archive
+
+    def get_list(self, page_number, count_on_page, with_count=True):
+        index = self.get_archive().get_index()
+        entries, meta = self.paginate(index.entries, page_number, count_on_page, with_count)
+        notes = [{'title': title, 'content': content} for title, content in index.read_contents(entries)]
+        return notes, meta
+
+    def iter_notes(self, after=None, limit=100):
+        index = self.get_archive().get_index()
+        for title, content in index.read_contents(index.entries[index.index_after(after):]):
+            yield {'title': title, 'content': content}
+
+    def get_many(self, titles):
+        index = self.get_archive().get_index()
+        entries = [index.entries[position] for title in sorted(titles) for position in index.find_title(title)]
+        return [{'title': title, 'content': content} for title, content in index.read_contents(entries)]
+
+    def search_by_tag(self, tag, count_on_page, page_number, fields, with_count=True):
+        from note.models import normalize_tag
+        index = self.get_archive().get_index()
+        titles = index.get_tags().get(normalize_tag(tag), [])
+        titles, meta = self.paginate(titles, page_number, count_on_page, with_count)
+        if 'content' in fields:
+            notes = self.get_many(titles)
+        else:
+            notes = [{'title': title} for title in titles]
+
+        for note in notes:
+            note['url'] = self.get_note_url(note['title'])
+            if 'title' not in fields:
+                del note['title']
+
+        return notes, meta
+
+    def get_tag_counts(self, limit):
+        tags = self.get_archive().get_index().get_tags()
+        counts = sorted(((tag, len(titles)) for tag, titles in tags.items()), key=lambda item: (-item[1], item[0]))
+        return [{'tag': tag, 'count': count} for tag, count in counts[:limit]]
+
+    def suggest(self, prefix, limit):
+        return self.get_archive().get_index().get_title_index().find(prefix, limit)
 
     def search(
         self,
@@ -73,45 +95,111 @@ class GithubAdapter(BaseAdapter):
         fields,
         file_name=None,
         file_content=None,
+        with_count=True,
     ):
-        from django.core.paginator import Paginator
         from note.models import prepare_to_search
-        file_content = prepare_to_search(file_content)
-        file_name = prepare_to_search(file_name)
-        archive_path = self.load_archive()
-        notes = []
-        path_to_notes = '{}-{}{}'.format(self.repo, self.branch, self.directory)
-        with zipfile.ZipFile(archive_path) as archive_object:
-            for member_info in archive_object.infolist():
-                filename = member_info.filename
-                if not filename.startswith(path_to_notes) or not filename.endswith('.md') or member_info.is_dir():
-                    continue
-
-                with archive_object.open(member_info) as member_file:
-                    title, _ = os.path.splitext(os.path.basename(filename))
-                    content = str(member_file.read(), 'utf-8')
-
-                    founds = (
-                        file_content in prepare_to_search(content) if file_content else True,
-                        file_name in prepare_to_search(title) if file_name else True,
-                    )
-                    if not (all(founds) if operator == 'and' else any(founds)):
-                        continue
-
-                    note = {}
-                    if 'title' in fields:
-                        note['title'] = title
-
-                    if 'content' in fields:
-                        note['content'] = content
-
-                    notes.append(note)
-
-        paginator = Paginator(notes, count_on_page)
-        page = paginator.page(page_number)
-
-        notes = list(page.object_list)
+        file_content = prepare_to_search(file_content).encode('utf-8') if file_content else None
+        file_name = prepare_to_search(file_name) if file_name else None
+        index = self.get_archive().get_index()
+        if operator == 'and' or not (file_content and file_name):
+            # with a single value both operators filter by it alone
+            positions = index.find(file_content) if file_content else range(len(index))
+            if file_name:
+                search_titles = index.get_search_titles()
+                positions = (position for position in positions if file_name in search_titles[position])
+        else:
+            content_positions = set(index.find(file_content))
+            search_titles = index.get_search_titles()
+            positions = (
+                position for position in range(len(index))
+                if position in content_positions or file_name in search_titles[position]
+            )
+
+        if with_count:
+            entries = [index.entries[position] for position in positions]
+        else:
+            max_count = max(page_number, 1) * count_on_page + 1
+            entries = [index.entries[position] for position in itertools.islice(positions, max_count)]
+
+        entries, meta = self.paginate(entries, page_number, count_on_page, with_count)
+        if 'content' in fields:
+            notes = [{'title': title, 'content': content} for title, content in index.read_contents(entries)]
+        else:
+            notes = [{'title': entry[0]} for entry in entries]
+
         for note in notes:
             note['url'] = self.get_note_url(note['title'])
-
-        return notes, {'num_pages': paginator.num_pages, 'count': paginator.count}
+            if 'title' not in fields:
+                del note['title']
+
+        return notes, meta
+
+    def get_changed_files(self, commits):
+        """Coalesce files of commits of a push into sets of changed and removed paths of notes"""
+        prefix = self.directory.strip('/')
+        prefix = f'{prefix}/' if prefix else ''
+        changed, removed = set(), set()
+        for commit in commits:
+            for path in commit.get('removed', ()):
+                changed.discard(path)
+                removed.add(path)
+
+            for path in (*commit.get('added', ()), *commit.get('modified', ())):
+                removed.discard(path)
+                changed.add(path)
+
+        changed = {path for path in changed if path.startswith(prefix) and path.endswith('.md')}
+        removed = {path for path in removed if path.startswith(prefix) and path.endswith('.md')}
+        return changed, removed
+
+    def fetch_file(self, ref, path):
+        response = get_http_client('github').get(self.URL_FILE.format(self.owner, self.repo, ref, quote(path)))
+        if response.status_code == 404:
+            return None
+
+        response.raise_for_status()
+        return response.text
+
+    def apply_push(self, payload):
+        """Sync notes changed by a push into the branch with the archive index.
+
+        Notes of the storage aren't mirrored in `Note`, so only the archive is changed. If a file isn't fetched,
+        the archive is invalidated to be downloaded again instead.
+
+        :param payload: payload of the `push` event of GitHub webhook
+        :return: `dict` with counts of updated and removed notes
+        """
+        if payload.get('ref') != f'refs/heads/{self.branch}':
+            return {'updated': 0, 'removed': 0}
+
+        changed_paths, removed_paths = self.get_changed_files(payload.get('commits', ()))
+        ref = payload.get('after') or self.branch
+        changed_paths = sorted(changed_paths)
+        workers = getattr(settings, 'NOTE_GITHUB_FETCH_WORKERS', self.DEFAULT_FETCH_WORKERS)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self.fetch_file, ref, path) for path in changed_paths]
+
+        notes_contents = {}
+        for path, future in zip(changed_paths, futures):
+            try:
+                content = future.result()
+            except Exception:
+                logger.exception('File "%s" of the push is not fetched, the archive of %s is invalidated', path, ref)
+                self.get_archive().invalidate()
+                self.drop_cached_count()
+                return {'updated': len(changed_paths), 'removed': len(removed_paths)}
+
+            if content is None:
+                removed_paths.add(path)
+            else:
+                notes_contents[self.path_to_title(path)] = content
+
+        removed_titles = {self.path_to_title(path) for path in removed_paths} - notes_contents.keys()
+        self.get_archive().apply_changes(notes_contents, removed_titles)
+        self.drop_cached_count()
+        return {'updated': len(notes_contents), 'removed': len(removed_titles)}
+
+    @staticmethod
+    def path_to_title(path):
+        title, _ = os.path.splitext(os.path.basename(path))
+        return title
@@ -0,0 +1,357 @@
+import bisect
+import heapq
+import json
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from django.conf import settings
+
+from note.adapters.http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = Path(__file__).resolve().parent.parent / 'cache_archives'
+DEFAULT_ARCHIVE_TIMEOUT = 300
+DEFAULT_GENERATION_TTL = 3600
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+INDEX_VERSION = 3
+SEARCH_SEPARATOR = b'\x00'
+
+archive_locks = {}
+archive_locks_lock = threading.Lock()
+
+
+def get_archive_lock(name):
+    with archive_locks_lock:
+        return archive_locks.setdefault(name, threading.Lock())
+
+
+class ArchiveIndex:
+    """Extracted notes of one generation of an archive.
+
+    `entries` are tuples `(title, offset, size, search_offset, search_size)` sorted by title,
+    where offsets point to the content blob and to the search blob. The search blob contains contents
+    prepared by `prepare_to_search` in the same order, separated by a null byte so that a match never spans
+    two notes. The search blob is memory-mapped and scanned with `mmap.find`, hits are mapped back
+    to entries by bisecting the array of offsets. Titles of notes of every hashtag are kept in `tags.json`.
+    """
+    def __init__(self, path, entries):
+        self.path = path
+        self.entries = entries
+        self.titles = [entry[0] for entry in entries]
+        self.search_offsets = array('q', (entry[3] for entry in entries))
+        self.content_path = path / 'content.bin'
+        self.search_path = path / 'search.bin'
+        self.search_titles = None
+        self.title_index = None
+        self.tags = None
+        self.search_map = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        with open(path / 'index.json', encoding='utf-8') as index_file:
+            return cls(path, [tuple(entry) for entry in json.load(index_file)])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def close(self):
+        if self.search_map is not None:
+            self.search_map.close()
+            self.search_map = None
+
+    def index_after(self, title):
+        """Return position of the first entry placed after `title`"""
+        return 0 if title is None else bisect.bisect_right(self.titles, title)
+
+    def find_title(self, title):
+        """Return positions of entries with `title`"""
+        return range(bisect.bisect_left(self.titles, title), bisect.bisect_right(self.titles, title))
+
+    def read_contents(self, entries, decode=True):
+        """Return pairs `(title, content)` of `entries` reading the content blob once"""
+        with open(self.content_path, 'rb') as content_file:
+            for title, offset, size, _, _ in entries:
+                content_file.seek(offset)
+                content = content_file.read(size)
+                yield title, str(content, 'utf-8') if decode else content
+
+    def get_search_titles(self):
+        from note.models import prepare_to_search
+        if self.search_titles is None:
+            self.search_titles = [prepare_to_search(title) for title in self.titles]
+
+        return self.search_titles
+
+    def get_title_index(self):
+        from note.suggest import TitleIndex
+        if self.title_index is None:
+            self.title_index = TitleIndex(self.titles)
+
+        return self.title_index
+
+    def get_tags(self):
+        """Return titles of notes sorted by title for every normalized hashtag"""
+        if self.tags is None:
+            with open(self.path / 'tags.json', encoding='utf-8') as tags_file:
+                self.tags = json.load(tags_file)
+
+        return self.tags
+
+    def get_search_map(self):
+        with self.lock:
+            if self.search_map is None and os.path.getsize(self.search_path):
+                with open(self.search_path, 'rb') as search_file:
+                    self.search_map = mmap.mmap(search_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+            return self.search_map
+
+    def find(self, value: bytes):
+        """Return positions of entries whose prepared content contains `value` in the order of entries"""
+        search_map = self.get_search_map()
+        if search_map is None:
+            return
+
+        found_offset = search_map.find(value)
+        while found_offset != -1:
+            position = bisect.bisect_right(self.search_offsets, found_offset) - 1
+            yield position
+            if position + 1 == len(self.search_offsets):
+                break
+
+            found_offset = search_map.find(value, self.search_offsets[position + 1])
+
+
+class GithubArchive:
+    """Cache of notes of a GitHub branch on the disk.
+
+    The archive of a branch is downloaded once and extracted into an index. The index is revalidated
+    by ETag not more often than once per `timeout` seconds, so an unchanged branch is not downloaded again.
+    Every download is extracted into a new generation directory, and `meta.json` points to the actual one.
+    Generations are switched under a file lock, so processes don't refresh the archive at once. A replaced
+    generation is deleted `generation_ttl` seconds later, because other processes may still read it.
+    """
+    URL_ARCHIVE = 'https://github.com/{}/{}/archive/refs/heads/{}.zip'
+
+    def __init__(self, owner, repo, branch, directory, timeout=None):
+        self.owner = owner
+        self.repo = repo
+        self.branch = branch
+        self.directory = directory
+        if timeout is None:
+            timeout = getattr(settings, 'NOTE_GITHUB_ARCHIVE_TIMEOUT', DEFAULT_ARCHIVE_TIMEOUT)
+
+        self.timeout = timeout
+        self.generation_ttl = getattr(settings, 'NOTE_GITHUB_ARCHIVE_GENERATION_TTL', DEFAULT_GENERATION_TTL)
+        name_parts = (owner, repo, branch, directory.strip('/').replace('/', '_'))
+        self.name = '__'.join(part for part in name_parts if part)
+        self.path = ARCHIVE_DIR / self.name
+        self.index = None
+
+    def read_meta(self):
+        try:
+            with open(self.path / 'meta.json', encoding='utf-8') as meta_file:
+                return json.load(meta_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def write_meta(self, meta):
+        meta_path = self.path / 'meta.json'
+        temp_path = self.path / 'meta.json.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as meta_file:
+            json.dump(meta, meta_file)
+
+        os.replace(temp_path, meta_path)
+
+    @contextmanager
+    def lock(self):
+        """Lock the archive for threads of the process and for other processes"""
+        with get_archive_lock(self.name):
+            os.makedirs(self.path, exist_ok=True)
+            with open(self.path / 'lock', 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+                yield
+
+    def get_index(self):
+        """Return the actual index of the archive, revalidating it if the timeout is expired"""
+        meta = self.read_meta()
+        if self.is_expired(meta):
+            with self.lock():
+                meta = self.read_meta()
+                if self.is_expired(meta):
+                    meta = self.refresh(meta)
+
+        generation_path = self.path / meta['generation']
+        if self.index is None or self.index.path != generation_path:
+            # The previous index is not closed explicitly: it may be searched by another thread yet,
+            # its memory map is released when the index is collected
+            self.index = ArchiveIndex.load(generation_path)
+
+        return self.index
+
+    def is_expired(self, meta):
+        if not meta.get('generation') or meta.get('version') != INDEX_VERSION:
+            return True
+
+        return time.time() - meta.get('checked_at', 0) > self.timeout
+
+    def close(self):
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
+    def refresh(self, meta):
+        os.makedirs(self.path, exist_ok=True)
+        headers = {}
+        if meta.get('generation') and meta.get('etag') and meta.get('version') == INDEX_VERSION:
+            headers['If-None-Match'] = meta['etag']
+
+        url = self.URL_ARCHIVE.format(self.owner, self.repo, self.branch)
+        try:
+            response = get_http_client('github').get(url, headers=headers, stream=True)
+            with response:
+                if response.status_code == 304:
+                    meta['checked_at'] = time.time()
+                    self.write_meta(meta)
+                    return meta
+
+                response.raise_for_status()
+                with tempfile.TemporaryFile(dir=self.path) as archive_file:
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        archive_file.write(chunk)
+
+                    generation = str(time.time_ns())
+                    with zipfile.ZipFile(archive_file) as archive_object:
+                        members = sorted(self.get_note_members(archive_object), key=lambda member: member[0])
+                        notes = ((title, archive_object.read(member_info)) for title, member_info in members)
+                        self.write_generation(self.path / generation, notes)
+        except Exception:
+            if not meta.get('generation') or meta.get('version') != INDEX_VERSION:
+                raise
+
+            logger.exception('Archive of %s is not refreshed, the cached one is used', self.name)
+            return meta
+
+        return self.switch_generation(meta, generation, response.headers.get('ETag'))
+
+    def switch_generation(self, meta, generation, etag):
+        """Make the generation actual. It must be called under `lock`"""
+        retired_generations = dict(meta.get('retired', {}))
+        if meta.get('generation'):
+            retired_generations[meta['generation']] = time.time()
+
+        meta = {
+            'version': INDEX_VERSION,
+            'generation': generation,
+            'etag': etag,
+            'checked_at': time.time(),
+            'retired': self.delete_retired_generations(generation, retired_generations),
+        }
+        self.write_meta(meta)
+        return meta
+
+    def delete_retired_generations(self, generation, retired_generations):
+        """Delete generations replaced more than `generation_ttl` seconds ago. Return the kept ones"""
+        now = time.time()
+        kept_generations = {}
+        for path in self.path.iterdir():
+            if not path.is_dir() or path.name == generation:
+                continue
+
+            # a directory unknown by meta is left by an interrupted writing
+            retired_at = retired_generations.get(path.name, now)
+            if now - retired_at > self.generation_ttl:
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                kept_generations[path.name] = retired_at
+
+        return kept_generations
+
+    def invalidate(self):
+        """Make the archive be revalidated at the next request of the index"""
+        with self.lock():
+            meta = self.read_meta()
+            if meta.get('generation'):
+                meta['checked_at'] = 0
+                self.write_meta(meta)
+
+    def apply_changes(self, notes, removed_titles):
+        """Write changed notes into the cached index without downloading the archive.
+
+        :param notes: `dict` of new contents of added and modified notes by their titles
+        :param removed_titles: titles of removed notes
+        """
+        with self.lock():
+            meta = self.read_meta()
+            if not meta.get('generation') or meta.get('version') != INDEX_VERSION:
+                return
+
+            index = ArchiveIndex.load(self.path / meta['generation'])
+            kept_entries = [
+                entry for entry in index.entries if entry[0] not in notes and entry[0] not in removed_titles
+            ]
+            new_notes = sorted((title, content.encode('utf-8')) for title, content in notes.items())
+            generation = str(time.time_ns())
+            self.write_generation(self.path / generation, heapq.merge(
+                index.read_contents(kept_entries, decode=False),
+                new_notes,
+                key=lambda note: note[0],
+            ))
+            self.switch_generation(meta, generation, meta.get('etag'))
+
+    def get_note_members(self, archive_object):
+        """Return pairs `(title, member_info)` of notes of the archive"""
+        path_to_notes = '{}-{}{}'.format(self.repo, self.branch, self.directory)
+        for member_info in archive_object.infolist():
+            filename = member_info.filename
+            if filename.startswith(path_to_notes) and filename.endswith('.md') and not member_info.is_dir():
+                title, _ = os.path.splitext(os.path.basename(filename))
+                yield title, member_info
+
+    @staticmethod
+    def write_generation(generation_path, notes):
+        """Write the index and the blobs of a generation.
+
+        :param notes: pairs `(title, content)` sorted by title, where `content` is UTF-8 encoded
+        """
+        from note.models import get_note_tags, prepare_to_search
+        os.makedirs(generation_path)
+        entries = []
+        tags = {}
+        with (
+            open(generation_path / 'content.bin', 'wb') as content_file,
+            open(generation_path / 'search.bin', 'wb') as search_file,
+        ):
+            for title, content in notes:
+                decoded_content = str(content, 'utf-8')
+                for tag in get_note_tags(decoded_content):
+                    tags.setdefault(tag, []).append(title)
+
+                search_content = prepare_to_search(decoded_content).encode('utf-8')
+                entries.append((title, content_file.tell(), len(content), search_file.tell(), len(search_content)))
+                content_file.write(content)
+                search_file.write(search_content)
+                search_file.write(SEARCH_SEPARATOR)
+
+        with open(generation_path / 'tags.json', 'w', encoding='utf-8') as tags_file:
+            json.dump(tags, tags_file, ensure_ascii=False)
+
+        with open(generation_path / 'index.json', 'w', encoding='utf-8') as index_file:
+            json.dump(entries, index_file, ensure_ascii=False)
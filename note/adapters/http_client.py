@@ -0,0 +1,106 @@
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_HTTP_SETTINGS = {
+    'POOL_SIZE': 10,
+    'CONNECT_TIMEOUT': 5,
+    'READ_TIMEOUT': 30,
+    'RETRIES': 3,
+    'BACKOFF_FACTOR': 0.5,
+}
+
+
+class HttpClient:
+    """HTTP client with a pool of keep-alive connections, retries with backoff and latency metrics.
+
+    One client is shared by all adapters of a service, see `get_http_client`.
+    """
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, name, pool_size, connect_timeout, read_timeout, retries, backoff_factor):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=self.RETRY_STATUSES,
+            raise_on_status=False,
+        )
+        http_adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', http_adapter)
+        self.session.mount('http://', http_adapter)
+        self.lock = threading.Lock()
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    @classmethod
+    def from_settings(cls, name):
+        http_settings = {**DEFAULT_HTTP_SETTINGS, **getattr(settings, 'NOTE_HTTP', {})}
+        return cls(
+            name,
+            http_settings['POOL_SIZE'],
+            http_settings['CONNECT_TIMEOUT'],
+            http_settings['READ_TIMEOUT'],
+            http_settings['RETRIES'],
+            http_settings['BACKOFF_FACTOR'],
+        )
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        start_time = time.perf_counter()
+        is_error = True
+        try:
+            response = self.session.request(method, url, **kwargs)
+            is_error = response.status_code >= 500
+            return response
+        finally:
+            elapsed_time = time.perf_counter() - start_time
+            with self.lock:
+                self.count += 1
+                self.errors += is_error
+                self.total_time += elapsed_time
+                self.max_time = max(self.max_time, elapsed_time)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': self.count,
+                'errors': self.errors,
+                'average_time': self.total_time / self.count if self.count else 0,
+                'max_time': self.max_time,
+            }
+
+
+http_clients = {}
+http_clients_lock = threading.Lock()
+
+
+def get_http_client(name):
+    """Return the shared HTTP client of a service by its name"""
+    with http_clients_lock:
+        client = http_clients.get(name)
+        if client is None:
+            client = http_clients[name] = HttpClient.from_settings(name)
+
+        return client
+
+
+def get_http_stats():
+    with http_clients_lock:
+        clients = list(http_clients.values())
+
+    return {client.name: client.stats() for client in clients}
@@ -1,42 +1,89 @@
-class NoteBackuperMixin:
+MIRRORED_TITLES_MAX_SIZE = 10000
+
+
+class NoteTagsIndexMixin:
+    """Looks hashtags up in `NoteTag` for storages whose notes are kept or mirrored in `Note`"""
+    storage = None
+
+    def search_by_tag(self, tag, count_on_page, page_number, fields, with_count=True):
+        from note.models import NoteTag, normalize_tag
+        note_ids = (
+            NoteTag.objects
+            .filter(storage=self.storage, tag=normalize_tag(tag))
+            .order_by('note__title')
+            .values_list('note', flat=True)
+        )
+        return self.get_page_by_ids(note_ids, page_number, count_on_page, fields, with_count)
+
+    def get_tag_counts(self, limit):
+        from note.models import NoteTag
+        return list(NoteTag.get_counts(self.storage)[:limit])
+
+
+class NoteBackuperMixin(NoteTagsIndexMixin):
+    """Keeps a local mirror of notes of an external storage in `Note`.
+
+    Changes are written behind by `note.mirror.mirror_queue`, so requests don't wait for rendering and indexing.
+    Hashes of contents known to be mirrored are remembered, so repeated reading of a note doesn't enqueue it again.
+    """
     storage = None
     queryset = None
+    mirrored_hashes = None
+
+    def b_put(self, title, content, user=None):
+        self.b_put_many([(title, content)], user)
+
+    def b_put_many(self, notes, user=None):
+        """Mirror notes given as pairs of a title and a content, which aren't known to be mirrored"""
+        from note.mirror import mirror_queue
+        from note.models import NoteMirrorOperation, get_content_hash
+        if self.mirrored_hashes is None or len(self.mirrored_hashes) > MIRRORED_TITLES_MAX_SIZE:
+            self.mirrored_hashes = {}
+
+        changed_notes = []
+        for title, content in notes:
+            content_hash = get_content_hash(content)
+            if self.mirrored_hashes.get(title) != content_hash:
+                self.mirrored_hashes[title] = content_hash
+                changed_notes.append((title, content))
+
+        if changed_notes:
+            mirror_queue.put_many(self.storage, NoteMirrorOperation.OPERATION_UPSERT, changed_notes, user)
 
     def b_clear(self):
-        self.queryset.delete()
+        from note.mirror import mirror_queue
+        mirror_queue.discard(self.storage, self.queryset)
+        self.mirrored_hashes = {}
 
     def b_add(self, title, content, user=None):
-        from note.models import Note
-        note = self.queryset.filter(title=title).first()
-        if not note:
-            note = Note(title=title, content=content, storage=self.storage, user=user)
-            note.fetch_search_fields()
-            note.save()
+        self.b_put(title, content, user)
 
     def b_delete(self, title):
-        note = self.queryset.filter(title=title).first()
-        if note:
-            note.delete()
+        self.b_delete_many([title])
 
     def b_edit(self, title, new_title=None, new_content=None):
-        from note.models import Note
-        note = self.queryset.filter(title=title).first()
-        if not note:
-            note = self.queryset.filter(title=new_title).first()
-            if not note:
-                note = Note(title=new_title, content=new_content, storage=self.storage)
-                note.fetch_search_fields()
-                note.save()
-
-        updated_fields = []
-        if new_title and note.title != new_title:
-            note.title = new_title
-            updated_fields.append('title')
-
-        if new_content and note.content != new_content:
-            note.content = new_content
-            updated_fields.append('content')
-
-        if updated_fields:
-            note.fetch_search_fields()
-            note.save()
+        """Mirror changes of a note. `new_content` must be the actual content of the note, even if it's unchanged"""
+        if new_title and new_title != title:
+            self.b_delete(title)
+            self.b_put(new_title, new_content)
+        else:
+            self.b_put(title, new_content)
+
+    def b_upsert_many(self, notes):
+        """Mirror notes given as `dict` like `{'title': '', 'content': ''}` by a single upsert of operations"""
+        self.b_put_many([(note['title'], note['content']) for note in notes])
+
+    def b_delete_many(self, titles):
+        from note.mirror import mirror_queue
+        from note.models import NoteMirrorOperation
+        if self.mirrored_hashes:
+            for title in titles:
+                self.mirrored_hashes.pop(title, None)
+
+        mirror_queue.put_many(self.storage, NoteMirrorOperation.OPERATION_DELETE, [(title, None) for title in titles])
+
+    def b_get_hashes(self):
+        """Return hashes of contents of mirrored notes. The mirror is a manifest of the storage"""
+        from note.mirror import mirror_queue
+        mirror_queue.flush()
+        return dict(self.queryset.exclude(content_hash=None).values_list('title', 'content_hash'))
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+DEFAULT_STORAGE_CACHE_TIMEOUT = 60
+
+
+class StorageRegistry:
+    """Process-level cache of resolved storages and of live adapters.
+
+    Storages are cached by the requested source and user for `timeout` seconds, so changes made by other processes
+    are seen after it. Adapters are cached by a storage id and a hash of its service and credentials,
+    so a storage with changed credentials gets a new adapter. When a storage is saved or deleted, resolved storages
+    are dropped and the adapter of the storage is evicted. Users of adapters are counted, so an evicted adapter
+    is closed when the last request or job using it is finished. If `timeout` isn't given, it's read from settings
+    at the first use, so the registry may be created at import time.
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self.lock = threading.RLock()
+        self.storages = {}
+        self.adapters = {}
+        self.user_counts = {}
+        self.evicted_adapters = {}
+
+    def get_timeout(self):
+        if self.timeout is None:
+            self.timeout = getattr(settings, 'NOTE_STORAGE_CACHE_TIMEOUT', DEFAULT_STORAGE_CACHE_TIMEOUT)
+
+        return self.timeout
+
+    @staticmethod
+    def query_storage(source=None, user=None):
+        from note.models import NoteStorageServiceModel
+
+        storage = None
+        if user and user.is_authenticated and source:
+            storage = NoteStorageServiceModel.objects.filter(user=user, source=source).first()
+        elif user and user.is_authenticated:
+            storage = NoteStorageServiceModel.objects.filter(user=user, is_default=True).first()
+        elif source:
+            storage = NoteStorageServiceModel.objects.filter(source=source).first()
+
+        if not storage:
+            storage = NoteStorageServiceModel.objects.filter(source=settings.DEFAULT_SOURCE_CODE).first()
+            if not storage:
+                raise Exception(f'not found default knowledge base "{settings.DEFAULT_SOURCE_CODE}"')
+
+        return storage
+
+    def get_storage(self, source=None, user=None):
+        user_id = user.pk if user and user.is_authenticated else None
+        key = (source, user_id)
+        with self.lock:
+            storage, expires_at = self.storages.get(key, (None, 0))
+
+        if expires_at < time.monotonic():
+            storage = self.query_storage(source, user)
+            with self.lock:
+                self.storages[key] = (storage, time.monotonic() + self.get_timeout())
+
+        return storage
+
+    @staticmethod
+    def get_credentials_hash(storage):
+        value = json.dumps([storage.service, storage.credentials], sort_keys=True)
+        return hashlib.sha1(value.encode()).hexdigest()
+
+    @staticmethod
+    def build_adapter(storage):
+        from note.adapters import service_name_to_class
+
+        uploader_class = service_name_to_class(storage.service)
+        return uploader_class(storage, **storage.credentials)
+
+    @contextmanager
+    def use_adapter(self, storage):
+        """Give the shared adapter of a storage, which isn't closed till the end of the block"""
+        adapter = self.acquire_adapter(storage)
+        try:
+            yield adapter
+        finally:
+            self.release_adapter(adapter)
+
+    def acquire_adapter(self, storage):
+        credentials_hash = self.get_credentials_hash(storage)
+        with self.lock:
+            cached_hash, adapter = self.adapters.get(storage.pk, (None, None))
+            if adapter is None or cached_hash != credentials_hash:
+                if adapter is not None:
+                    self.evict_adapter(storage.pk)
+
+                adapter = self.build_adapter(storage)
+                self.adapters[storage.pk] = (credentials_hash, adapter)
+
+            self.user_counts[id(adapter)] = self.user_counts.get(id(adapter), 0) + 1
+
+        return adapter
+
+    def release_adapter(self, adapter):
+        with self.lock:
+            count = self.user_counts.pop(id(adapter)) - 1
+            if count:
+                self.user_counts[id(adapter)] = count
+                return
+
+            adapter = self.evicted_adapters.pop(id(adapter), None)
+
+        if adapter is not None:
+            adapter.close()
+
+    def evict_adapter(self, storage_id):
+        """Drop the adapter of a storage from the cache. It's closed at once if it isn't used, else by the last user"""
+        with self.lock:
+            _, adapter = self.adapters.pop(storage_id, (None, None))
+            if adapter is None:
+                return
+
+            if id(adapter) in self.user_counts:
+                self.evicted_adapters[id(adapter)] = adapter
+                return
+
+        adapter.close()
+
+    def evict(self, storage_id):
+        """Drop resolved storages, because the storage may be resolved by other keys after changes, and the adapter"""
+        with self.lock:
+            self.storages.clear()
+
+        self.evict_adapter(storage_id)
+
+    def clear(self):
+        with self.lock:
+            storage_ids = list(self.adapters)
+
+        for storage_id in storage_ids:
+            self.evict(storage_id)
+
+        with self.lock:
+            self.storages.clear()
+
+
+storage_registry = StorageRegistry()
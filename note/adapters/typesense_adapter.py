@@ -1,26 +1,29 @@
+import json
+
 from typesense import Client
+from typesense.document import Document
+from typesense.exceptions import ObjectNotFound
 
 from note.adapters.base_adapter import BaseAdapter
 from note.serializers_uploader import UploaderTypesenseSerializer
 
 
 class TypesenseAdapter(BaseAdapter):
+    """Notes in a collection of Typesense server.
+
+    A document of a note has an id derived from the title, so writing a note with the same title replaces it.
+    Search, pagination, field selection and highlighting are done by the server.
+    """
     verbose_name = 'Typesense'
     serializer = UploaderTypesenseSerializer
     MAX_PORTION_SIZE = 500
-    portion = []
-    knowledge_schema = {
-        'name': 'knowledge',
-        'fields': [
-            {'name': 'filename', 'type': 'string'},
-            {'name': 'text', 'type': 'string', 'facet': True},
-            {'name': 'index', 'type': 'float'}
-        ],
-        'default_sorting_field': 'index'
-    }
-    index = 0
-
-    def __init__(self, storage, server, port, protocol, api_key):
+    MAX_PER_PAGE = 250
+    FIELDS = {'title': 'filename', 'content': 'text'}
+    TITLE_WEIGHT = 2
+    DEFAULT_COLLECTION = 'knowledge'
+    LIST_PARAMETERS = {'q': '*', 'query_by': 'filename', 'sort_by': 'filename:asc'}
+
+    def __init__(self, storage, server, port, protocol, api_key, collection=DEFAULT_COLLECTION):
         super().__init__(storage)
         self.client = Client({
             'nodes': [{
@@ -31,36 +34,206 @@ class TypesenseAdapter(BaseAdapter):
             'api_key': api_key,
             'connection_timeout_seconds': 2
         })
+        self.portion = []
+        self.knowledge_schema = {
+            'name': collection,
+            'fields': [
+                {'name': 'filename', 'type': 'string', 'sort': True},
+                {'name': 'text', 'type': 'string'},
+                {'name': 'content_hash', 'type': 'string', 'index': False, 'optional': True},
+            ],
+        }
+
+    @property
+    def documents(self):
+        return self.client.collections[self.knowledge_schema['name']].documents
+
+    def get_document(self, title):
+        # documents are not taken by `documents[id]`, because the client caches every requested document object
+        return Document(self.client.api_call, self.knowledge_schema['name'], self.get_document_id(title))
+
+    @staticmethod
+    def get_document_id(title):
+        from note.models import get_content_hash
+        return get_content_hash(title)
+
+    @classmethod
+    def build_document(cls, title, content):
+        from note.models import get_content_hash
+        return {
+            'id': cls.get_document_id(title),
+            'filename': title,
+            'text': content,
+            'content_hash': get_content_hash(content),
+        }
 
     def clear(self):
         try:
-            name = self.knowledge_schema['name']
-            self.client.collections[name].delete()
-        except Exception as e:
+            self.client.collections[self.knowledge_schema['name']].delete()
+        except ObjectNotFound:
             pass
 
         self.client.collections.create(self.knowledge_schema)
+        self.drop_cached_count()
 
     def add_to_portion(self, file_name, file_content):
-        fields = {'filename': file_name, 'text': file_content, 'index': self.index}
-        self.portion.append(fields)
-        self.index += 1
+        self.portion.append(self.build_document(file_name, file_content))
 
     def commit(self):
-        name = self.knowledge_schema['name']
-        self.client.collections[name].documents.import_(self.portion)
-        self.portion.clear()
-
-    def search(self, file_name=None, file_content=None, page_number=1):
-        name = self.knowledge_schema['name']
-        res = self.client.collections[name].documents.search({
-            'q': file_name,
-            'query_by': 'filename',
-            'sort_by': 'index:desc'
-        })
-        results = []
-        for hit in res['hits']:
+        if not self.portion:
+            return
+
+        documents = '\n'.join(json.dumps(document, ensure_ascii=False) for document in self.portion)
+        response = self.documents.import_(documents.encode('utf-8'), {'action': 'upsert'})
+        errors = [result for result in map(json.loads, response.splitlines()) if not result.get('success')]
+        self.portion = []
+        self.drop_cached_count()
+        if errors:
+            raise Exception('Typesense: {} documents are not imported: {}'.format(len(errors), errors[0].get('error')))
+
+    def get(self, title):
+        try:
+            document = self.get_document(title).retrieve()
+        except ObjectNotFound:
+            return None
+
+        return {'title': document['filename'], 'content': document['text'], 'user': None}
+
+    def add(self, title, content, user=None):
+        self.documents.create(self.build_document(title, content))
+        self.drop_cached_count()
+        return {'title': title, 'content': content}
+
+    def edit(self, title, new_title=None, new_content=None):
+        note = self.get(title)
+        if note is None:
+            raise ObjectNotFound(f'Note "{title}" is not found')
+
+        updated_fields = []
+        if new_title and new_title != title:
+            updated_fields.append('title')
+
+        if new_content and new_content != note['content']:
+            updated_fields.append('content')
+
+        if 'title' in updated_fields:
+            self.documents.create(self.build_document(new_title, new_content or note['content']))
+            self.get_document(title).delete()
+        elif updated_fields:
+            self.documents.upsert(self.build_document(title, new_content))
+
+        return updated_fields
+
+    def delete(self, title):
+        self.get_document(title).delete()
+        self.drop_cached_count()
+
+    def get_hashes(self):
+        response = self.documents.export({'include_fields': 'filename,content_hash'})
+        documents = (json.loads(line) for line in response.splitlines() if line)
+        return {document['filename']: document.get('content_hash') for document in documents}
+
+    def request_page(self, parameters, page_number, count_on_page, with_count):
+        """Search a page of documents and return the result with meta of pagination like `paginate`.
+
+        Typesense rejects pages longer than `MAX_PER_PAGE`, so longer pages are shortened.
+        """
+        page_number = max(page_number, 1)
+        count_on_page = min(count_on_page, self.MAX_PER_PAGE)
+        result = self.documents.search({**parameters, 'page': page_number, 'per_page': count_on_page})
+        found = result['found']
+        num_pages = self.total_count_objects_to_count_pages(found, count_on_page)
+        meta = {'has_next': page_number < num_pages}
+        if with_count:
+            meta.update({'num_pages': num_pages, 'count': found})
+
+        return result, meta
+
+    def get_list(self, page_number, count_on_page, with_count=True):
+        parameters = {**self.LIST_PARAMETERS, 'include_fields': 'filename,text'}
+        result, meta = self.request_page(parameters, page_number, count_on_page, with_count)
+        notes = [
+            {
+                'title': hit['document']['filename'],
+                'content': hit['document']['text'],
+                'url': self.get_note_url(hit['document']['filename']),
+            }
+            for hit in result['hits']
+        ]
+        return notes, meta
+
+    def find_page_after(self, title, count_on_page):
+        """Return number of the first page of the list having titles placed after `title`.
+
+        Typesense can't filter strings by a range, so the page is found by a binary search over pages of titles.
+        """
+        parameters = {**self.LIST_PARAMETERS, 'include_fields': 'filename'}
+        result, meta = self.request_page(parameters, 1, count_on_page, with_count=True)
+        low, high = 1, max(meta['num_pages'], 1)
+        while low < high:
+            middle = (low + high) // 2
+            result, _ = self.request_page(parameters, middle, count_on_page, with_count=False)
+            if result['hits'] and result['hits'][-1]['document']['filename'] > title:
+                high = middle
+            else:
+                low = middle + 1
+
+        return low
+
+    def iter_notes(self, after=None, limit=100):
+        count_on_page = min(limit, self.MAX_PER_PAGE)
+        page_number = 1 if after is None else self.find_page_after(after, count_on_page)
+        meta = {'has_next': True}
+        while meta['has_next']:
+            notes, meta = self.get_list(page_number, count_on_page, with_count=False)
+            for note in notes:
+                if after is None or note['title'] > after:
+                    yield note
+
+            page_number += 1
+
+    def search(
+        self,
+        operator,
+        count_on_page,
+        page_number,
+        fields,
+        file_name=None,
+        file_content=None,
+        with_count=True,
+    ):
+        """Search by fields of the query at once.
+
+        Typesense searches one query over all fields, so the query is made of both values. With the `and` operator
+        all words of the query must be found, with the `or` operator the server drops words of the query
+        from the end till something is found.
+        """
+        query_fields = [field for field, value in (('filename', file_name), ('text', file_content)) if value]
+        if not query_fields:
+            return self.get_list(page_number, count_on_page, with_count)
+
+        parameters = {
+            'q': ' '.join(dict.fromkeys(value for value in (file_name, file_content) if value)),
+            'query_by': ','.join(query_fields),
+            'query_by_weights': ','.join(
+                str(self.TITLE_WEIGHT if field == 'filename' else 1) for field in query_fields
+            ),
+            'include_fields': ','.join({'filename', *(self.FIELDS[field] for field in fields if field in self.FIELDS)}),
+            'highlight_fields': ','.join(query_fields),
+            'drop_tokens_threshold': 0 if operator == 'and' else 1,
+        }
+        result, meta = self.request_page(parameters, page_number, count_on_page, with_count)
+        names = {name: field for field, name in self.FIELDS.items()}
+        notes = []
+        for hit in result['hits']:
             document = hit['document']
-            results.append(dict(title=document['filename'], content=document['text']))
+            note = {field: document[name] for field, name in self.FIELDS.items() if field in fields}
+            note['url'] = self.get_note_url(document['filename'])
+            note['highlights'] = {
+                names[highlight['field']]: highlight['snippet']
+                for highlight in hit.get('highlights', ())
+                if highlight.get('field') in names and 'snippet' in highlight
+            }
+            notes.append(note)
 
-        return dict(results=results, count=res['found'])
+        return notes, meta
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from note.models import ImageNote, Note, NoteStorageServiceModel
+from note.models import ImageNote, Note, NoteJob, NoteLink, NoteMirrorOperation, NoteStorageServiceModel, NoteTag
 
 
 class NoteAdmin(admin.ModelAdmin):
@@ -21,3 +21,31 @@ class NoteStorageServiceAdmin(admin.ModelAdmin):
 
 
 admin.site.register(NoteStorageServiceModel, NoteStorageServiceAdmin)
+
+
+class NoteJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'kind', 'status', 'processed_count', 'created_at', 'finished_at')
+
+
+admin.site.register(NoteJob, NoteJobAdmin)
+
+
+class NoteLinkAdmin(admin.ModelAdmin):
+    list_display = ('id', 'storage', 'note', 'target_source', 'target_title')
+
+
+admin.site.register(NoteLink, NoteLinkAdmin)
+
+
+class NoteTagAdmin(admin.ModelAdmin):
+    list_display = ('id', 'storage', 'note', 'tag')
+
+
+admin.site.register(NoteTag, NoteTagAdmin)
+
+
+class NoteMirrorOperationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'storage', 'title', 'operation', 'attempts', 'next_attempt_at', 'updated_at')
+
+
+admin.site.register(NoteMirrorOperation, NoteMirrorOperationAdmin)
@@ -5,3 +5,9 @@ class NoteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'note'
     verbose_name = 'Заметки'
+
+    def ready(self):
+        import note.signals  # noqa: F401
+        from utils.hooks import hook_registry
+
+        hook_registry.build()
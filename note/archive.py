@@ -0,0 +1,203 @@
+import functools
+import os
+import re
+import tarfile
+import time
+import zipfile
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+
+ARCHIVE_CHUNK_SIZE = 64 * 1024
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg', '.bmp')
+IMAGE_LINK_PATTERN = re.compile(r'!\[[^\]]*\]\(<?([^)>\s]+)|!\[\[([^\]|#]+)')
+MAX_REPORTED_TITLES = 1000
+DUPLICATE_SKIP = 'skip'
+DUPLICATE_OVERWRITE = 'overwrite'
+
+
+class StreamWriter:
+    """Unseekable file object collecting written bytes until they are popped.
+
+    `zipfile.ZipFile` writes into such objects without seeking back: sizes and CRC of entries are written
+    in data descriptors after their data.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_zip(files):
+    """Compress files into a zip archive yielding the archive by chunks as files are compressed.
+
+    :param files: pairs `(name, data)`, where `data` is `bytes` or a file object opened in a binary mode
+    """
+    writer = StreamWriter()
+    with zipfile.ZipFile(writer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files:
+            entry = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            entry.compress_type = zipfile.ZIP_DEFLATED
+            if isinstance(data, bytes):
+                archive.writestr(entry, data)
+            else:
+                with archive.open(entry, mode='w', force_zip64=True) as entry_file:
+                    while chunk := data.read(ARCHIVE_CHUNK_SIZE):
+                        entry_file.write(chunk)
+                        yield writer.pop()
+
+            yield writer.pop()
+
+    yield writer.pop()
+
+
+def iter_storage_files(source):
+    """Return files of notes of a storage and images of the notes for an archive, in the format of Obsidian vault"""
+    from note.adapters import get_storage_service
+    from note.models import ImageNote
+
+    with get_storage_service(source) as (uploader, _):
+        for note in uploader.iter_notes(limit=100):
+            yield '{}/{}.md'.format(source, note['title']), note['content'].encode('utf-8')
+
+    images = ImageNote.objects.filter(note__storage__source=source).order_by('pk')
+    for image_note in images.iterator():
+        try:
+            with image_note.image.open('rb') as image_file:
+                yield '{}/{}'.format(source, os.path.basename(image_note.image.name)), image_file
+        except FileNotFoundError:
+            continue
+
+
+def iter_archive_entries(archive_path):
+    """Iterate over files of a zip or tar archive without extracting them.
+
+    :return: generator of `(number, path, open)`, where `open` returns a binary file object of an entry
+    """
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for number, entry in enumerate(archive.infolist()):
+                if not entry.is_dir():
+                    yield number, entry.filename, functools.partial(archive.open, entry)
+    else:
+        with tarfile.open(archive_path, mode='r:*') as archive:
+            for number, entry in enumerate(archive):
+                if entry.isfile():
+                    yield number, entry.name, functools.partial(archive.extractfile, entry)
+
+
+def is_hidden_path(path):
+    """Files like `.obsidian/app.json` are settings of a vault, but not notes"""
+    return any(part.startswith('.') for part in path.replace('\\', '/').split('/'))
+
+
+def get_image_links(content):
+    """Return names of images embedded into a note by Markdown or Obsidian syntax"""
+    return {os.path.basename(link or embed).strip() for link, embed in IMAGE_LINK_PATTERN.findall(content)}
+
+
+def add_reported_title(titles, title):
+    if len(titles) < MAX_REPORTED_TITLES:
+        titles.append(title)
+
+
+def import_archive(archive_path, source_to, on_duplicate=DUPLICATE_SKIP, after=None, report=None):
+    """Import notes and images from a zip or tar archive, e.g. an Obsidian vault, into a storage.
+
+    Entries are read one by one and notes are written by portions of `MAX_PORTION_SIZE` of the adapter.
+    A title met in the archive again is a duplicate and is skipped. A title existing in the storage
+    is skipped or overwritten depending on `on_duplicate`. Images are saved for notes embedding them,
+    if notes of the storage are kept in the database.
+
+    :param after: number of the last imported entry to resume the import
+    :param report: `dict` to be filled by counts and titles of imported, duplicated and invalid notes. A report
+        of the interrupted import is continued, entries before `after` are not reported again
+    :return: generator of count of imported notes, speed in notes per second and number of the last imported entry
+    """
+    from note.adapters import get_storage_service
+    from note.models import ImageNote, Note
+    from note.validators import FilenameValidator
+
+    report = {} if report is None else report
+    for key, value in (('imported', 0), ('duplicates', []), ('duplicates_count', 0), ('invalid', []), ('images', 0)):
+        report.setdefault(key, value)
+
+    imported_count = 0
+    validator = FilenameValidator()
+    after = -1 if after is None else int(after)
+    start_time = time.monotonic()
+    with get_storage_service(source_to, shared=False) as (uploader, _):
+        existing_titles = set(uploader.get_hashes()) if on_duplicate == DUPLICATE_SKIP else set()
+        imported_titles = set()
+        image_titles = {}
+        portion_size = 0
+        for number, path, open_entry in iter_archive_entries(archive_path):
+            title, extension = os.path.splitext(os.path.basename(path))
+            if extension.lower() != '.md' or is_hidden_path(path):
+                continue
+
+            try:
+                validator(title)
+                with open_entry() as entry_file:
+                    content = str(entry_file.read(), 'utf-8').replace('\r\n', '\n')
+            except (ValidationError, UnicodeDecodeError):
+                if number > after:
+                    add_reported_title(report['invalid'], path)
+
+                continue
+
+            for image_name in get_image_links(content):
+                image_titles.setdefault(image_name, title)
+
+            if number <= after:
+                imported_titles.add(title)
+                continue
+
+            if title in imported_titles or title in existing_titles:
+                report['duplicates_count'] += 1
+                add_reported_title(report['duplicates'], title)
+                continue
+
+            imported_titles.add(title)
+
+            uploader.add_to_portion(title, content)
+            portion_size += 1
+            if portion_size == uploader.MAX_PORTION_SIZE:
+                uploader.commit()
+                report['imported'] += portion_size
+                imported_count += portion_size
+                portion_size = 0
+                yield imported_count, imported_count / max(time.monotonic() - start_time, 1e-6), number
+
+        if portion_size:
+            uploader.commit()
+            report['imported'] += portion_size
+            imported_count += portion_size
+            yield imported_count, imported_count / max(time.monotonic() - start_time, 1e-6), number
+
+        notes = {}
+        for number, path, open_entry in iter_archive_entries(archive_path):
+            image_name = os.path.basename(path)
+            title = image_titles.get(image_name)
+            if not title or not image_name.lower().endswith(IMAGE_EXTENSIONS) or is_hidden_path(path):
+                continue
+
+            if title not in notes:
+                notes[title] = Note.objects.filter(storage=uploader.storage, title=title).first()
+
+            image_storage = ImageNote.image.field.storage
+            if notes[title] and not image_storage.exists(f'{ImageNote.UPLOAD_TO}/{image_name}'):
+                with open_entry() as entry_file:
+                    notes[title].images.create(image=File(entry_file, image_name))
+                    report['images'] += 1
@@ -0,0 +1,162 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from note.adapters import run_initiator
+from note.archive import import_archive
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_WORKERS = 2
+DEFAULT_JOB_STALE_TIMEOUT = 300
+
+
+def run_copy_job(job):
+    params = job.params
+    notes = run_initiator(params['source_from'], params['source_to'], mode=params['mode'], after=job.cursor)
+    for processed_count, speed, cursor in notes:
+        yield job.processed_count + processed_count, speed, cursor
+
+
+def run_import_job(job):
+    """Import an uploaded archive. The archive is deleted when the import is finished or failed,
+    but it's kept if the process is interrupted, so the job may be resumed. The report is saved with the progress,
+    so a resumed job continues it"""
+    from note.models import NoteJob
+    params = job.params
+    report = dict(job.result or {}) if job.cursor is not None else {}
+    try:
+        notes = import_archive(params['path'], params['source_to'], params['on_duplicate'], job.cursor, report)
+        for processed_count, speed, cursor in notes:
+            NoteJob.objects.filter(pk=job.pk).update(result=report)
+            yield job.processed_count + processed_count, speed, str(cursor)
+    finally:
+        NoteJob.objects.filter(pk=job.pk).update(result=report)
+        if os.path.exists(params['path']):
+            os.remove(params['path'])
+
+
+def get_job_runners():
+    from note.models import NoteJob
+    return {
+        NoteJob.KIND_COPY: run_copy_job,
+        NoteJob.KIND_IMPORT: run_import_job,
+    }
+
+
+class JobWorker:
+    """In-process worker running jobs in a pool of threads, without an external broker.
+
+    A job is claimed by an atomic update of its status, so a job is run once even if several processes
+    of the server try to resume it. The heartbeat of a claimed job is updated by a timer from the claim on, so neither
+    waiting in the queue of the pool nor a long step makes the job look interrupted. A job is considered interrupted if its heartbeat is older than `stale_timeout`
+    seconds, then it is resumed from its cursor.
+    """
+
+    def __init__(self, max_workers=DEFAULT_JOB_WORKERS, stale_timeout=DEFAULT_JOB_STALE_TIMEOUT):
+        self.max_workers = max_workers
+        self.stale_timeout = stale_timeout
+        self.executor = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            getattr(settings, 'NOTE_JOB_WORKERS', DEFAULT_JOB_WORKERS),
+            getattr(settings, 'NOTE_JOB_STALE_TIMEOUT', DEFAULT_JOB_STALE_TIMEOUT),
+        )
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='note-job')
+
+            return self.executor
+
+    def get_stale_jobs(self):
+        from note.models import NoteJob
+        stale_time = timezone.now() - timedelta(seconds=self.stale_timeout)
+        return NoteJob.objects.filter(
+            status__in=(NoteJob.STATUS_PENDING, NoteJob.STATUS_RUNNING),
+            updated_at__lt=stale_time,
+        )
+
+    def claim(self, job_id, is_new=False):
+        """Mark a job as running. Return `False` if the job is already claimed"""
+        from note.models import NoteJob
+        if is_new:
+            jobs = NoteJob.objects.filter(pk=job_id, status=NoteJob.STATUS_PENDING)
+        else:
+            jobs = self.get_stale_jobs().filter(pk=job_id)
+
+        return bool(jobs.update(status=NoteJob.STATUS_RUNNING, updated_at=timezone.now()))
+
+    def submit(self, job):
+        """Run a new job in background"""
+        if self.claim(job.pk, is_new=True):
+            self.start(job.pk)
+
+        self.resume_stale()
+
+    def resume_stale(self, in_background=True):
+        """Resume interrupted jobs. Return count of resumed jobs"""
+        count = 0
+        for job_id in self.get_stale_jobs().values_list('pk', flat=True):
+            if self.claim(job_id):
+                count += 1
+                self.start(job_id, in_background)
+
+        return count
+
+    def start(self, job_id, in_background=True):
+        """Run a claimed job. The heartbeat is started before the job is queued to the pool"""
+        stopped = threading.Event()
+        threading.Thread(target=self.beat, args=(job_id, stopped), name='note-job-heartbeat', daemon=True).start()
+        if not in_background:
+            self.run(job_id, stopped)
+            return
+
+        try:
+            self.get_executor().submit(self.run, job_id, stopped)
+        except Exception:
+            stopped.set()
+            raise
+
+    def beat(self, job_id, stopped):
+        """Update the heartbeat of a claimed job, while it waits in the queue or a step of it takes long"""
+        from note.models import NoteJob
+        try:
+            while not stopped.wait(self.stale_timeout / 3):
+                NoteJob.objects.filter(pk=job_id, status=NoteJob.STATUS_RUNNING).update(updated_at=timezone.now())
+        except Exception:
+            logger.exception('Heartbeat of job %s is failed', job_id)
+        finally:
+            connections.close_all()
+
+    def run(self, job_id, stopped):
+        from note.models import NoteJob
+        jobs = NoteJob.objects.filter(pk=job_id)
+        try:
+            job = jobs.get()
+            runner = get_job_runners()[job.kind]
+            for processed_count, speed, cursor in runner(job):
+                jobs.update(processed_count=processed_count, speed=speed, cursor=cursor, updated_at=timezone.now())
+
+            jobs.update(status=NoteJob.STATUS_DONE, updated_at=timezone.now(), finished_at=timezone.now())
+        except Exception as error:
+            logger.exception('Job %s is failed', job_id)
+            jobs.update(
+                status=NoteJob.STATUS_FAILED, error=str(error), updated_at=timezone.now(), finished_at=timezone.now(),
+            )
+        finally:
+            stopped.set()
+            connections.close_all()
+
+
+job_worker = JobWorker.from_settings()
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from note.archive import DUPLICATE_OVERWRITE, DUPLICATE_SKIP, import_archive
+
+
+class Command(BaseCommand):
+    help = 'Import notes from a zip or tar archive, e.g. from an Obsidian vault'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archive', type=str, help='Path to the archive')
+        parser.add_argument('--source-to', type=str, default=None)
+        parser.add_argument(
+            '--on-duplicate',
+            choices=(DUPLICATE_SKIP, DUPLICATE_OVERWRITE),
+            default=DUPLICATE_SKIP,
+            help='What to do with notes existing in the database',
+        )
+
+    def handle(self, *args, **options):
+        report = {}
+        notes = import_archive(options['archive'], options['source_to'], options['on_duplicate'], report=report)
+        for total_count, notes_per_second, _ in notes:
+            print(f'imported notes: {total_count} ({notes_per_second:.0f} notes/sec)')
+
+        print('images:', report['images'])
+        if report['duplicates_count']:
+            print('skipped duplicates:', report['duplicates_count'])
+            print('\n'.join(report['duplicates']))
+
+        if report['invalid']:
+            print('invalid files:')
+            print('\n'.join(report['invalid']))
+
+        print('importing is finished.')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from note.jobs import job_worker
+
+
+class Command(BaseCommand):
+    help = 'Resume background jobs interrupted by a stop of the server'
+
+    def handle(self, *args, **options):
+        count = job_worker.resume_stale(in_background=False)
+        print('resumed jobs:', count)
@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 
-from note.adapters import run_initiator
+from note.adapters import COPY_MODE_DIFF, COPY_MODE_FULL, run_initiator
 
 
 class Command(BaseCommand):
@@ -9,9 +9,17 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--source-from', type=str)
         parser.add_argument('--source-to', type=str, default=None)
+        parser.add_argument('--concurrency', type=int, default=None, help='Count of threads writing notes')
+        parser.add_argument(
+            '--mode',
+            choices=(COPY_MODE_FULL, COPY_MODE_DIFF),
+            default=COPY_MODE_FULL,
+            help='full - clear the database and copy all notes, diff - copy only changed notes and delete absent ones',
+        )
 
     def handle(self, *args, **options):
-        for total_count in run_initiator(options['source-from'], options['source-to']):
-            print('uploaded files into database:', total_count)
+        notes = run_initiator(options['source_from'], options['source_to'], options['concurrency'], options['mode'])
+        for total_count, notes_per_second, _ in notes:
+            print(f'uploaded files into database: {total_count} ({notes_per_second:.0f} notes/sec)')
 
         print('uploading is finished.')
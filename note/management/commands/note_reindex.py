@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from note.adapters.django_server_adapter import SEARCH_BACKENDS, get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from existing notes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backend',
+            type=str,
+            default=None,
+            choices=list(SEARCH_BACKENDS),
+            help='Name of search backend. By default, the backend of the database engine is used',
+        )
+
+    def handle(self, *args, **options):
+        backend = SEARCH_BACKENDS[options['backend']]() if options['backend'] else get_search_backend()
+        backend.rebuild()
+        print('search index "{}" is rebuilt.'.format(backend.name))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from note.models import NoteLink, NoteStorageServiceModel
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the graph of links between notes from existing notes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            type=str,
+            default=None,
+            help='Source of the storage whose links are rebuilt. By default, links of all storages are rebuilt',
+        )
+
+    def handle(self, *args, **options):
+        storage = None
+        if options['source']:
+            storage = NoteStorageServiceModel.objects.get(source=options['source'])
+
+        NoteLink.rebuild(storage)
+        print('links are rebuilt:', NoteLink.objects.count())
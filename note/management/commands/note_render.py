@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from note.models import Note
+from note.render import render_note_html
+
+
+class Command(BaseCommand):
+    help = 'Render HTML of notes and store it. Run it after changing of Markdown extensions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', type=str, default=None, help='Render notes of the storage only')
+        parser.add_argument('--empty', action='store_true', help='Render notes without stored HTML only')
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        notes = Note.objects.select_related('storage').only('pk', 'content', 'storage__source').order_by('pk')
+        if options['source']:
+            notes = notes.filter(storage__source=options['source'])
+
+        if options['empty']:
+            notes = notes.filter(content_html__isnull=True)
+
+        total_count = 0
+        portion = []
+        for note in notes.iterator(chunk_size=options['batch_size']):
+            note.content_html, note.excerpt_html = render_note_html(note.content, note.storage.source)
+            portion.append(note)
+            if len(portion) == options['batch_size']:
+                Note.objects.bulk_update(portion, ('content_html', 'excerpt_html'))
+                total_count += len(portion)
+                portion = []
+                print('rendered notes:', total_count)
+
+        Note.objects.bulk_update(portion, ('content_html', 'excerpt_html'))
+        total_count += len(portion)
+        print('rendering is finished. {} notes were rendered.'.format(total_count))
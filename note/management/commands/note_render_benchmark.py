@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+from markdownify.templatetags.markdownify import markdownify
+
+from note.adapters import get_storage_service
+from note.render import excerpt_markdown, get_extension_config, markdown_pool, separate_yaml
+
+SAMPLE_NOTE = """---
+tags: [benchmark]
+---
+# Заметка {0}
+
+Текст со [[ссылкой на заметку {0}]], #тегом и [ссылкой](obsidian://open?vault=default&file=note.md).
+
+| Колонка | Значение |
+|---------|----------|
+| {0}     | ![картинка](image.png) |
+"""
+
+
+class Command(BaseCommand):
+    help = 'Measure rendering time of a page of the note list: a new converter per note against pooled converters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', type=str, default=None)
+        parser.add_argument('--count-on-page', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        count_on_page = options['count_on_page']
+        with get_storage_service(options['source']) as (uploader, source):
+            notes, _ = uploader.get_list(1, count_on_page)
+
+        contents = [note['content'] for note in notes] or [SAMPLE_NOTE.format(num) for num in range(count_on_page)]
+        excerpts = [excerpt_markdown(separate_yaml(content)[1]) for content in contents]
+        config = get_extension_config(source)
+
+        def render_by_new_converter():
+            for excerpt in excerpts:
+                markdownify(excerpt, dynamic_extension_config=config)
+
+        def render_by_pooled_converter():
+            for excerpt in excerpts:
+                markdown_pool.convert(excerpt, source)
+
+        results = {}
+        for name, function in (('new converter', render_by_new_converter), ('pooled converter', render_by_pooled_converter)):
+            function()
+            start_time = time.perf_counter()
+            for _ in range(options['repeat']):
+                function()
+
+            results[name] = (time.perf_counter() - start_time) / (options['repeat'] * len(excerpts))
+            print('{}: {:.3f} ms per note'.format(name, results[name] * 1000))
+
+        print('speedup: {:.1f}x on {} notes of "{}"'.format(
+            results['new converter'] / results['pooled converter'], len(excerpts), source,
+        ))
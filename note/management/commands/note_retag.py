@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from note.models import NoteStorageServiceModel, NoteTag
+
+
+class Command(BaseCommand):
+    help = 'Rebuild hashtags of notes from existing notes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            type=str,
+            default=None,
+            help='Source of the storage whose tags are rebuilt. By default, tags of all storages are rebuilt',
+        )
+
+    def handle(self, *args, **options):
+        storage = None
+        if options['source']:
+            storage = NoteStorageServiceModel.objects.get(source=options['source'])
+
+        NoteTag.rebuild(storage)
+        print('tags are rebuilt:', NoteTag.objects.count())
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:07
+
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# a copy of `note.models.tokenize` at the moment of the migration
+TOKEN_PATTERN = re.compile(r'\w+')
+TOKEN_MAX_LENGTH = 64
+# search backends of database engines at the moment of the migration, other engines search by tokens
+VENDOR_SEARCH_BACKENDS = {'sqlite': 'fts5', 'postgresql': 'postgresql'}
+
+
+def tokenize(value):
+    return [token[:TOKEN_MAX_LENGTH] for token in TOKEN_PATTERN.findall(value.lower().replace('ё', 'е'))]
+
+
+def index_notes(apps, schema_editor):
+    """Fill the index of all notes. Other search backends don't maintain it, so it's filled only for its backend"""
+    vendor = schema_editor.connection.vendor
+    if (getattr(settings, 'NOTE_SEARCH_BACKEND', None) or VENDOR_SEARCH_BACKENDS.get(vendor, 'token')) == 'token':
+        fill_tokens(apps)
+
+
+def fill_tokens(apps):
+    Note = apps.get_model('note', 'Note')
+    NoteToken = apps.get_model('note', 'NoteToken')
+    tokens = []
+    for note in Note.objects.only('pk', 'storage_id', 'title', 'content').iterator():
+        for field, value in ((1, note.title), (2, note.content)):
+            for token, weight in Counter(tokenize(value)).items():
+                tokens.append(
+                    NoteToken(storage_id=note.storage_id, note_id=note.pk, field=field, token=token, weight=weight),
+                )
+
+        if len(tokens) >= 1000:
+            NoteToken.objects.bulk_create(tokens)
+            tokens = []
+
+    NoteToken.objects.bulk_create(tokens)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0011_alter_note_search_title_alter_note_title_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.PositiveSmallIntegerField(choices=[(1, 'Заголовок'), (2, 'Текст')], verbose_name='Поле')),
+                ('token', models.CharField(max_length=64, verbose_name='Токен')),
+                ('weight', models.PositiveIntegerField(default=1, verbose_name='Количество вхождений')),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens', to='note.note')),
+                ('storage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='note.notestorageservicemodel')),
+            ],
+            options={
+                'verbose_name': 'Токен заметки',
+                'verbose_name_plural': 'Токены заметок',
+                'indexes': [models.Index(fields=['storage', 'field', 'token'], name='index_note_token_lookup')],
+            },
+        ),
+        migrations.RunPython(index_notes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,103 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.db import OperationalError, migrations, transaction
+
+# SQL of search backends of `note.adapters.django_server_adapter` at the moment of the migration
+SQLITE_INSTALL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS note_fts USING fts5(
+        search_title, search_content,
+        content='app_note_note', content_rowid='id', tokenize='unicode61 remove_diacritics 0'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS note_fts_insert AFTER INSERT ON app_note_note BEGIN
+        INSERT INTO note_fts(rowid, search_title, search_content)
+        VALUES (new.id, new.search_title, new.search_content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS note_fts_delete AFTER DELETE ON app_note_note BEGIN
+        INSERT INTO note_fts(note_fts, rowid, search_title, search_content)
+        VALUES ('delete', old.id, old.search_title, old.search_content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS note_fts_update AFTER UPDATE OF search_title, search_content
+    ON app_note_note BEGIN
+        INSERT INTO note_fts(note_fts, rowid, search_title, search_content)
+        VALUES ('delete', old.id, old.search_title, old.search_content);
+        INSERT INTO note_fts(rowid, search_title, search_content)
+        VALUES (new.id, new.search_title, new.search_content);
+    END""",
+    "INSERT INTO note_fts(note_fts) VALUES ('rebuild')",
+)
+SQLITE_UNINSTALL = (
+    'DROP TRIGGER IF EXISTS note_fts_insert',
+    'DROP TRIGGER IF EXISTS note_fts_delete',
+    'DROP TRIGGER IF EXISTS note_fts_update',
+    'DROP TABLE IF EXISTS note_fts',
+)
+POSTGRESQL_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce({0}search_title, '')), 'A')"
+    " || setweight(to_tsvector('simple', coalesce({0}search_content, '')), 'B')"
+)
+POSTGRESQL_INSTALL = (
+    'ALTER TABLE app_note_note ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    'CREATE INDEX IF NOT EXISTS index_note_search_vector ON app_note_note USING GIN (search_vector)',
+    f"""CREATE OR REPLACE FUNCTION note_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {POSTGRESQL_VECTOR.format('NEW.')};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql""",
+    'DROP TRIGGER IF EXISTS note_search_vector_trigger ON app_note_note',
+    """CREATE TRIGGER note_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF search_title, search_content ON app_note_note
+    FOR EACH ROW EXECUTE FUNCTION note_search_vector_update()""",
+    f'UPDATE app_note_note SET search_vector = {POSTGRESQL_VECTOR.format("")}',
+)
+POSTGRESQL_UNINSTALL = (
+    'DROP TRIGGER IF EXISTS note_search_vector_trigger ON app_note_note',
+    'DROP FUNCTION IF EXISTS note_search_vector_update()',
+    'ALTER TABLE app_note_note DROP COLUMN IF EXISTS search_vector',
+)
+# the default search backend of a database engine, it may be changed by `NOTE_SEARCH_BACKEND` setting
+VENDOR_SQL = {
+    'sqlite': ('fts5', SQLITE_INSTALL, SQLITE_UNINSTALL),
+    'postgresql': ('postgresql', POSTGRESQL_INSTALL, POSTGRESQL_UNINSTALL),
+}
+
+
+def get_sql(vendor, is_install):
+    backend_name, sql_install, sql_uninstall = VENDOR_SQL.get(vendor, (None, (), ()))
+    if getattr(settings, 'NOTE_SEARCH_BACKEND', None) not in (None, backend_name):
+        return ()
+
+    return sql_install if is_install else sql_uninstall
+
+
+def install_search_backend(apps, schema_editor):
+    connection = schema_editor.connection
+    sql_install = get_sql(connection.vendor, True)
+    if connection.vendor == 'sqlite' and sql_install:
+        try:
+            with transaction.atomic(using=connection.alias):
+                schema_editor.execute(sql_install[0])
+        except OperationalError:
+            # SQLite is built without FTS5, so notes are searched by the token index, which is filled here
+            import_module('note.migrations.0012_note_token').fill_tokens(apps)
+            return
+
+    for sql in sql_install:
+        schema_editor.execute(sql)
+
+
+def uninstall_search_backend(apps, schema_editor):
+    for sql in get_sql(schema_editor.connection.vendor, False):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0012_note_token'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_backend, uninstall_search_backend),
+    ]
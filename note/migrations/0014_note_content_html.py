@@ -0,0 +1,23 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0013_search_backend'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='content_html',
+            field=models.TextField(blank=True, null=True, verbose_name='HTML текста'),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='excerpt_html',
+            field=models.TextField(blank=True, null=True, verbose_name='HTML начала текста'),
+        ),
+    ]
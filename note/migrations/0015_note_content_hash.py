@@ -0,0 +1,38 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:20
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def get_content_hash(content):
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def fetch_hashes(apps, schema_editor):
+    Note = apps.get_model('note', 'Note')
+    notes = []
+    for note in Note.objects.only('pk', 'content').iterator():
+        note.content_hash = get_content_hash(note.content)
+        notes.append(note)
+        if len(notes) >= 1000:
+            Note.objects.bulk_update(notes, ['content_hash'])
+            notes = []
+
+    Note.objects.bulk_update(notes, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0014_note_content_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=40, null=True, verbose_name='Хеш текста'),
+        ),
+        migrations.RunPython(fetch_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('note', '0015_note_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('copy', 'Копирование заметок из одной базы в другую')], max_length=20, verbose_name='Вид задачи')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает запуска'), ('running', 'Выполняется'), ('done', 'Завершена'), ('failed', 'Завершена с ошибкой')], db_index=True, default='pending', max_length=10, verbose_name='Статус')),
+                ('params', models.JSONField(default=dict, verbose_name='Параметры')),
+                ('cursor', models.CharField(blank=True, max_length=240, null=True, verbose_name='Курсор')),
+                ('processed_count', models.PositiveIntegerField(default=0, verbose_name='Обработано заметок')),
+                ('speed', models.FloatField(default=0, verbose_name='Скорость, заметок в секунду')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлена')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Задача',
+                'verbose_name_plural': 'Задачи',
+            },
+        ),
+    ]
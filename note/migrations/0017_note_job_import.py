@@ -0,0 +1,23 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0016_note_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notejob',
+            name='result',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Результат'),
+        ),
+        migrations.AlterField(
+            model_name='notejob',
+            name='kind',
+            field=models.CharField(choices=[('copy', 'Копирование заметок из одной базы в другую'), ('import', 'Импорт заметок из архива')], max_length=20, verbose_name='Вид задачи'),
+        ),
+    ]
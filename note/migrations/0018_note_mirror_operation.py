@@ -0,0 +1,36 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('note', '0017_note_job_import'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteMirrorOperation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=240, verbose_name='Заголовок')),
+                ('operation', models.PositiveSmallIntegerField(choices=[(1, 'Добавление или изменение'), (2, 'Удаление')], verbose_name='Операция')),
+                ('content', models.TextField(blank=True, null=True, verbose_name='Текст')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлена')),
+                ('storage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='note.notestorageservicemodel')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Операция над копией заметки',
+                'verbose_name_plural': 'Операции над копиями заметок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='notemirroroperation',
+            constraint=models.UniqueConstraint(fields=('storage', 'title'), name='unique_note_mirror_operation_storage_title'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:29
+
+import re
+from urllib.parse import parse_qs
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# a copy of `note.models.get_note_links` at the moment of the migration
+NOT_VERT_PATTERN = r'(?:[^|]|\\\|)'
+WIKI_LINK_REGEX = re.compile(rf'\[\[({NOT_VERT_PATTERN}*?)(\|{NOT_VERT_PATTERN}*?)?\]\]')
+OBSIDIAN_URL_REGEX = re.compile(r'obsidian://open\?([^\s()<>"\']+)')
+
+
+def get_note_links(source, content):
+    links = set()
+    for match in WIKI_LINK_REGEX.finditer(content):
+        title = (match.group(1) or '').strip().replace('\\|', '|')
+        if title:
+            links.add((source, title))
+
+    for match in OBSIDIAN_URL_REGEX.finditer(content):
+        query = parse_qs(match.group(1).replace('&amp;', '&'))
+        vault = query.get('vault')
+        file = query.get('file')
+        if vault and file:
+            links.add((vault[0], file[0][:-3] if file[0].endswith('.md') else file[0]))
+
+    return {(target_source, target_title[:240]) for target_source, target_title in links if len(target_source) <= 30}
+
+
+def fetch_links(apps, schema_editor):
+    Note = apps.get_model('note', 'Note')
+    NoteLink = apps.get_model('note', 'NoteLink')
+    links = []
+    for note in Note.objects.select_related('storage').only('pk', 'storage__source', 'content').iterator():
+        for target_source, target_title in get_note_links(note.storage.source, note.content):
+            links.append(NoteLink(
+                storage_id=note.storage_id, note_id=note.pk, target_source=target_source, target_title=target_title,
+            ))
+
+        if len(links) >= 1000:
+            NoteLink.objects.bulk_create(links)
+            links = []
+
+    NoteLink.objects.bulk_create(links)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0018_note_mirror_operation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_source', models.CharField(max_length=30, verbose_name='База целевой заметки')),
+                ('target_title', models.CharField(max_length=240, verbose_name='Заголовок целевой заметки')),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='links', to='note.note')),
+                ('storage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='note.notestorageservicemodel')),
+            ],
+            options={
+                'verbose_name': 'Ссылка заметки',
+                'verbose_name_plural': 'Ссылки заметок',
+                'indexes': [models.Index(fields=['target_source', 'target_title'], name='index_note_link_target'), models.Index(fields=['storage', 'target_source', 'target_title'], name='index_note_link_storage')],
+            },
+        ),
+        migrations.RunPython(fetch_links, migrations.RunPython.noop),
+    ]
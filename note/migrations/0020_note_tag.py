@@ -0,0 +1,53 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:30
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# a copy of `note.models.get_note_tags` at the moment of the migration
+TAG_REGEX = re.compile(r'(?:^|[\s])(#[a-zA-Zа-яА-ЯёЁ][a-zA-Z0-9а-яА-ЯёЁ_-]*)')
+
+
+def get_note_tags(content):
+    return {tag.lstrip('#').lower().replace('ё', 'е')[:64] for tag in TAG_REGEX.findall(content)}
+
+
+def fetch_tags(apps, schema_editor):
+    Note = apps.get_model('note', 'Note')
+    NoteTag = apps.get_model('note', 'NoteTag')
+    tags = []
+    for note in Note.objects.only('pk', 'storage_id', 'content').iterator():
+        for tag in get_note_tags(note.content):
+            tags.append(NoteTag(storage_id=note.storage_id, note_id=note.pk, tag=tag))
+
+        if len(tags) >= 1000:
+            NoteTag.objects.bulk_create(tags)
+            tags = []
+
+    NoteTag.objects.bulk_create(tags)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0019_note_link'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=64, verbose_name='Тег')),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tags', to='note.note')),
+                ('storage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='note.notestorageservicemodel')),
+            ],
+            options={
+                'verbose_name': 'Тег заметки',
+                'verbose_name_plural': 'Теги заметок',
+                'indexes': [models.Index(fields=['storage', 'tag'], name='index_note_tag_lookup')],
+            },
+        ),
+        migrations.RunPython(fetch_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:35
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# copies of the code of the fuzzy search at the moment of the migration
+POSTGRESQL_INSTALL_FUZZY = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS index_note_search_title_trgm'
+    ' ON app_note_note USING GIN (search_title gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS index_note_search_content_trgm'
+    ' ON app_note_note USING GIN (search_content gin_trgm_ops)',
+)
+TOKEN_PATTERN = re.compile(r'\w+')
+TOKEN_MAX_LENGTH = 64
+
+
+def tokenize(value):
+    return [token[:TOKEN_MAX_LENGTH] for token in TOKEN_PATTERN.findall(value.lower().replace('ё', 'е'))]
+
+
+def get_trigrams(token):
+    padded_token = f'  {token} '
+    return {padded_token[index:index + 3] for index in range(len(padded_token) - 2)}
+
+
+def fill_vocabulary(apps):
+    Note = apps.get_model('note', 'Note')
+    NoteTerm = apps.get_model('note', 'NoteTerm')
+    NoteTermTrigram = apps.get_model('note', 'NoteTermTrigram')
+    terms_by_storage = {}
+    for note in Note.objects.only('storage_id', 'title', 'content').iterator():
+        terms_by_storage.setdefault(note.storage_id, set()).update(tokenize(note.title), tokenize(note.content))
+
+    for storage_id, terms in terms_by_storage.items():
+        terms = sorted(terms)
+        for index in range(0, len(terms), 500):
+            trigrams = {term: get_trigrams(term) for term in terms[index:index + 500]}
+            NoteTerm.objects.bulk_create([
+                NoteTerm(storage_id=storage_id, term=term, trigram_count=len(term_trigrams))
+                for term, term_trigrams in trigrams.items()
+            ])
+            term_ids = NoteTerm.objects.filter(storage_id=storage_id, term__in=trigrams).values_list('term', 'pk')
+            NoteTermTrigram.objects.bulk_create([
+                NoteTermTrigram(storage_id=storage_id, term_id=term_id, trigram=trigram)
+                for term, term_id in term_ids for trigram in trigrams[term]
+            ])
+
+
+def install_fuzzy_search(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    backend_name = getattr(settings, 'NOTE_SEARCH_BACKEND', None) or {'postgresql': 'postgresql'}.get(vendor)
+    if backend_name == 'postgresql':
+        for sql in POSTGRESQL_INSTALL_FUZZY:
+            schema_editor.execute(sql)
+    else:
+        fill_vocabulary(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0020_note_tag'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Термин')),
+                ('trigram_count', models.PositiveSmallIntegerField(verbose_name='Количество триграмм')),
+                ('storage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='note.notestorageservicemodel')),
+            ],
+            options={
+                'verbose_name': 'Термин заметок',
+                'verbose_name_plural': 'Термины заметок',
+            },
+        ),
+        migrations.CreateModel(
+            name='NoteTermTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3, verbose_name='Триграмма')),
+                ('storage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='note.notestorageservicemodel')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='note.noteterm')),
+            ],
+            options={
+                'verbose_name': 'Триграмма термина',
+                'verbose_name_plural': 'Триграммы терминов',
+                'indexes': [models.Index(fields=['storage', 'trigram'], name='index_note_term_trigram')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='notetermtrigram',
+            constraint=models.UniqueConstraint(fields=('term', 'trigram'), name='unique_note_term_trigram'),
+        ),
+        migrations.AddConstraint(
+            model_name='noteterm',
+            constraint=models.UniqueConstraint(fields=('storage', 'term'), name='unique_note_term_storage_term'),
+        ),
+        migrations.RunPython(install_fuzzy_search, migrations.RunPython.noop),
+    ]
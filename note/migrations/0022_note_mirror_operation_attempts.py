@@ -0,0 +1,28 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0021_note_term'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notemirroroperation',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество неудачных попыток'),
+        ),
+        migrations.AddField(
+            model_name='notemirroroperation',
+            name='error',
+            field=models.TextField(blank=True, null=True, verbose_name='Последняя ошибка'),
+        ),
+        migrations.AddField(
+            model_name='notemirroroperation',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Следующая попытка'),
+        ),
+    ]
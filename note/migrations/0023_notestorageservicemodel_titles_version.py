@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0022_note_mirror_operation_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notestorageservicemodel',
+            name='titles_version',
+            field=models.PositiveIntegerField(default=0, help_text='Увеличивается при каждом изменении заголовков заметок базы', verbose_name='Версия заголовков заметок'),
+        ),
+    ]
@@ -0,0 +1,235 @@
+import atexit
+import datetime
+import logging
+import threading
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIRROR_INTERVAL = 1
+DEFAULT_MIRROR_BATCH_SIZE = 400
+DEFAULT_MIRROR_MAX_ATTEMPTS = 5
+
+
+class MirrorQueue:
+    """Write-behind queue of operations over local mirrors of notes of external storages.
+
+    Adapters persist operations into `NoteMirrorOperation` by a single upsert, so requests don't wait for
+    rendering and indexing of notes, and operations survive a restart. A background thread applies persisted
+    operations to `Note` by bulk queries every `interval` seconds. Operations over the same title are coalesced
+    in the table: only the last one is applied. Operations left by a previous process are applied after the first
+    request of the server. A failing operation is postponed with a growing delay, so it
+    doesn't block the following ones, and is left as dead after `max_attempts` failures.
+    """
+
+    def __init__(
+        self,
+        interval=DEFAULT_MIRROR_INTERVAL,
+        batch_size=DEFAULT_MIRROR_BATCH_SIZE,
+        max_attempts=DEFAULT_MIRROR_MAX_ATTEMPTS,
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.put_count = 0
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.event = threading.Event()
+        self.thread = None
+        self.is_resumed = False
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            getattr(settings, 'NOTE_MIRROR_INTERVAL', DEFAULT_MIRROR_INTERVAL),
+            getattr(settings, 'NOTE_MIRROR_BATCH_SIZE', DEFAULT_MIRROR_BATCH_SIZE),
+            getattr(settings, 'NOTE_MIRROR_MAX_ATTEMPTS', DEFAULT_MIRROR_MAX_ATTEMPTS),
+        )
+
+    def put(self, storage, title, operation, content=None, user=None):
+        self.put_many(storage, operation, [(title, content)], user)
+
+    def put_many(self, storage, operation, notes, user=None):
+        """Persist the operation over notes given as pairs of a title and a content by a single upsert"""
+        from note.models import NoteMirrorOperation
+        user_id = user.pk if user and user.pk else None
+        update_fields = ['operation', 'content', 'updated_at', 'attempts', 'error', 'next_attempt_at']
+        if user_id is not None:
+            # the creator of a note is kept when the note is changed before applying
+            update_fields.append('user')
+
+        # a title may be upserted once by a query
+        notes = dict(notes)
+        if not notes:
+            return
+
+        NoteMirrorOperation.objects.bulk_create(
+            [
+                NoteMirrorOperation(
+                    storage_id=storage.pk, title=title, operation=operation, content=content, user_id=user_id,
+                )
+                for title, content in notes.items()
+            ],
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=('storage', 'title'),
+            update_fields=update_fields,
+        )
+        with self.lock:
+            self.put_count += len(notes)
+            put_count = self.put_count
+
+        self.start()
+        if put_count >= self.batch_size:
+            self.event.set()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='note-mirror', daemon=True)
+                self.thread.start()
+
+    def resume(self):
+        """Start applying operations persisted before a restart of the process. It's checked once per process"""
+        from note.models import NoteMirrorOperation
+        with self.lock:
+            if self.is_resumed:
+                return
+
+            self.is_resumed = True
+
+        if NoteMirrorOperation.objects.exists():
+            self.start()
+
+    @staticmethod
+    def lock_storage(storage_id):
+        """Lock the row of the storage till the end of the transaction"""
+        from note.models import NoteStorageServiceModel
+        list(NoteStorageServiceModel.objects.select_for_update().filter(pk=storage_id).values_list('pk', flat=True))
+
+    def discard(self, storage, queryset):
+        """Drop pending operations of a storage and its mirrored notes of `queryset`.
+
+        The storage is locked like while applying, so operations being applied don't restore deleted notes.
+        """
+        from note.models import NoteMirrorOperation
+        with self.flush_lock, transaction.atomic():
+            self.lock_storage(storage.pk)
+            NoteMirrorOperation.objects.filter(storage=storage).delete()
+            queryset.delete()
+
+    def run(self):
+        while True:
+            self.event.wait(self.interval)
+            self.event.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Operations over mirrors of notes are not flushed')
+            finally:
+                connections.close_all()
+
+    def flush_on_exit(self):
+        if self.thread is not None:
+            self.flush()
+
+    def flush(self):
+        """Apply all persisted operations, which are ready to be applied"""
+        with self.flush_lock:
+            with self.lock:
+                self.put_count = 0
+
+            while self.apply():
+                pass
+
+    def get_ready_operations(self):
+        from note.models import NoteMirrorOperation
+        return NoteMirrorOperation.objects.filter(
+            Q(next_attempt_at=None) | Q(next_attempt_at__lte=timezone.now()),
+            attempts__lt=self.max_attempts,
+        )
+
+    def apply(self):
+        """Apply a batch of persisted operations. Return count of taken operations"""
+        operations = list(self.get_ready_operations().select_related('storage').order_by('pk')[:self.batch_size])
+        storages = {operation.storage_id: operation.storage for operation in operations}
+        for storage_id, storage in storages.items():
+            storage_operations = [operation for operation in operations if operation.storage_id == storage_id]
+            try:
+                self.apply_storage_operations(storage, storage_operations)
+            except Exception:
+                # the failing operations are found by applying operations one by one
+                for operation in storage_operations:
+                    try:
+                        self.apply_storage_operations(storage, [operation])
+                    except Exception as error:
+                        self.postpone(operation, error)
+
+        return len(operations)
+
+    def apply_storage_operations(self, storage, operations):
+        from note.adapters.django_server_adapter import get_search_backend
+        from note.models import Note, NoteLink, NoteMirrorOperation, NoteTag
+
+        with transaction.atomic():
+            self.lock_storage(storage.pk)
+            # operations discarded while they were taken are skipped
+            existing_pks = set(
+                NoteMirrorOperation.objects.filter(pk__in=[operation.pk for operation in operations])
+                .values_list('pk', flat=True)
+            )
+            operations = [operation for operation in operations if operation.pk in existing_pks]
+            if not operations:
+                return
+
+            deleted_titles = [
+                operation.title for operation in operations
+                if operation.operation == NoteMirrorOperation.OPERATION_DELETE
+            ]
+            notes = []
+            for operation in operations:
+                if operation.operation == NoteMirrorOperation.OPERATION_UPSERT:
+                    note = Note(
+                        storage=storage, title=operation.title, content=operation.content, user_id=operation.user_id,
+                    )
+                    note.fetch_search_fields()
+                    note.fetch_html_fields()
+                    notes.append(note)
+
+            Note.objects.filter(storage=storage, title__in=deleted_titles).delete()
+            if notes:
+                notes = Note.bulk_upsert(storage, notes, self.batch_size)
+                get_search_backend().index_notes(notes)
+                NoteLink.index_notes(notes)
+                NoteTag.index_notes(notes)
+
+            # operations changed while they were applied are left to be applied again
+            applied = reduce(or_, (Q(pk=operation.pk, updated_at=operation.updated_at) for operation in operations))
+            NoteMirrorOperation.objects.filter(applied).delete()
+
+    def postpone(self, operation, error):
+        """Postpone a failed operation with a growing delay or leave it as dead after the last attempt"""
+        from note.models import NoteMirrorOperation
+        attempts = operation.attempts + 1
+        if attempts >= self.max_attempts:
+            logger.error('Operation over the mirror of note "%s" is dead: %s', operation.title, error)
+        else:
+            logger.warning('Operation over the mirror of note "%s" is failed: %s', operation.title, error)
+
+        delay = datetime.timedelta(seconds=self.interval * 2 ** attempts)
+        # an operation changed by a new write is tried again at once
+        NoteMirrorOperation.objects.filter(pk=operation.pk, updated_at=operation.updated_at).update(
+            attempts=attempts,
+            error=repr(error),
+            next_attempt_at=timezone.now() + delay,
+        )
+
+
+mirror_queue = MirrorQueue.from_settings()
+atexit.register(mirror_queue.flush_on_exit)
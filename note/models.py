@@ -1,4 +1,7 @@
+import hashlib
+import re
 import uuid
+from collections import Counter
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -11,10 +14,59 @@ from note.adapters import get_service_names
 from note.validators import FilenameValidator
 
 
+TOKEN_PATTERN = re.compile(r'\w+')
+TOKEN_MAX_LENGTH = 64
+NOTE_TITLE_MAX_LENGTH = 240
+STORAGE_SOURCE_MAX_LENGTH = 30
+TAG_MAX_LENGTH = 64
+
+
 def prepare_to_search(value):
     return value.lower().replace('ё', 'е')
 
 
+def get_content_hash(content):
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def tokenize(value):
+    """Split a text to search tokens. Tokens are prepared by `prepare_to_search`"""
+    return [token[:TOKEN_MAX_LENGTH] for token in TOKEN_PATTERN.findall(prepare_to_search(value))]
+
+
+def get_trigrams(token):
+    """Return trigrams of a token padded like in `pg_trgm`, so that beginnings of words weigh more"""
+    padded_token = f'  {token} '
+    return {padded_token[index:index + 3] for index in range(len(padded_token) - 2)}
+
+
+def get_trigram_similarity(trigrams, other_trigrams):
+    return len(trigrams & other_trigrams) / len(trigrams | other_trigrams)
+
+
+def normalize_tag(tag):
+    """Return a tag without the leading `#` prepared by `prepare_to_search`"""
+    return prepare_to_search(tag.lstrip('#'))[:TAG_MAX_LENGTH]
+
+
+def get_note_tags(content):
+    """Return normalized hashtags of a note"""
+    from utils.md_extensions.tags_like_links import TAG_REGEX
+    return {normalize_tag(tag) for tag in TAG_REGEX.findall(content)}
+
+
+def get_note_links(source, content):
+    """Return pairs `(target_source, target_title)` of wiki links and Obsidian links of a note of the storage"""
+    from utils.md_extensions.obsidian_links import collect_obsidian_links
+    from utils.md_extensions.wiki_links import collect_wiki_titles
+    links = {(source, title) for title in collect_wiki_titles(content)}
+    links.update(collect_obsidian_links(content))
+    return {
+        (target_source, target_title[:NOTE_TITLE_MAX_LENGTH]) for target_source, target_title in links
+        if len(target_source) <= STORAGE_SOURCE_MAX_LENGTH
+    }
+
+
 class Note(models.Model):
     storage = models.ForeignKey(
         'note.NoteStorageServiceModel',
@@ -32,12 +84,22 @@ class Note(models.Model):
     content = models.TextField(verbose_name='Текст', null=False)
     search_content = models.TextField(verbose_name='Текст для поиска', null=False)
     search_title = models.TextField(verbose_name='Заголовок для поиска', max_length=240, null=False, db_index=True)
+    content_html = models.TextField(verbose_name='HTML текста', null=True, blank=True)
+    excerpt_html = models.TextField(verbose_name='HTML начала текста', null=True, blank=True)
+    content_hash = models.CharField(verbose_name='Хеш текста', max_length=40, null=True, blank=True)
     linker = GenericRelation(Linker, related_query_name='note')
     user = models.ForeignKey(get_user_model(), null=True, on_delete=models.CASCADE)
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        note = super().from_db(db, field_names, values)
+        # the loaded title is kept to know if the note is renamed on saving
+        note.loaded_title = note.__dict__.get('title')
+        return note
+
     @property
     def url(self):
         return '{}{}'.format(settings.SITE_URL, resolve_url('note_editor2', self.storage.source, self.title))
@@ -57,9 +119,381 @@ class Note(models.Model):
             models.Index(fields=('storage',), name='index_note_storage'),
         ]
 
+    UPSERT_FIELDS = ('content', 'search_content', 'search_title', 'content_html', 'excerpt_html', 'content_hash')
+
     def fetch_search_fields(self):
+        """Fill fields derived from the title and the content: fields for searching and the hash of the content"""
         self.search_content = prepare_to_search(self.content)
         self.search_title = prepare_to_search(self.title)
+        self.content_hash = get_content_hash(self.content)
+
+    @classmethod
+    def bulk_upsert(cls, storage, notes, batch_size=400):
+        """Insert notes or update existing notes with the same titles. Return the saved notes fetched again,
+        because primary keys of updated notes are unknown after the upsert"""
+        from note.suggest import title_indexes
+        cls.objects.bulk_create(
+            notes,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=('storage', 'title'),
+            update_fields=cls.UPSERT_FIELDS,
+        )
+        title_indexes.invalidate(storage.pk)
+        return list(cls.objects.filter(storage=storage, title__in=[note.title for note in notes]))
+
+    def fetch_html_fields(self):
+        from note.render import render_note_html
+        self.content_html, self.excerpt_html = render_note_html(self.content, self.storage.source)
+
+    @classmethod
+    def fetch_pks(cls, notes):
+        """Set primary keys of saved notes, which are not returned by `bulk_create` on some databases, e.g. MySQL"""
+        notes_without_pk = {}
+        for note in notes:
+            if note.pk is None:
+                notes_without_pk.setdefault(note.storage_id, {})[note.title] = note
+
+        for storage_id, notes_by_title in notes_without_pk.items():
+            saved_notes = cls.objects.filter(storage_id=storage_id, title__in=list(notes_by_title))
+            for title, pk in saved_notes.values_list('title', 'pk'):
+                notes_by_title[title].pk = pk
+
+
+class NoteToken(models.Model):
+    """Inverted index of notes: a token of a note's field and count of its occurrences"""
+    FIELD_TITLE = 1
+    FIELD_CONTENT = 2
+    CHOICES_FIELD = (
+        (FIELD_TITLE, 'Заголовок'),
+        (FIELD_CONTENT, 'Текст'),
+    )
+    storage = models.ForeignKey(
+        'note.NoteStorageServiceModel',
+        null=False,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    note = models.ForeignKey(Note, null=False, on_delete=models.CASCADE, related_name='tokens')
+    field = models.PositiveSmallIntegerField(verbose_name='Поле', choices=CHOICES_FIELD, null=False)
+    token = models.CharField(verbose_name='Токен', max_length=TOKEN_MAX_LENGTH, null=False)
+    weight = models.PositiveIntegerField(verbose_name='Количество вхождений', default=1)
+
+    class Meta:
+        verbose_name = 'Токен заметки'
+        verbose_name_plural = 'Токены заметок'
+        indexes = [
+            models.Index(fields=('storage', 'field', 'token'), name='index_note_token_lookup'),
+        ]
+
+    @classmethod
+    def build(cls, note):
+        tokens = []
+        for field, value in ((cls.FIELD_TITLE, note.title), (cls.FIELD_CONTENT, note.content)):
+            for token, weight in Counter(tokenize(value)).items():
+                tokens.append(cls(storage_id=note.storage_id, note=note, field=field, token=token, weight=weight))
+
+        return tokens
+
+    @classmethod
+    def index_notes(cls, notes, batch_size=1000):
+        """Rebuild tokens of the saved notes"""
+        Note.fetch_pks(notes)
+        cls.objects.filter(note__in=[note.pk for note in notes]).delete()
+        tokens = []
+        for note in notes:
+            tokens.extend(cls.build(note))
+
+        cls.objects.bulk_create(tokens, batch_size)
+
+
+class NoteTerm(models.Model):
+    """Vocabulary of tokens of notes of a storage for the fuzzy search.
+
+    Terms of deleted notes are kept until the index is rebuilt: they only add candidates which match nothing.
+    """
+    storage = models.ForeignKey(
+        'note.NoteStorageServiceModel',
+        null=False,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    term = models.CharField(verbose_name='Термин', max_length=TOKEN_MAX_LENGTH, null=False)
+    trigram_count = models.PositiveSmallIntegerField(verbose_name='Количество триграмм', null=False)
+
+    class Meta:
+        verbose_name = 'Термин заметок'
+        verbose_name_plural = 'Термины заметок'
+        constraints = [
+            models.UniqueConstraint(fields=('storage', 'term'), name='unique_note_term_storage_term'),
+        ]
+
+    @classmethod
+    def index_notes(cls, notes, batch_size=500):
+        """Add new tokens of the saved notes and their trigrams to the vocabulary"""
+        terms_by_storage = {}
+        for note in notes:
+            terms = terms_by_storage.setdefault(note.storage_id, set())
+            terms.update(tokenize(note.title), tokenize(note.content))
+
+        for storage_id, terms in terms_by_storage.items():
+            terms = sorted(terms)
+            for index in range(0, len(terms), batch_size):
+                cls.add_terms(storage_id, terms[index:index + batch_size])
+
+    @classmethod
+    def add_terms(cls, storage_id, terms):
+        existed_terms = set(cls.objects.filter(storage_id=storage_id, term__in=terms).values_list('term', flat=True))
+        new_terms = {term: get_trigrams(term) for term in terms if term not in existed_terms}
+        if not new_terms:
+            return
+
+        cls.objects.bulk_create(
+            [
+                cls(storage_id=storage_id, term=term, trigram_count=len(trigrams))
+                for term, trigrams in new_terms.items()
+            ],
+            ignore_conflicts=True,
+        )
+        term_ids = cls.objects.filter(storage_id=storage_id, term__in=new_terms).values_list('term', 'pk')
+        NoteTermTrigram.objects.bulk_create(
+            [
+                NoteTermTrigram(storage_id=storage_id, term_id=term_id, trigram=trigram)
+                for term, term_id in term_ids for trigram in new_terms[term]
+            ],
+            ignore_conflicts=True,
+        )
+
+    @classmethod
+    def rebuild(cls, batch_size=1000):
+        """Rebuild the vocabulary from existing notes"""
+        cls.objects.all().delete()
+        notes = []
+        for note in Note.objects.only('pk', 'storage_id', 'title', 'content').iterator():
+            notes.append(note)
+            if len(notes) == batch_size:
+                cls.index_notes(notes)
+                notes = []
+
+        cls.index_notes(notes)
+
+    @classmethod
+    def find_similar(cls, storage, token, threshold, limit):
+        """Return up to `limit` pairs `(term, similarity)` of terms of the storage similar to the token.
+
+        Similarity is the share of common trigrams like in `pg_trgm`. Only terms with comparable counts
+        of trigrams may reach the threshold, so other terms are skipped before counting common trigrams.
+        """
+        trigrams = get_trigrams(token)
+        trigram_count = len(trigrams)
+        common_count = models.Count('pk')
+        similarity = models.ExpressionWrapper(
+            common_count * 1.0 / (trigram_count + models.F('term__trigram_count') - common_count),
+            output_field=models.FloatField(),
+        )
+        return list(
+            NoteTermTrigram.objects
+            .filter(
+                storage=storage,
+                trigram__in=trigrams,
+                term__trigram_count__gte=trigram_count * threshold,
+                term__trigram_count__lte=trigram_count / threshold,
+            )
+            .values('term__term', 'term__trigram_count')
+            .annotate(similarity=similarity)
+            .filter(similarity__gte=threshold)
+            .order_by('-similarity', 'term__term')
+            .values_list('term__term', 'similarity')[:limit]
+        )
+
+
+class NoteTermTrigram(models.Model):
+    """Trigram of a term of the vocabulary of notes"""
+    storage = models.ForeignKey(
+        'note.NoteStorageServiceModel',
+        null=False,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    term = models.ForeignKey(NoteTerm, null=False, on_delete=models.CASCADE, related_name='trigrams')
+    trigram = models.CharField(verbose_name='Триграмма', max_length=3, null=False)
+
+    class Meta:
+        verbose_name = 'Триграмма термина'
+        verbose_name_plural = 'Триграммы терминов'
+        constraints = [
+            models.UniqueConstraint(fields=('term', 'trigram'), name='unique_note_term_trigram'),
+        ]
+        indexes = [
+            models.Index(fields=('storage', 'trigram'), name='index_note_term_trigram'),
+        ]
+
+
+class NoteLink(models.Model):
+    """Edge of the graph of notes: a wiki link or an Obsidian link from a note to a title.
+
+    The target is kept by the source of its storage and its title, not by a foreign key,
+    so links to missing notes and missing storages are kept too and may be found as dangling.
+    """
+    storage = models.ForeignKey(
+        'note.NoteStorageServiceModel',
+        null=False,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    note = models.ForeignKey(Note, null=False, on_delete=models.CASCADE, related_name='links')
+    target_source = models.CharField(verbose_name='База целевой заметки', max_length=STORAGE_SOURCE_MAX_LENGTH)
+    target_title = models.CharField(verbose_name='Заголовок целевой заметки', max_length=NOTE_TITLE_MAX_LENGTH)
+
+    class Meta:
+        verbose_name = 'Ссылка заметки'
+        verbose_name_plural = 'Ссылки заметок'
+        indexes = [
+            models.Index(fields=('target_source', 'target_title'), name='index_note_link_target'),
+            models.Index(fields=('storage', 'target_source', 'target_title'), name='index_note_link_storage'),
+        ]
+
+    @classmethod
+    def build(cls, note, source):
+        return [
+            cls(storage_id=note.storage_id, note=note, target_source=target_source, target_title=target_title)
+            for target_source, target_title in get_note_links(source, note.content)
+        ]
+
+    @classmethod
+    def index_notes(cls, notes, batch_size=1000):
+        """Rebuild links of the saved notes"""
+        cls.objects.filter(note__in=[note.pk for note in notes]).delete()
+        sources = dict(
+            NoteStorageServiceModel.objects
+            .filter(pk__in={note.storage_id for note in notes})
+            .values_list('pk', 'source'),
+        )
+        links = []
+        for note in notes:
+            links.extend(cls.build(note, sources[note.storage_id]))
+
+        cls.objects.bulk_create(links, batch_size)
+
+    @classmethod
+    def rebuild(cls, storage=None, batch_size=1000):
+        """Rebuild links of all notes or of notes of the storage from their contents"""
+        notes_queryset = Note.objects.select_related('storage').only('pk', 'storage__source', 'content')
+        links_queryset = cls.objects.all()
+        if storage is not None:
+            notes_queryset = notes_queryset.filter(storage=storage)
+            links_queryset = links_queryset.filter(storage=storage)
+
+        links_queryset.delete()
+        links = []
+        for note in notes_queryset.iterator():
+            links.extend(cls.build(note, note.storage.source))
+            if len(links) >= batch_size:
+                cls.objects.bulk_create(links)
+                links = []
+
+        cls.objects.bulk_create(links)
+
+    @classmethod
+    def get_backlinks(cls, source, title):
+        """Return a queryset of notes linking to the note `title` of the storage `source`"""
+        return (
+            Note.objects
+            .filter(links__target_source=source, links__target_title=title)
+            .distinct()
+            .order_by('storage__source', 'title')
+        )
+
+    @classmethod
+    def get_outgoing(cls, storage, title):
+        """Return a queryset of links of the note `title` of the storage annotated by existence of their targets"""
+        return (
+            cls.objects
+            .filter(note__storage=storage, note__title=title)
+            .annotate(is_existed=cls.target_exists())
+            .order_by('target_source', 'target_title')
+        )
+
+    @classmethod
+    def get_dangling(cls, storage):
+        """Return a queryset of links of notes of the storage to missing notes"""
+        return (
+            cls.objects
+            .filter(storage=storage)
+            .annotate(is_existed=cls.target_exists())
+            .filter(is_existed=False)
+            .select_related('note')
+            .order_by('target_source', 'target_title', 'note__title')
+        )
+
+    @staticmethod
+    def target_exists():
+        return models.Exists(Note.objects.filter(
+            storage__source=models.OuterRef('target_source'), title=models.OuterRef('target_title'),
+        ))
+
+
+class NoteTag(models.Model):
+    """Hashtag of a note normalized by `normalize_tag`"""
+    storage = models.ForeignKey(
+        'note.NoteStorageServiceModel',
+        null=False,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    note = models.ForeignKey(Note, null=False, on_delete=models.CASCADE, related_name='tags')
+    tag = models.CharField(verbose_name='Тег', max_length=TAG_MAX_LENGTH, null=False)
+
+    class Meta:
+        verbose_name = 'Тег заметки'
+        verbose_name_plural = 'Теги заметок'
+        indexes = [
+            models.Index(fields=('storage', 'tag'), name='index_note_tag_lookup'),
+        ]
+
+    @classmethod
+    def build(cls, note):
+        return [cls(storage_id=note.storage_id, note=note, tag=tag) for tag in get_note_tags(note.content)]
+
+    @classmethod
+    def index_notes(cls, notes, batch_size=1000):
+        """Rebuild tags of the saved notes"""
+        cls.objects.filter(note__in=[note.pk for note in notes]).delete()
+        tags = []
+        for note in notes:
+            tags.extend(cls.build(note))
+
+        cls.objects.bulk_create(tags, batch_size)
+
+    @classmethod
+    def rebuild(cls, storage=None, batch_size=1000):
+        """Rebuild tags of all notes or of notes of the storage from their contents"""
+        notes_queryset = Note.objects.only('pk', 'storage_id', 'content')
+        tags_queryset = cls.objects.all()
+        if storage is not None:
+            notes_queryset = notes_queryset.filter(storage=storage)
+            tags_queryset = tags_queryset.filter(storage=storage)
+
+        tags_queryset.delete()
+        tags = []
+        for note in notes_queryset.iterator():
+            tags.extend(cls.build(note))
+            if len(tags) >= batch_size:
+                cls.objects.bulk_create(tags)
+                tags = []
+
+        cls.objects.bulk_create(tags)
+
+    @classmethod
+    def get_counts(cls, storage):
+        """Return a queryset of tags of the storage with counts of their notes, the most used tags first"""
+        return (
+            cls.objects
+            .filter(storage=storage)
+            .values('tag')
+            .annotate(count=models.Count('note'))
+            .order_by('-count', 'tag')
+        )
 
 
 class ImageNote(models.Model):
@@ -91,6 +525,11 @@ class NoteStorageServiceModel(models.Model):
         validators=(FilenameValidator(),),
     )
     uuid = models.UUIDField(null=False, blank=False, unique=True, default=uuid.uuid4)
+    titles_version = models.PositiveIntegerField(
+        verbose_name='Версия заголовков заметок',
+        default=0,
+        help_text='Увеличивается при каждом изменении заголовков заметок базы',
+    )
 
     def __str__(self):
         return self.source
@@ -98,3 +537,84 @@ class NoteStorageServiceModel(models.Model):
     class Meta:
         verbose_name = 'База заметок'
         verbose_name_plural = 'Базы заметок'
+
+
+class NoteJob(models.Model):
+    """Background job over notes run by `note.jobs.job_worker`.
+
+    Progress and the cursor of a job are saved after every processed portion of notes, `updated_at` is a heartbeat.
+    A running job without heartbeat for a long time is considered interrupted and is resumed from its cursor.
+    """
+    KIND_COPY = 'copy'
+    KIND_IMPORT = 'import'
+    CHOICES_KIND = (
+        (KIND_COPY, 'Копирование заметок из одной базы в другую'),
+        (KIND_IMPORT, 'Импорт заметок из архива'),
+    )
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    CHOICES_STATUS = (
+        (STATUS_PENDING, 'Ожидает запуска'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Завершена'),
+        (STATUS_FAILED, 'Завершена с ошибкой'),
+    )
+    kind = models.CharField(verbose_name='Вид задачи', max_length=20, choices=CHOICES_KIND)
+    status = models.CharField(
+        verbose_name='Статус', max_length=10, choices=CHOICES_STATUS, default=STATUS_PENDING, db_index=True,
+    )
+    params = models.JSONField(verbose_name='Параметры', default=dict)
+    cursor = models.CharField(verbose_name='Курсор', max_length=240, null=True, blank=True)
+    processed_count = models.PositiveIntegerField(verbose_name='Обработано заметок', default=0)
+    speed = models.FloatField(verbose_name='Скорость, заметок в секунду', default=0)
+    error = models.TextField(verbose_name='Ошибка', default='', blank=True)
+    result = models.JSONField(verbose_name='Результат', default=dict, blank=True)
+    user = models.ForeignKey(get_user_model(), null=False, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(verbose_name='Создана', auto_now_add=True)
+    updated_at = models.DateTimeField(verbose_name='Обновлена', auto_now=True)
+    finished_at = models.DateTimeField(verbose_name='Завершена', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+
+class NoteMirrorOperation(models.Model):
+    """Pending operation over the local mirror of a note of an external storage, see `note.mirror.mirror_queue`.
+
+    Operations are coalesced per title: only the last operation over a note is kept. A failed operation
+    is postponed till `next_attempt_at`, after `NOTE_MIRROR_MAX_ATTEMPTS` failures it's kept as dead.
+    """
+    OPERATION_UPSERT = 1
+    OPERATION_DELETE = 2
+    CHOICES_OPERATION = (
+        (OPERATION_UPSERT, 'Добавление или изменение'),
+        (OPERATION_DELETE, 'Удаление'),
+    )
+    storage = models.ForeignKey(
+        'note.NoteStorageServiceModel',
+        null=False,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    title = models.CharField(verbose_name='Заголовок', max_length=240, null=False)
+    operation = models.PositiveSmallIntegerField(verbose_name='Операция', choices=CHOICES_OPERATION, null=False)
+    content = models.TextField(verbose_name='Текст', null=True, blank=True)
+    user = models.ForeignKey(get_user_model(), null=True, on_delete=models.SET_NULL)
+    updated_at = models.DateTimeField(verbose_name='Обновлена', auto_now=True)
+    attempts = models.PositiveIntegerField(verbose_name='Количество неудачных попыток', default=0)
+    error = models.TextField(verbose_name='Последняя ошибка', null=True, blank=True)
+    next_attempt_at = models.DateTimeField(verbose_name='Следующая попытка', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Операция над копией заметки'
+        verbose_name_plural = 'Операции над копиями заметок'
+        constraints = [
+            models.UniqueConstraint(fields=('storage', 'title'), name='unique_note_mirror_operation_storage_title')
+        ]
@@ -0,0 +1,318 @@
+import hashlib
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+import markdown
+import yaml
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.safestring import mark_safe
+from markdownify.templatetags.markdownify import markdownify
+
+from django_sy_framework.utils.logger import logger
+
+# Increase the version after changing of the code of Markdown extensions to drop the cached HTML
+RENDER_VERSION = 1
+DEFAULT_STORAGES_VERSION_TTL = 1
+EXCERPT_LENGTH = 400
+FENCES = ('```', '~~~')
+
+
+def separate_yaml(content):
+    content = content.strip()
+    lines = content.split('\n')
+    is_yaml = lines and lines[0] == '---'
+    data_yaml = {}
+    if is_yaml:
+        yaml_length = 4
+        for line in lines[1:]:
+            if line == '---':
+                break
+
+            yaml_length += len(line) + 1
+
+        data_yaml = yaml.load(content[:yaml_length], yaml.SafeLoader)
+        content = content[yaml_length + 4:].lstrip()
+
+    return data_yaml, content
+
+
+def excerpt_markdown(content, length=EXCERPT_LENGTH):
+    """Return the first blocks of Markdown, which are about `length` symbols in total.
+
+    Blocks are separated by empty lines outside of fenced code, so no construct is cut in the middle.
+    """
+    blocks = []
+    block = []
+    blocks_length = 0
+    fence = None
+    for line in content.split('\n'):
+        stripped_line = line.strip()
+        if fence:
+            if stripped_line.startswith(fence):
+                fence = None
+        elif stripped_line.startswith(FENCES):
+            fence = stripped_line[:3]
+        elif not stripped_line:
+            if block:
+                blocks.append('\n'.join(block))
+                blocks_length += len(blocks[-1])
+                block = []
+                if blocks_length >= length:
+                    return '\n\n'.join(blocks)
+
+            continue
+
+        block.append(line)
+
+    if block:
+        blocks.append('\n'.join(block))
+
+    return '\n\n'.join(blocks)
+
+
+def get_extension_config_version():
+    """Return a hash of the Markdown settings, so the cached HTML is dropped after changing of extensions"""
+    value = '{}:{}'.format(RENDER_VERSION, repr(settings.MARKDOWNIFY))
+    return hashlib.sha1(value.encode()).hexdigest()[:12]
+
+
+def get_storages_version():
+    """Return a hash of sources of storages. Links to notes of other storages are rendered depending on them"""
+    from note.models import NoteStorageServiceModel
+    sources = NoteStorageServiceModel.objects.order_by('source').values_list('source', flat=True)
+    return hashlib.sha1('\n'.join(sources).encode()).hexdigest()[:12]
+
+
+class RenderCache:
+    """LRU cache of rendered notes in the process memory with an optional Django cache as the second level.
+
+    The key includes the version of sources of storages, which is read from the database at most every
+    `storages_version_ttl` seconds, so every process and the shared cache stop using HTML rendered before
+    a storage is added, renamed or deleted.
+    """
+
+    def __init__(
+        self,
+        max_size=1000,
+        cache_alias=None,
+        timeout=None,
+        storages_version_ttl=DEFAULT_STORAGES_VERSION_TTL,
+    ):
+        self.max_size = max_size
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.version = None
+        self.storages_version_ttl = storages_version_ttl
+        self.storages_version = None
+        self.storages_checked_at = None
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, 'NOTE_RENDER_CACHE', {})
+        return cls(
+            config.get('MAX_SIZE', 1000),
+            config.get('CACHE'),
+            config.get('TIMEOUT'),
+            config.get('STORAGES_VERSION_TTL', DEFAULT_STORAGES_VERSION_TTL),
+        )
+
+    def get_storages_version(self):
+        now = time.monotonic()
+        with self.lock:
+            checked_at = self.storages_checked_at
+            if checked_at is not None and now - checked_at < self.storages_version_ttl:
+                return self.storages_version
+
+        storages_version = get_storages_version()
+        with self.lock:
+            if storages_version != self.storages_version:
+                # HTML of the previous version is never requested again
+                self.items.clear()
+
+            self.storages_version = storages_version
+            self.storages_checked_at = now
+
+        return storages_version
+
+    def make_key(self, source, content):
+        if self.version is None:
+            self.version = get_extension_config_version()
+
+        content_hash = hashlib.sha1(content.encode()).hexdigest()
+        return f'note:render:{self.version}:{self.get_storages_version()}:{source}:{content_hash}'
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return value
+
+        if self.cache_alias:
+            value = caches[self.cache_alias].get(key)
+            if value is not None:
+                self.put(key, value, False)
+                with self.lock:
+                    self.hits += 1
+
+                return value
+
+        with self.lock:
+            self.misses += 1
+
+    def put(self, key, value, to_shared_cache=True):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+        if to_shared_cache and self.cache_alias:
+            caches[self.cache_alias].set(key, value, self.timeout)
+
+    def clear(self):
+        """Drop the HTML of this process. Other processes drop it after the version of storages is read again"""
+        with self.lock:
+            self.items.clear()
+            self.version = None
+            self.storages_checked_at = None
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self.items),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0,
+                'shared_cache': self.cache_alias,
+            }
+
+
+def get_extension_config(source):
+    return {
+        'utils.md_extensions.apply_source:ApplySourceExtension': {'source': source},
+        'utils.md_extensions.wiki_links:WikiLinksExtension': {'source': source},
+        'utils.md_extensions.tags_like_links:TagsLikeLinksExtension': {'source': source},
+    }
+
+
+class MarkdownPool:
+    """Configured Markdown converters of the current thread, one per source.
+
+    Building of a converter registers every extension and compiles its patterns,
+    so converters are reused and reset between documents.
+    """
+
+    def __init__(self, max_size=64, settings_name='default'):
+        self.max_size = max_size
+        self.settings_name = settings_name
+        self.local = threading.local()
+
+    def build(self, source):
+        markdown_settings = settings.MARKDOWNIFY[self.settings_name]
+        extension_configs = {**markdown_settings.get('MARKDOWN_EXTENSION_CONFIGS', {})}
+        extension_configs.update(get_extension_config(source))
+        return markdown.Markdown(
+            extensions=markdown_settings.get('MARKDOWN_EXTENSIONS', []),
+            extension_configs=extension_configs,
+        )
+
+    def get(self, source):
+        converters = getattr(self.local, 'converters', None)
+        if converters is None:
+            converters = self.local.converters = OrderedDict()
+
+        converter = converters.get(source)
+        if converter is None:
+            converter = converters[source] = self.build(source)
+            if len(converters) > self.max_size:
+                converters.popitem(last=False)
+        else:
+            converters.move_to_end(source)
+
+        return converter.reset()
+
+    def convert(self, content, source):
+        if settings.MARKDOWNIFY[self.settings_name].get('BLEACH'):
+            return markdownify(content, self.settings_name, dynamic_extension_config=get_extension_config(source))
+
+        return mark_safe(self.get(source).convert(content))
+
+
+render_cache = RenderCache.from_settings()
+markdown_pool = MarkdownPool()
+
+
+def render_markdown(content, source):
+    error_message = None
+    content_html = None
+    content = content.replace('\r\n', '\n')
+    content_yaml, content_md = separate_yaml(content)
+    try:
+        content_html = markdown_pool.convert(content_md, source)
+    except Exception as error:
+        error_message = 'Заметка содержит синтаксическую ошибку'
+        logger.error('Ошибка парсинга заметки: %s \n %s' % (error, ''.join(traceback.format_exception(error))))
+
+    return content_yaml, content_html, error_message
+
+
+def safe_markdown(content, source):
+    """Render a note to HTML. Return YAML-header as `dict`, HTML and an error message"""
+    key = render_cache.make_key(source, content)
+    result = render_cache.get(key)
+    if result is None:
+        result = render_markdown(content, source)
+        render_cache.put(key, result)
+
+    return result
+
+
+def safe_markdown_batch(contents, source):
+    """Render many notes of one source. Obsidian links of all notes are resolved by a single query.
+
+    Return a list of results of `safe_markdown` in the same order.
+    """
+    from utils.md_extensions.obsidian_links import collect_vaults, resolve_sources
+
+    results = [None] * len(contents)
+    keys = [render_cache.make_key(source, content) for content in contents]
+    missed = []
+    for num, key in enumerate(keys):
+        results[num] = render_cache.get(key)
+        if results[num] is None:
+            missed.append(num)
+
+    if missed:
+        vaults = set()
+        for num in missed:
+            vaults.update(collect_vaults(contents[num]))
+
+        converter = markdown_pool.get(source)
+        converter.resolved_sources = resolve_sources(vaults)
+        try:
+            for num in missed:
+                results[num] = render_markdown(contents[num], source)
+                render_cache.put(keys[num], results[num])
+        finally:
+            converter.resolved_sources = None
+
+    return results
+
+
+def render_note_html(content, source):
+    """Return HTML of a note and HTML of its excerpt, which are stored in a note at saving"""
+    _, content_html, _ = safe_markdown(content, source)
+    _, content_md = separate_yaml(content.replace('\r\n', '\n'))
+    _, excerpt_html, _ = safe_markdown(excerpt_markdown(content_md), source)
+    return content_html, excerpt_html
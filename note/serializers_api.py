@@ -2,7 +2,7 @@ from drf_spectacular.utils import extend_schema_field
 from drf_spectacular.types import OpenApiTypes
 from rest_framework import serializers
 
-from note.models import Note
+from note.models import Note, NoteJob
 
 
 class NoteSearchViewSerializer(serializers.Serializer):
@@ -18,10 +18,19 @@ class NoteSearchViewSerializer(serializers.Serializer):
     SEARCH_BY_ALL = 'all'
     SEARCH_BY_TITLE = 'title'
     SEARCH_BY_CONTENT = 'content'
+    SEARCH_BY_TAG = 'tag'
     SEARCH_BYS_CHOICES = (
         (SEARCH_BY_ALL, 'оба поля'),
         (SEARCH_BY_TITLE, 'имя заметки'),
         (SEARCH_BY_CONTENT, 'тело заметки'),
+        (SEARCH_BY_TAG, 'точное совпадение хештега, с символом `#` или без него'),
+    )
+
+    COUNT_MODE_EXACT = 'exact'
+    COUNT_MODE_NONE = 'none'
+    COUNT_MODES_CHOICES = (
+        (COUNT_MODE_EXACT, 'точное количество найденных заметок и страниц'),
+        (COUNT_MODE_NONE, 'без подсчёта, только наличие следующей страницы'),
     )
 
     OPERATOR_OR = 'or'
@@ -42,6 +51,17 @@ class NoteSearchViewSerializer(serializers.Serializer):
     page_number = serializers.IntegerField(
         min_value=0, help_text='Номер страницы', required=False, default=0,
     )
+    count_mode = serializers.ChoiceField(
+        required=False,
+        default=COUNT_MODE_EXACT,
+        choices=COUNT_MODES_CHOICES,
+        help_text='Режим подсчёта результатов. Без подсчёта поиск быстрее',
+    )
+    fuzzy = serializers.BooleanField(
+        required=False,
+        default=False,
+        help_text='Нечёткий поиск с учётом опечаток. Результаты упорядочены по похожести на запрос',
+    )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -95,15 +115,108 @@ class NoteSearchNoteResponseSerializer(serializers.Serializer):
     )
     title = serializers.CharField(max_length=240, help_text='Имя заметки. Наличие поля зависит от параметра `fields`')
     url = serializers.CharField(max_length=100, help_text='URL к заметке в базе')
+    highlights = serializers.DictField(
+        child=serializers.CharField(),
+        required=False,
+        help_text='Фрагменты полей с найденными словами по названиям полей. Только для баз, которые их поддерживают',
+    )
 
 
 class NoteSearchResponseSerializer(serializers.Serializer):
     """Сериализатор результатов поиска заметки"""
-    count = serializers.IntegerField(min_value=0, help_text='Количество всех найденных заметок')
-    pages = serializers.IntegerField(min_value=0, help_text='Количество страниц')
+    count = serializers.IntegerField(
+        min_value=0, allow_null=True, help_text='Количество всех найденных заметок. `null` без подсчёта',
+    )
+    pages = serializers.IntegerField(min_value=0, allow_null=True, help_text='Количество страниц. `null` без подсчёта')
+    has_next = serializers.BooleanField(help_text='Есть ли следующая страница')
     count_on_page = serializers.IntegerField(
         min_value=1, max_value=100,  help_text='Количество результатов на странице',
     )
     page_number = serializers.IntegerField(min_value=0, help_text='Номер страницы')
     source = serializers.CharField(max_length=20, help_text='Название базы')
     results = NoteSearchNoteResponseSerializer()
+
+
+class NoteJobSerializer(serializers.ModelSerializer):
+    is_finished = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = NoteJob
+        fields = (
+            'id', 'kind', 'status', 'params', 'cursor', 'processed_count', 'speed', 'error', 'result', 'is_finished',
+            'created_at', 'updated_at', 'finished_at',
+        )
+
+
+class NoteLinkResponseSerializer(serializers.Serializer):
+    """Сериализатор ссылки между заметками"""
+    source = serializers.CharField(max_length=30, help_text='Название базы заметки')
+    title = serializers.CharField(max_length=240, help_text='Имя заметки')
+    is_existed = serializers.BooleanField(
+        required=False, help_text='Существует ли заметка. Только для исходящих ссылок',
+    )
+
+
+class NoteLinksResponseSerializer(serializers.Serializer):
+    """Сериализатор обратных и исходящих ссылок заметки"""
+    source = serializers.CharField(max_length=30, help_text='Название базы')
+    title = serializers.CharField(max_length=240, help_text='Имя заметки')
+    backlinks = NoteLinkResponseSerializer(many=True, help_text='Заметки, которые ссылаются на заметку')
+    outgoing = NoteLinkResponseSerializer(many=True, help_text='Заметки, на которые ссылается заметка')
+
+
+class NoteDanglingLinksViewSerializer(serializers.Serializer):
+    count_on_page = serializers.IntegerField(
+        min_value=1, max_value=100,  help_text='Количество результатов на странице', required=False, default=10,
+    )
+    page_number = serializers.IntegerField(min_value=1, help_text='Номер страницы', required=False, default=1)
+
+
+class NoteDanglingLinkResponseSerializer(serializers.Serializer):
+    """Сериализатор ссылки на несуществующую заметку"""
+    title = serializers.CharField(max_length=240, help_text='Имя заметки, которая содержит ссылку')
+    target_source = serializers.CharField(max_length=30, help_text='Название базы несуществующей заметки')
+    target_title = serializers.CharField(max_length=240, help_text='Имя несуществующей заметки')
+
+
+class NoteDanglingLinksResponseSerializer(serializers.Serializer):
+    """Сериализатор ссылок базы на несуществующие заметки"""
+    count = serializers.IntegerField(min_value=0, help_text='Количество всех ссылок')
+    pages = serializers.IntegerField(min_value=0, help_text='Количество страниц')
+    has_next = serializers.BooleanField(help_text='Есть ли следующая страница')
+    count_on_page = serializers.IntegerField(min_value=1, max_value=100, help_text='Количество результатов на странице')
+    page_number = serializers.IntegerField(min_value=1, help_text='Номер страницы')
+    source = serializers.CharField(max_length=30, help_text='Название базы')
+    results = NoteDanglingLinkResponseSerializer(many=True)
+
+
+class NoteTagCountsViewSerializer(serializers.Serializer):
+    limit = serializers.IntegerField(
+        min_value=1, max_value=1000, help_text='Максимальное количество тегов', required=False, default=100,
+    )
+
+
+class NoteTagCountResponseSerializer(serializers.Serializer):
+    """Сериализатор тега и количества его заметок"""
+    tag = serializers.CharField(max_length=64, help_text='Тег без символа `#`')
+    count = serializers.IntegerField(min_value=1, help_text='Количество заметок с тегом')
+
+
+class NoteTagCountsResponseSerializer(serializers.Serializer):
+    """Сериализатор самых используемых тегов базы"""
+    source = serializers.CharField(max_length=30, help_text='Название базы')
+    results = NoteTagCountResponseSerializer(many=True)
+
+
+class NoteSuggestViewSerializer(serializers.Serializer):
+    limit = serializers.IntegerField(
+        min_value=1, max_value=50, help_text='Максимальное количество заголовков', required=False, default=10,
+    )
+
+
+class NoteSuggestResponseSerializer(serializers.Serializer):
+    """Сериализатор подсказок заголовков"""
+    source = serializers.CharField(max_length=30, help_text='Название базы')
+    results = serializers.ListField(
+        child=serializers.CharField(max_length=240), help_text='Заголовки заметок, которые начинаются с префикса',
+    )
@@ -12,6 +12,11 @@ class UploaderTypesenseSerializer(serializers.Serializer):
     port = serializers.IntegerField(help_text='Порт', default=8108)
     protocol = serializers.ChoiceField(help_text='Протокол', choices=CHOICES_PROTOCOL, default=PROTOCOL_HTTP)
     api_key = serializers.CharField(help_text='Ключ API')
+    collection = serializers.CharField(
+        help_text='Коллекция заметок. Разные базы на одном сервере должны использовать разные коллекции',
+        default='knowledge',
+        required=False,
+    )
 
 
 class UploaderFirestoreSerializer(serializers.Serializer):
@@ -23,3 +28,7 @@ class UploaderGithubSerializer(serializers.Serializer):
     repo = serializers.CharField(help_text='Название репозитория')
     branch = serializers.CharField(help_text='Наименование ветки')
     directory = serializers.CharField(help_text='Директория, в которой хранятся заметки')
+    webhook_secret = serializers.CharField(
+        help_text='Секрет вебхука push-событий. Если не задан, хук отклоняет push-события',
+        required=False,
+    )
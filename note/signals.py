@@ -0,0 +1,89 @@
+import logging
+
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from note.adapters.base_adapter import get_count_cache_key
+from note.adapters.django_server_adapter import get_search_backend, search_backends
+from note.adapters.registry import storage_registry
+from note.mirror import mirror_queue
+from note.models import Note, NoteLink, NoteStorageServiceModel, NoteTag
+from note.render import render_cache
+from note.suggest import title_indexes
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Note)
+def index_note(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_search_backend().index_notes([instance])
+
+
+@receiver(post_save, sender=Note)
+def index_note_links(sender, instance, raw=False, **kwargs):
+    if not raw:
+        NoteLink.index_notes([instance])
+
+
+@receiver(post_save, sender=Note)
+def index_note_tags(sender, instance, raw=False, **kwargs):
+    if not raw:
+        NoteTag.index_notes([instance])
+
+
+@receiver(post_delete, sender=Note)
+def drop_cached_count_on_delete(sender, instance, **kwargs):
+    cache.delete(get_count_cache_key(instance.storage_id))
+
+
+@receiver(post_save, sender=Note)
+def drop_cached_count_on_create(sender, instance, created=False, **kwargs):
+    if created:
+        cache.delete(get_count_cache_key(instance.storage_id))
+
+
+@receiver(post_save, sender=Note)
+def update_title_index_on_save(sender, instance, created=False, raw=False, **kwargs):
+    loaded_title = None if created else getattr(instance, 'loaded_title', None)
+    if loaded_title != instance.title:
+        title_indexes.update(instance.storage_id, added_title=instance.title, removed_title=loaded_title)
+        instance.loaded_title = instance.title
+
+
+@receiver(post_delete, sender=Note)
+def update_title_index_on_delete(sender, instance, **kwargs):
+    title_indexes.update(instance.storage_id, removed_title=instance.title)
+
+
+@receiver((post_save, post_delete), sender=NoteStorageServiceModel)
+def clear_render_cache(sender, **kwargs):
+    """Links to notes of other storages are rendered depending on existence of the storages"""
+    render_cache.clear()
+
+
+@receiver((post_save, post_delete), sender=NoteStorageServiceModel)
+def evict_storage_from_registry(sender, instance, **kwargs):
+    storage_registry.evict(instance.pk)
+
+
+@receiver(post_migrate)
+def repair_search_backend(sender, **kwargs):
+    """Triggers of the search backend are dropped, if a migration of SQLite rebuilds the table of notes.
+
+    Migrations may install the full-text table, so the backend is chosen again.
+    """
+    if sender.name != 'note':
+        return
+
+    search_backends.clear()
+    if get_search_backend().repair():
+        logger.warning('Database objects of the search backend are reinstalled after migrations')
+
+
+@receiver(request_started)
+def resume_mirror_queue(sender, **kwargs):
+    """Operations persisted before a restart are applied without waiting for a new write"""
+    mirror_queue.resume()
@@ -0,0 +1,153 @@
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import F
+
+DEFAULT_TITLES_VERSION_TTL = 1
+
+
+class TitleIndex:
+    """Titles of notes sorted by their prepared values to find titles by a prefix with a binary search.
+
+    Changes replace the array instead of changing it, so lookups of other threads need no lock.
+    """
+
+    def __init__(self, titles):
+        from note.models import prepare_to_search
+        self.items = sorted((prepare_to_search(title), title) for title in titles)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, title):
+        from note.models import prepare_to_search
+        item = (prepare_to_search(title), title)
+        position = bisect.bisect_left(self.items, item)
+        return position < len(self.items) and self.items[position] == item
+
+    def add(self, title):
+        from note.models import prepare_to_search
+        if title not in self:
+            items = list(self.items)
+            bisect.insort(items, (prepare_to_search(title), title))
+            self.items = items
+
+    def remove(self, title):
+        from note.models import prepare_to_search
+        item = (prepare_to_search(title), title)
+        position = bisect.bisect_left(self.items, item)
+        if position < len(self.items) and self.items[position] == item:
+            self.items = self.items[:position] + self.items[position + 1:]
+
+    def find(self, prefix, limit):
+        """Return up to `limit` titles starting with `prefix` ignoring case, in the order of prepared titles"""
+        from note.models import prepare_to_search
+        prefix = prepare_to_search(prefix)
+        items = self.items
+        titles = []
+        position = bisect.bisect_left(items, (prefix,))
+        while position < len(items) and len(titles) < limit:
+            search_title, title = items[position]
+            if not search_title.startswith(prefix):
+                break
+
+            titles.append(title)
+            position += 1
+
+        return titles
+
+
+class TitleIndexRegistry:
+    """Title indexes of storages in the process memory.
+
+    An index is built from titles of notes of the storage on the first lookup. Every change of titles increments
+    `NoteStorageServiceModel.titles_version` in the database, so processes don't need a shared cache. The version
+    is read at most once per `version_ttl` seconds, and the index is rebuilt if it's changed. Saving a note
+    in the process updates the index in place, if no other process has changed titles since the index was built.
+    """
+
+    def __init__(self, version_ttl=DEFAULT_TITLES_VERSION_TTL):
+        self.version_ttl = version_ttl
+        self.indexes = {}
+        self.checked_versions = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(getattr(settings, 'NOTE_TITLES_VERSION_TTL', DEFAULT_TITLES_VERSION_TTL))
+
+    @staticmethod
+    def read_version(storage_id):
+        from note.models import NoteStorageServiceModel
+        storages = NoteStorageServiceModel.objects.filter(pk=storage_id)
+        return storages.values_list('titles_version', flat=True).first()
+
+    def get_version(self, storage_id):
+        now = time.monotonic()
+        with self.lock:
+            version, checked_at = self.checked_versions.get(storage_id, (None, None))
+
+        if checked_at is None or now - checked_at > self.version_ttl:
+            version = self.read_version(storage_id)
+            with self.lock:
+                self.checked_versions[storage_id] = (version, now)
+
+        return version
+
+    def get(self, storage_id):
+        from note.models import Note
+        version = self.get_version(storage_id)
+        with self.lock:
+            indexed_version, index = self.indexes.get(storage_id, (None, None))
+
+        if index is None or version != indexed_version:
+            # the version is read before titles, so titles changed meanwhile make the index be rebuilt again
+            version = self.read_version(storage_id)
+            titles = Note.objects.filter(storage_id=storage_id).values_list('title', flat=True)
+            index = TitleIndex(titles.iterator())
+            with self.lock:
+                self.indexes[storage_id] = (version, index)
+                self.checked_versions[storage_id] = (version, time.monotonic())
+
+        return index
+
+    @staticmethod
+    def touch(storage_id):
+        from note.models import NoteStorageServiceModel
+        NoteStorageServiceModel.objects.filter(pk=storage_id).update(titles_version=F('titles_version') + 1)
+
+    def invalidate(self, storage_id):
+        """Make indexes of the storage of all processes be rebuilt"""
+        self.touch(storage_id)
+        with self.lock:
+            self.indexes.pop(storage_id, None)
+            self.checked_versions.pop(storage_id, None)
+
+    def update(self, storage_id, added_title=None, removed_title=None):
+        """Update the index of the storage in the process in place. Indexes of other processes are rebuilt"""
+        self.touch(storage_id)
+        version = self.read_version(storage_id)
+        with self.lock:
+            indexed_version, index = self.indexes.pop(storage_id, (None, None))
+            self.checked_versions[storage_id] = (version, time.monotonic())
+            # the index is kept only if the increment is the only change since the index was built
+            if index is None or indexed_version is None or version != indexed_version + 1:
+                return
+
+            if removed_title is not None:
+                index.remove(removed_title)
+
+            if added_title is not None:
+                index.add(added_title)
+
+            self.indexes[storage_id] = (version, index)
+
+    def clear(self):
+        with self.lock:
+            self.indexes.clear()
+            self.checked_versions.clear()
+
+
+title_indexes = TitleIndexRegistry.from_settings()
@@ -0,0 +1,67 @@
+import io
+import os
+import tempfile
+import zipfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from note.adapters.django_server_adapter import DjangoServerAdapter
+from note.archive import DUPLICATE_OVERWRITE, import_archive, iter_archive_entries, iter_storage_files, iter_zip
+
+
+class ArchiveTestCase(TestCase):
+    def setUp(self):
+        from note.models import NoteStorageServiceModel
+        user = get_user_model().objects.create(username='tester')
+        self.storage_from = NoteStorageServiceModel.objects.create(service='DjangoServer', user=user, source='from')
+        self.storage_to = NoteStorageServiceModel.objects.create(service='DjangoServer', user=user, source='to')
+
+    def get_notes(self, storage):
+        from note.models import Note
+        return dict(Note.objects.filter(storage=storage).values_list('title', 'content'))
+
+    def write_archive(self, data):
+        file_descriptor, path = tempfile.mkstemp(suffix='.zip')
+        with os.fdopen(file_descriptor, 'wb') as archive_file:
+            archive_file.write(data)
+
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_round_trip(self):
+        notes = {'Кошка': 'Рыжая\nкошка', 'Собака': 'Лает' * 50000, 'Пустая': ''}
+        adapter = DjangoServerAdapter(self.storage_from)
+        for title, content in notes.items():
+            adapter.add(title, content)
+
+        path = self.write_archive(b''.join(iter_zip(iter_storage_files('from'))))
+        with zipfile.ZipFile(path) as archive:
+            self.assertEqual(sorted(archive.namelist()), sorted(f'from/{title}.md' for title in notes))
+
+        report = {}
+        steps = list(import_archive(path, 'to', report=report))
+        self.assertEqual(steps[-1][0], len(notes))
+        self.assertEqual(self.get_notes(self.storage_to), notes)
+        self.assertEqual(report['imported'], len(notes))
+
+    def test_resume(self):
+        data = io.BytesIO()
+        with zipfile.ZipFile(data, 'w') as archive:
+            archive.writestr('vault/.obsidian/app.json', '{}')
+            archive.writestr('vault/Bad%.md', 'invalid title')
+            archive.writestr('vault/A.md', 'a')
+            archive.writestr('vault/other/A.md', 'duplicate')
+            archive.writestr('vault/B.md', 'b')
+            archive.writestr('vault/C.md', 'c')
+
+        path = self.write_archive(data.getvalue())
+        numbers = {entry_path: number for number, entry_path, open_entry in iter_archive_entries(path)}
+        DjangoServerAdapter(self.storage_to).add('A', 'a')
+        report = {'imported': 1, 'duplicates': [], 'duplicates_count': 0, 'invalid': ['vault/Bad%.md'], 'images': 0}
+        steps = list(import_archive(path, 'to', DUPLICATE_OVERWRITE, numbers['vault/A.md'], report))
+        self.assertEqual(steps[-1][0], 2)
+        self.assertEqual(self.get_notes(self.storage_to), {'A': 'a', 'B': 'b', 'C': 'c'})
+        self.assertEqual(report, {
+            'imported': 3, 'duplicates': ['A'], 'duplicates_count': 1, 'invalid': ['vault/Bad%.md'], 'images': 0,
+        })
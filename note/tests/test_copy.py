@@ -0,0 +1,98 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.test import TransactionTestCase
+
+from note.adapters import COPY_MODE_DIFF, run_initiator
+from note.adapters.django_server_adapter import DjangoServerAdapter
+
+
+def read_uncommitted(sender, connection, **kwargs):
+    """The in-memory test database of SQLite locks tables being written for readers of other connections"""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA read_uncommitted = 1')
+
+
+class RunInitiatorTestCase(TransactionTestCase):
+    """Notes are read and written by threads having their own connections, so the data must be committed"""
+    PORTION_SIZE = 5
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        connection_created.connect(read_uncommitted)
+
+    @classmethod
+    def tearDownClass(cls):
+        connection_created.disconnect(read_uncommitted)
+        super().tearDownClass()
+
+    def setUp(self):
+        from note.models import NoteStorageServiceModel
+        patcher = mock.patch.object(DjangoServerAdapter, 'MAX_PORTION_SIZE', self.PORTION_SIZE)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        user = get_user_model().objects.create(username='tester')
+        self.storage_from = NoteStorageServiceModel.objects.create(service='DjangoServer', user=user, source='from')
+        self.storage_to = NoteStorageServiceModel.objects.create(service='DjangoServer', user=user, source='to')
+        self.notes = {f'Заметка {num:02}': f'Текст {num}' for num in range(23)}
+        adapter = DjangoServerAdapter(self.storage_from)
+        for title, content in self.notes.items():
+            adapter.add_to_portion(title, content)
+
+        adapter.commit()
+
+    def get_notes(self, storage):
+        from note.models import Note
+        return dict(Note.objects.filter(storage=storage).values_list('title', 'content'))
+
+    def test_full_copy(self):
+        DjangoServerAdapter(self.storage_to).add('Лишняя', 'текст')
+        # portions are written by as many threads as the database allows
+        steps = list(run_initiator('from', 'to'))
+        counts = [count for count, speed, cursor in steps]
+        cursors = [cursor for count, speed, cursor in steps]
+        self.assertEqual(counts[-1], len(self.notes))
+        self.assertEqual(counts, sorted(counts))
+        # a cursor is moved only after all portions before it are written
+        self.assertEqual(cursors, sorted(cursors))
+        self.assertEqual(cursors[-1], max(self.notes))
+        self.assertEqual(self.get_notes(self.storage_to), self.notes)
+
+    def test_resume(self):
+        steps = run_initiator('from', 'to', concurrency=1)
+        count, speed, cursor = next(steps)
+        steps.close()
+        self.assertEqual(count, self.PORTION_SIZE)
+        # notes up to the cursor are written, the following ones may be written before the copying is stopped
+        self.assertEqual(cursor, sorted(self.notes)[self.PORTION_SIZE - 1])
+        self.assertLessEqual({title for title in self.notes if title <= cursor}, set(self.get_notes(self.storage_to)))
+
+        steps = list(run_initiator('from', 'to', concurrency=1, after=cursor))
+        self.assertEqual(steps[-1][0], len(self.notes) - self.PORTION_SIZE)
+        self.assertEqual(self.get_notes(self.storage_to), self.notes)
+
+    def test_diff_copy(self):
+        adapter_to = DjangoServerAdapter(self.storage_to)
+        for title, content in list(self.notes.items())[:20]:
+            adapter_to.add_to_portion(title, content)
+
+        adapter_to.add_to_portion('Заметка 03', 'Старый текст')
+        adapter_to.add_to_portion('Удалённая', 'текст')
+        adapter_to.commit()
+
+        written_titles = []
+        add_to_portion = DjangoServerAdapter.add_to_portion
+
+        def record_title(adapter, title, content):
+            written_titles.append(title)
+            add_to_portion(adapter, title, content)
+
+        with mock.patch.object(DjangoServerAdapter, 'add_to_portion', record_title):
+            steps = list(run_initiator('from', 'to', concurrency=1, mode=COPY_MODE_DIFF))
+
+        self.assertEqual(sorted(written_titles), ['Заметка 03', 'Заметка 20', 'Заметка 21', 'Заметка 22'])
+        self.assertEqual(steps[-1][0], 4)
+        self.assertEqual(self.get_notes(self.storage_to), self.notes)
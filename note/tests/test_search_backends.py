@@ -0,0 +1,135 @@
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from note.adapters.django_server_adapter import (
+    ContainsSearchBackend,
+    DjangoServerAdapter,
+    Fts5SearchBackend,
+    PostgresSearchBackend,
+    TokenSearchBackend,
+    get_search_backend,
+    search_backends,
+)
+
+NOTES = (
+    ('Кошка', 'Рыжая кошка ловит мышей'),
+    ('Собака', 'Собака лает на кошку'),
+    ('Ёжик', 'Ёжик в тумане'),
+)
+
+
+class SearchBackendMixin:
+    """Notes of a storage searched by the backend"""
+    backend_class = None
+
+    def setUp(self):
+        from note.models import NoteStorageServiceModel
+        patcher = mock.patch.dict(search_backends, {connection.vendor: self.backend_class()})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        user = get_user_model().objects.create(username='tester')
+        self.storage = NoteStorageServiceModel.objects.create(service='DjangoServer', user=user, source='test')
+        self.adapter = DjangoServerAdapter(self.storage)
+        for title, content in NOTES:
+            self.adapter.add(title, content)
+
+    def search(self, operator='and', file_name=None, file_content=None):
+        notes, meta = self.adapter.search(operator, 10, 1, ('title',), file_name, file_content)
+        return {note['title'] for note in notes}
+
+
+class SearchBackendTestMixin(SearchBackendMixin):
+    """The same notes must be found by every backend, whether its index is kept by triggers or by `index_notes`"""
+
+    def test_search(self):
+        self.assertEqual(self.search(file_name='кош'), {'Кошка'})
+        self.assertEqual(self.search(file_content='кошк'), {'Кошка', 'Собака'})
+        self.assertEqual(self.search(file_name='собака', file_content='лает'), {'Собака'})
+        self.assertEqual(self.search(file_name='собака', file_content='мышей'), set())
+        self.assertEqual(self.search('or', file_name='ежик', file_content='мышей'), {'Ёжик', 'Кошка'})
+        self.assertEqual(self.search(file_name='ЁЖИК'), {'Ёжик'})
+
+    def test_update(self):
+        self.adapter.edit('Кошка', new_content='Кот спит на диване')
+        self.assertEqual(self.search(file_content='мышей'), set())
+        self.assertEqual(self.search(file_content='диван'), {'Кошка'})
+        self.adapter.edit('Кошка', new_title='Кот')
+        self.assertEqual(self.search(file_name='кошка'), set())
+        self.assertEqual(self.search(file_name='кот'), {'Кот'})
+
+    def test_delete(self):
+        self.adapter.delete('Собака')
+        self.assertEqual(self.search(file_content='кошк'), {'Кошка'})
+        self.adapter.clear()
+        self.assertEqual(self.search(file_content='кошк'), set())
+
+    def test_bulk_upsert(self):
+        self.adapter.add_to_portion('Попугай', 'Попугай говорит')
+        self.adapter.add_to_portion('Кошка', 'Кошка спит')
+        self.adapter.commit()
+        self.assertEqual(self.search(file_content='говорит'), {'Попугай'})
+        self.assertEqual(self.search(file_content='мышей'), set())
+        self.assertEqual(self.search(file_content='спит'), {'Кошка'})
+
+    def test_search_fuzzy(self):
+        notes, meta = self.adapter.search_fuzzy('and', 10, 1, ('title',), file_name='сабака')
+        self.assertEqual([note['title'] for note in notes], ['Собака'])
+        notes, meta = self.adapter.search_fuzzy('or', 10, 1, ('title',), file_name='кошко', file_content='тумани')
+        self.assertEqual({note['title'] for note in notes}, {'Кошка', 'Ёжик'})
+
+
+class ContainsSearchBackendTestCase(SearchBackendTestMixin, TestCase):
+    backend_class = ContainsSearchBackend
+
+
+class TokenSearchBackendTestCase(SearchBackendTestMixin, TestCase):
+    backend_class = TokenSearchBackend
+
+
+@skipUnless(connection.vendor == 'sqlite', 'FTS5 is a module of SQLite')
+class Fts5SearchBackendTestCase(SearchBackendTestMixin, TestCase):
+    backend_class = Fts5SearchBackend
+
+
+@skipUnless(connection.vendor == 'sqlite', 'FTS5 is a module of SQLite')
+class Fts5RepairTestCase(SearchBackendMixin, TransactionTestCase):
+    """The schema editor of SQLite can't be used in a transaction, so triggers are repaired out of it"""
+    backend_class = Fts5SearchBackend
+
+    def test_repair(self):
+        backend = search_backends[connection.vendor]
+        self.assertFalse(backend.repair())
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {Fts5SearchBackend.TABLE}_insert')
+
+        self.assertTrue(backend.repair())
+        self.adapter.add('Попугай', 'Попугай говорит')
+        self.assertEqual(self.search(file_content='говорит'), {'Попугай'})
+
+
+@skipUnless(connection.vendor == 'postgresql', 'tsvector and trigrams are features of PostgreSQL')
+class PostgresSearchBackendTestCase(SearchBackendTestMixin, TestCase):
+    backend_class = PostgresSearchBackend
+
+
+class GetSearchBackendTestCase(TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(search_backends, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(NOTE_SEARCH_BACKEND='fts5')
+    def test_fallback_without_fts5(self):
+        with mock.patch.object(connection.introspection, 'table_names', return_value=['app_note_note']):
+            self.assertIsInstance(get_search_backend(), TokenSearchBackend)
+
+    @skipUnless(connection.vendor == 'sqlite', 'FTS5 is a module of SQLite')
+    def test_fts5_installed(self):
+        self.assertIsInstance(get_search_backend(), Fts5SearchBackend)
+
+    @override_settings(NOTE_SEARCH_BACKEND='contains')
+    def test_setting(self):
+        self.assertIsInstance(get_search_backend(), ContainsSearchBackend)
@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from note.adapters.django_server_adapter import DjangoServerAdapter
+from note.suggest import TitleIndex, TitleIndexRegistry, title_indexes
+
+
+class TitleIndexTestCase(SimpleTestCase):
+    def test_find(self):
+        index = TitleIndex(['Ёжик', 'ежевика', 'Енот', 'Кот'])
+        self.assertEqual(index.find('ЕЖ', 10), ['ежевика', 'Ёжик'])
+        self.assertEqual(index.find('е', 2), ['ежевика', 'Ёжик'])
+        self.assertEqual(index.find('собака', 10), [])
+
+    def test_add_remove(self):
+        index = TitleIndex(['Кот'])
+        index.add('Кошка')
+        index.add('Кошка')
+        self.assertEqual(index.find('ко', 10), ['Кот', 'Кошка'])
+        index.remove('Кот')
+        index.remove('Кит')
+        self.assertEqual(index.find('ко', 10), ['Кошка'])
+
+
+class TitleIndexRegistryTestCase(TestCase):
+    """`title_indexes` is the registry of this process, other registries stand in for other processes"""
+
+    def setUp(self):
+        from note.models import NoteStorageServiceModel
+        title_indexes.clear()
+        self.addCleanup(title_indexes.clear)
+        user = get_user_model().objects.create(username='tester')
+        self.storage = NoteStorageServiceModel.objects.create(service='DjangoServer', user=user, source='test')
+        self.adapter = DjangoServerAdapter(self.storage)
+        self.adapter.add('Кошка', 'текст')
+
+    def test_suggest(self):
+        index = title_indexes.get(self.storage.pk)
+        self.assertEqual(self.adapter.suggest('ко', 10), ['Кошка'])
+        self.adapter.add('Кот', 'текст')
+        self.assertEqual(self.adapter.suggest('ко', 10), ['Кот', 'Кошка'])
+        # the index is updated in place, if titles aren't changed by other processes
+        self.assertIs(title_indexes.get(self.storage.pk), index)
+        self.adapter.delete('Кошка')
+        self.assertEqual(self.adapter.suggest('ко', 10), ['Кот'])
+
+    def test_invalidation_by_version(self):
+        other_indexes = TitleIndexRegistry(version_ttl=0)
+        self.assertEqual(other_indexes.get(self.storage.pk).find('ко', 10), ['Кошка'])
+        self.adapter.add('Кот', 'текст')
+        self.adapter.edit('Кошка', new_title='Кошечка')
+        self.assertEqual(other_indexes.get(self.storage.pk).find('ко', 10), ['Кот', 'Кошечка'])
+
+    def test_version_is_read_after_ttl(self):
+        other_indexes = TitleIndexRegistry(version_ttl=60)
+        index = other_indexes.get(self.storage.pk)
+        self.adapter.add('Кот', 'текст')
+        self.assertIs(other_indexes.get(self.storage.pk), index)
+        other_indexes.checked_versions.clear()
+        self.assertEqual(other_indexes.get(self.storage.pk).find('ко', 10), ['Кот', 'Кошка'])
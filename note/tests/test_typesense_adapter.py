@@ -0,0 +1,199 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from django.test import SimpleTestCase
+
+from note.adapters.typesense_adapter import TypesenseAdapter
+
+
+class TypesenseStandInHandler(BaseHTTPRequestHandler):
+    """Stand-in of the part of Typesense HTTP API used by `TypesenseAdapter`.
+
+    Documents of collections are kept in `server.collections`. The search matches words of the query
+    as substrings of the fields, requires all words if `drop_tokens_threshold` is 0, and sorts by `filename`.
+    """
+    MAX_PER_PAGE = 250
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status, data, is_json=True):
+        body = (json.dumps(data) if is_json else data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json' if is_json else 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PATCH(self):
+        self.handle_request('PATCH')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+    def handle_request(self, method):
+        url = urlparse(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        parts = url.path.strip('/').split('/')
+        collections = self.server.collections
+        if parts == ['collections'] and method == 'POST':
+            schema = json.loads(self.read_body())
+            collections[schema['name']] = {}
+            return self.send(201, schema)
+
+        documents = collections.get(parts[1])
+        if documents is None:
+            return self.send(404, {'message': 'Collection is not found'})
+
+        if len(parts) == 2 and method == 'DELETE':
+            del collections[parts[1]]
+            return self.send(200, {})
+
+        if len(parts) == 3 and method == 'POST':
+            document = json.loads(self.read_body())
+            if query.get('action', 'create') == 'create' and document['id'] in documents:
+                return self.send(409, {'message': 'Document already exists'})
+
+            documents[document['id']] = document
+            return self.send(201, document)
+
+        if parts[3] == 'import':
+            results = []
+            for line in self.read_body().splitlines():
+                document = json.loads(line)
+                documents[document['id']] = document
+                results.append(json.dumps({'success': True}))
+
+            return self.send(200, '\n'.join(results), is_json=False)
+
+        if parts[3] == 'export':
+            fields = query['include_fields'].split(',')
+            lines = [json.dumps({field: document[field] for field in fields}) for document in documents.values()]
+            return self.send(200, '\n'.join(lines), is_json=False)
+
+        if parts[3] == 'search':
+            return self.search(documents, query)
+
+        document = documents.get(parts[3])
+        if document is None:
+            return self.send(404, {'message': 'Document is not found'})
+
+        if method == 'DELETE':
+            del documents[parts[3]]
+
+        return self.send(200, document)
+
+    def search(self, documents, query):
+        page, per_page = int(query['page']), int(query['per_page'])
+        if per_page > self.MAX_PER_PAGE:
+            return self.send(422, {'message': 'Only upto 250 hits can be fetched per page'})
+
+        hits = sorted(documents.values(), key=lambda document: document['filename'])
+        if query['q'] != '*':
+            words = query['q'].lower().split()
+            fields = query['query_by'].split(',')
+            match = all if query.get('drop_tokens_threshold') == '0' else any
+            hits = [
+                document for document in hits
+                if match(any(word in document[field].lower() for field in fields) for word in words)
+            ]
+
+        fields = query['include_fields'].split(',')
+        highlight_fields = [field for field in query.get('highlight_fields', '').split(',') if field]
+        return self.send(200, {
+            'found': len(hits),
+            'page': page,
+            'hits': [
+                {
+                    'document': {field: document[field] for field in fields},
+                    'highlights': [
+                        {'field': field, 'snippet': f'<mark>{document[field]}</mark>'} for field in highlight_fields
+                    ],
+                }
+                for document in hits[(page - 1) * per_page:page * per_page]
+            ],
+        })
+
+
+class TypesenseAdapterTestCase(SimpleTestCase):
+    """The adapter against a local stand-in Typesense server"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), TypesenseStandInHandler)
+        cls.server.collections = {}
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        from note.models import NoteStorageServiceModel
+        storage = NoteStorageServiceModel(source='typesense', service='Typesense')
+        self.adapter = TypesenseAdapter(storage, '127.0.0.1', self.server.server_port, 'http', 'key', 'notes')
+        self.adapter.clear()
+
+    def add_notes(self, notes):
+        for title, content in notes:
+            self.adapter.add_to_portion(title, content)
+
+        self.adapter.commit()
+
+    def test_add_edit_delete(self):
+        self.adapter.add('Кот', 'мяу')
+        self.assertEqual(self.adapter.get('Кот')['content'], 'мяу')
+        self.assertEqual(self.adapter.edit('Кот', new_content='мяу мяу'), ['content'])
+        self.assertEqual(self.adapter.edit('Кот', new_title='Кошка'), ['title'])
+        self.assertIsNone(self.adapter.get('Кот'))
+        self.assertEqual(self.adapter.get('Кошка')['content'], 'мяу мяу')
+        self.adapter.delete('Кошка')
+        self.assertIsNone(self.adapter.get('Кошка'))
+
+    def test_import_and_hashes(self):
+        self.add_notes([('a', 'first'), ('b', 'second')])
+        self.add_notes([('a', 'changed')])
+        hashes = self.adapter.get_hashes()
+        self.assertEqual(set(hashes), {'a', 'b'})
+        self.assertEqual(self.adapter.get('a')['content'], 'changed')
+
+    def test_long_page_is_shortened(self):
+        self.add_notes([(f'note {num:03}', 'text') for num in range(300)])
+        notes, meta = self.adapter.get_list(1, 500)
+        self.assertEqual(len(notes), TypesenseAdapter.MAX_PER_PAGE)
+        self.assertEqual(meta['count'], 300)
+        self.assertTrue(meta['has_next'])
+
+    def test_iter_notes_after(self):
+        titles = [f'note {num:03}' for num in range(30)]
+        self.add_notes([(title, 'text') for title in titles])
+        self.assertEqual([note['title'] for note in self.adapter.iter_notes(limit=7)], titles)
+        for after in (None, 'a', 'note 000', 'note 013', 'note 020', 'note 029', 'z'):
+            with self.subTest(after=after):
+                notes = self.adapter.iter_notes(after=after, limit=7)
+                expected_titles = [title for title in titles if after is None or title > after]
+                self.assertEqual([note['title'] for note in notes], expected_titles)
+
+    def test_search_by_both_fields(self):
+        self.add_notes([('cat', 'about dogs'), ('dog', 'about cats'), ('bird', 'about birds')])
+        notes, meta = self.adapter.search('and', 10, 1, ('title',), file_name='cat', file_content='about')
+        self.assertEqual([note['title'] for note in notes], ['cat', 'dog'])
+        notes, meta = self.adapter.search('and', 10, 1, ('title',), file_name='bird', file_content='dogs')
+        self.assertEqual(notes, [])
+        notes, meta = self.adapter.search('or', 10, 1, ('title', 'content'), file_name='bird')
+        self.assertEqual([note['title'] for note in notes], ['bird'])
+        self.assertEqual(notes[0]['highlights'], {'title': '<mark>bird</mark>'})
@@ -0,0 +1,73 @@
+import hashlib
+import hmac
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.shortcuts import resolve_url
+from django.test import TestCase
+
+from note.adapters.github_adapter import GithubAdapter
+from note.adapters.registry import storage_registry
+
+
+class NoteHookViewTestCase(TestCase):
+    SECRET = 'secret'
+
+    def setUp(self):
+        from note.models import NoteStorageServiceModel
+        self.addCleanup(storage_registry.clear)
+        user = get_user_model().objects.create(username='tester')
+        self.storage = NoteStorageServiceModel.objects.create(
+            service='Github',
+            user=user,
+            source='github',
+            credentials={
+                'owner': 'owner',
+                'repo': 'notes',
+                'branch': 'main',
+                'directory': '/docs',
+                'webhook_secret': self.SECRET,
+            },
+        )
+        self.body = json.dumps({'ref': 'refs/heads/main', 'commits': []}).encode()
+        patcher = mock.patch.object(GithubAdapter, 'apply_push', return_value={'updated': 1, 'removed': 0})
+        self.apply_push = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, source='github', event='push', **headers):
+        return self.client.post(
+            resolve_url('api_note_hook', source=source),
+            self.body,
+            content_type='application/json',
+            HTTP_X_GITHUB_EVENT=event,
+            **headers,
+        )
+
+    def get_signature(self, secret):
+        return 'sha256={}'.format(hmac.new(secret.encode(), self.body, hashlib.sha256).hexdigest())
+
+    def test_valid_signature(self):
+        response = self.post(HTTP_X_HUB_SIGNATURE_256=self.get_signature(self.SECRET))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'updated': 1, 'removed': 0})
+        self.apply_push.assert_called_once()
+
+    def test_invalid_signature(self):
+        self.assertEqual(self.post().status_code, 403)
+        self.assertEqual(self.post(HTTP_X_HUB_SIGNATURE_256=self.get_signature('other')).status_code, 403)
+        self.apply_push.assert_not_called()
+
+    def test_secret_is_not_set(self):
+        self.storage.credentials.pop('webhook_secret')
+        self.storage.save()
+        response = self.post(HTTP_X_HUB_SIGNATURE_256=self.get_signature(self.SECRET))
+        self.assertEqual(response.status_code, 403)
+        self.apply_push.assert_not_called()
+
+    def test_other_event(self):
+        response = self.post(event='ping')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'updated': 0, 'removed': 0})
+        self.assertEqual(self.post(source='unknown').status_code, 404)
+        self.apply_push.assert_not_called()
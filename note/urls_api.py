@@ -1,10 +1,25 @@
 from django.urls import path
 
-from note.views import note_hook_old
-from note.views_api import NoteView, NoteSearchView
+from note.views_api import (
+    NoteDanglingLinksView,
+    NoteHookView,
+    NoteJobView,
+    NoteLinksView,
+    NoteMetricsView,
+    NoteView,
+    NoteSearchView,
+    NoteSuggestView,
+    NoteTagCountsView,
+)
 
 urlpatterns = [
+    path('service/metrics/', NoteMetricsView.as_view(), name='api_note_metrics'),
+    path('hook/<str:source>/', NoteHookView.as_view(), name='api_note_hook'),
+    path('job/<int:pk>/', NoteJobView.as_view(), name='api_note_job'),
+    path('graph/dangling/', NoteDanglingLinksView.as_view(), name='api_note_dangling_links'),
+    path('graph/links/<str:title>/', NoteLinksView.as_view(), name='api_note_links'),
+    path('tags/counts/', NoteTagCountsView.as_view(), name='api_note_tag_counts'),
+    path('suggest/<str:prefix>/', NoteSuggestView.as_view(), name='api_note_suggest'),
     path('search/<str:query>/', NoteSearchView.as_view(), name='api_note_search'),
     path('<str:title>/', NoteView.as_view(), name='api_note'),
-    path('hook/', note_hook_old, name='api_note_hook'),
 ]
@@ -1,33 +1,29 @@
 import datetime
-import zipfile
 import os
-from io import BytesIO
+import tempfile
 from urllib.parse import unquote
 
-import yaml
-import requests
 from django.conf import settings
 from django.core.files.images import ImageFile
-from django.http import Http404, HttpResponse
-from django.shortcuts import render, redirect
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import render, redirect, resolve_url
+from django.utils.safestring import mark_safe
 from django.views import View
-from drf_spectacular.utils import extend_schema
-from markdownify.templatetags.markdownify import markdownify
-from rest_framework.decorators import api_view, renderer_classes
 from rest_framework.response import Response
-from rest_framework.renderers import JSONRenderer
 from rest_framework.schemas.openapi import AutoSchema
 from rest_framework.views import APIView
 from rest_framework import status
 
-from django_sy_framework.utils.logger import logger
-from note.adapters import get_storage_service, get_service_names, run_initiator
+from note.adapters import COPY_MODE_DIFF, COPY_MODE_FULL, get_storage_service, get_service_names
+from note.archive import DUPLICATE_OVERWRITE, DUPLICATE_SKIP, iter_storage_files, iter_zip
+from note.jobs import job_worker
 from note.models import (
     ImageNote,
     Note,
+    NoteJob,
     NoteStorageServiceModel,
-    prepare_to_search,
 )
+from note.render import excerpt_markdown, safe_markdown, safe_markdown_batch, separate_yaml
 from note.serializers import (
     ERROR_NAME_MESSAGE,
     NoteCreateViewSerializer,
@@ -47,119 +43,7 @@ from utils.constants import (
 )
 from utils.hooks import note_hook
 from utils.hook_meta import CreatedNote, CreatePageNote, ViewPageNote, UpdatedNote
-
-
-def separate_yaml(content):
-    content = content.strip()
-    lines = content.split('\n')
-    is_yaml = lines and lines[0] == '---'
-    data_yaml = {}
-    if is_yaml:
-        yaml_length = 4
-        for line in lines[1:]:
-            if line == '---':
-                break
-
-            yaml_length += len(line) + 1
-
-        data_yaml = yaml.load(content[:yaml_length], yaml.SafeLoader)
-        content = content[yaml_length + 4:].lstrip()
-
-    return data_yaml, content
-
-
-@extend_schema(
-    tags=['Заметки'],
-)
-@api_view(('POST',))
-@renderer_classes((JSONRenderer,))
-def note_hook_old(request):  # TODO: метод хука планируется перенести в адаптер базы. Сейчас хук не работает
-    """Хук для обновления заметок на сервере из принятого Pull Request'а на Github"""
-    data = {'files': {}}
-    action = request._request.headers.get('X-Github-Event')
-    if action == 'push':
-        repository = request.data.get('repository')
-        repo_name = repository.get('name')
-        owner_name = repository.get('owner').get('name')
-        if owner_name != settings.GITHUB_OWNER or repo_name != settings.GITHUB_REPO:
-            return Response(status=status.HTTP_200_OK, data={'message': 'repository or owner name has no access'})
-
-        session = requests.Session()
-        prefix = settings.GITHUB_DIRECTORY
-        removed = data['files'].setdefault('removed', set())
-        added = data['files'].setdefault('added', set())
-        modified = data['files'].setdefault('modified', set())
-        for commit in request.data['commits']:
-            data.setdefault('l', []).append({})
-            for action_type, files in data['files'].items():
-                for file in commit[action_type]:
-                    if not file.startswith(prefix):
-                        continue
-
-                    data['l'][-1].setdefault(action_type, []).append(file)
-                    if action_type == 'removed':
-                        if file in removed:
-                            removed.remove(file)
-
-                        if file in modified:
-                            modified.remove(file)
-
-                        files.add(file)
-                    elif action_type == 'modified':
-                        if file not in added:
-                            modified.add(file)
-                    elif action_type == 'added':
-                        if file in removed:
-                            removed.remove(file)
-
-                        files.add(file)
-
-        for action_type, files in data['files'].items():
-            for file in files:
-                title, _ = os.path.splitext(os.path.basename(file))
-                url = UploaderGithub.URL_ARCHIVE.format()
-                if action_type == 'removed':
-                    Note.objects.filter(title=title).delete()
-                elif action_type == 'modified':
-                    request = session.get(url)
-                    content = request.text
-                    note = Note.objects.filter(title=title).first()
-                    note.content = content
-                    note.search_content = prepare_to_search(content)
-                    note.save()
-                elif action_type == 'added':
-                    request = session.get(url)
-                    content = request.text
-                    note = Note(
-                        title=title,
-                        search_title=prepare_to_search(title),
-                        content=content,
-                        search_content=prepare_to_search(content),
-                    )
-                    note.save()
-
-        return Response(status=status.HTTP_200_OK, data=data)
-
-
-def safe_markdown(content, source):
-    error_message = None
-    content_html = None
-    content = content.replace('\r\n', '\n')
-    content_yaml, content_md = separate_yaml(content)
-    config = {
-        'utils.md_extensions.apply_source:ApplySourceExtension': {'source': source},
-        'utils.md_extensions.wiki_links:WikiLinksExtension': {'source': source},
-        'utils.md_extensions.tags_like_links:TagsLikeLinksExtension': {'source': source},
-    }
-    try:
-        content_html = markdownify(content_md, dynamic_extension_config=config)
-    except Exception as error:
-        import logging
-        import traceback
-        error_message = 'Заметка содержит синтаксическую ошибку'
-        logger.error('Ошибка парсинга заметки: %s \n %s' % (error, ''.join(traceback.format_exception(error))))
-
-    return content_yaml, content_html, error_message
+from utils.md_extensions.tags_like_links import TAG_REGEX
 
 
 class NoteView(View):
@@ -180,9 +64,17 @@ class NoteView(View):
         if not note:
             raise Http404('Заметка не найдена')
 
-        meta = ViewPageNote(source, note['title'], note['content'], request, True, note['user'])
+        meta = ViewPageNote(source, note['title'], note['content'], request, True, note['user'], uploader.storage)
         note_hook(BEFORE_OPEN_VIEW_PAGE, WEB, meta)
-        content_yaml, content_html, error_message = safe_markdown(meta.content, meta.source)
+        content_html = note.get('content_html')
+        if content_html is None:
+            content_yaml, content_html, error_message = safe_markdown(meta.content, meta.source)
+        else:
+            # the stored HTML was sanitized at rendering
+            content_html = mark_safe(content_html)
+            content_yaml, _ = separate_yaml(meta.content)
+            error_message = None
+
         context = {
             'note': {
                 'title': meta.title,
@@ -272,7 +164,7 @@ class NoteEditView(APIView):
                 return Response(status=status.HTTP_400_BAD_REQUEST, data=response_data)
 
             note_hook(BEFORE_CREATE, WEB, meta)
-            uploader.add(meta.title, meta.content, request.user)
+            meta.instance = uploader.add(meta.title, meta.content, request.user).get('instance')
             note_hook(CREATED, WEB, meta)
             self.save_images(meta.source, meta.title, request)
 
@@ -305,20 +197,43 @@ class NoteListView(View):
 
         try:
             with get_storage_service(source, user) as (uploader, source):
-                if search_string:
+                if search_string and TAG_REGEX.fullmatch(search_string):
+                    notes, meta = uploader.search_by_tag(
+                        search_string,
+                        count_on_page,
+                        page_number,
+                        ['title', 'content', 'excerpt_html'],
+                        with_count=False,
+                    )
+                elif search_string:
                     notes, meta = uploader.search(
-                        'or', count_on_page, page_number, ['title', 'content'], search_string, search_string,
+                        'or',
+                        count_on_page,
+                        page_number,
+                        ['title', 'content', 'excerpt_html'],
+                        search_string,
+                        search_string,
+                        with_count=False,
                     )
                 else:
                     notes, meta = uploader.get_list(page_number, count_on_page)
 
+                not_rendered_notes = []
                 for note in notes:
-                    content_yaml, content_html, error_message = safe_markdown(note['content'][:400], source)
-                    note['html'] = content_html
+                    note['html'] = note.get('excerpt_html')
+                    if note['html'] is None:
+                        not_rendered_notes.append(note)
+                    else:
+                        note['html'] = mark_safe(note['html'])
+
+                excerpts = [excerpt_markdown(separate_yaml(note['content'])[1]) for note in not_rendered_notes]
+                for note, result in zip(not_rendered_notes, safe_markdown_batch(excerpts, source)):
+                    content_yaml, note['html'], error_message = result
 
                 context.update({
                     'notes': notes,
-                    'last_page': meta['num_pages'],
+                    'last_page': meta.get('num_pages'),
+                    'has_next': meta['has_next'],
                     'source': source,
                 })
                 return render(request, 'note/note_list.html', context)
@@ -396,20 +311,11 @@ class NoteImportExportView(APIView):
         if command == 'download-archive':
             # information about all compress formats: https://docs.python.org/3/library/archiving.html
             source = request.GET['source-from']
-            archive_file = BytesIO()
-            with zipfile.ZipFile(archive_file, mode='w') as archive:
-                with get_storage_service(source) as (uploader, real_source):
-                    if source == real_source:
-                        page_number = 1
-                        meta = None
-                        while meta is None or page_number <= meta['num_pages']:
-                            notes, meta = uploader.get_list(page_number, 100)
-                            for note in notes:
-                                archive.writestr('{}/{}.md'.format(source, note['title']), note['content'])
-
-                            page_number += 1
-
-            response = HttpResponse(archive_file.getvalue(), content_type='application/zip')
+            with get_storage_service(source) as (_, real_source):
+                if source != real_source:
+                    raise Http404('База не найдена')
+
+            response = StreamingHttpResponse(iter_zip(iter_storage_files(source)), content_type='application/zip')
             datetime_str = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
             response['Content-Disposition'] = f'attachment; filename="notes-{datetime_str}.zip"'
             return response
@@ -425,17 +331,43 @@ class NoteImportExportView(APIView):
         return render(request, 'note/note_import_export.html', context)
 
     def post(self, request):
-        # TODO: Использовать web-сокеты для отображения ползунка и статистики на фронте
         if not request.user.is_authenticated:
             return Response(status=status.HTTP_401_UNAUTHORIZED)
 
-        total_count = 0
         command = request.data.get('command')
         if command == 'copy-from-to':
             source_to = request.data['source-to']
-            source_from = request.data['source-from']
-            for total_count in run_initiator(source_from, source_to):
-                ...
+            if not NoteStorageServiceModel.objects.filter(user=request.user, source=source_to).exists():
+                return Response(status=status.HTTP_403_FORBIDDEN)
+
+            mode = COPY_MODE_DIFF if request.data.get('mode') == COPY_MODE_DIFF else COPY_MODE_FULL
+            params = {'source_from': request.data['source-from'], 'source_to': source_to, 'mode': mode}
+            job = NoteJob.objects.create(kind=NoteJob.KIND_COPY, params=params, user=request.user)
+            job_worker.submit(job)
+            response_data = {'job_id': job.pk, 'job_url': resolve_url('api_note_job', pk=job.pk)}
+            return Response(status=status.HTTP_202_ACCEPTED, data=response_data)
+        elif command == 'upload-archive':
+            source_to = request.data['source-to']
+            archive = request.FILES.get('archive')
+            if not NoteStorageServiceModel.objects.filter(user=request.user, source=source_to).exists():
+                return Response(status=status.HTTP_403_FORBIDDEN)
+
+            if not archive:
+                return Response(status=status.HTTP_400_BAD_REQUEST, data={'archive': ['Архив не загружен']})
+
+            on_duplicate = request.data.get('on-duplicate')
+            on_duplicate = DUPLICATE_OVERWRITE if on_duplicate == DUPLICATE_OVERWRITE else DUPLICATE_SKIP
+            import_dir = getattr(settings, 'NOTE_IMPORT_DIR', tempfile.gettempdir())
+            file_descriptor, path = tempfile.mkstemp(prefix='note-import-', dir=import_dir)
+            with os.fdopen(file_descriptor, 'wb') as archive_file:
+                for chunk in archive.chunks():
+                    archive_file.write(chunk)
+
+            params = {'path': path, 'source_to': source_to, 'on_duplicate': on_duplicate}
+            job = NoteJob.objects.create(kind=NoteJob.KIND_IMPORT, params=params, user=request.user)
+            job_worker.submit(job)
+            response_data = {'job_id': job.pk, 'job_url': resolve_url('api_note_job', pk=job.pk)}
+            return Response(status=status.HTTP_202_ACCEPTED, data=response_data)
         elif command == 'clear':
             source_to = request.data['source-to']
             with get_storage_service(source_to, request.user) as (uploader, source):
@@ -446,5 +378,4 @@ class NoteImportExportView(APIView):
         else:
             return Response(status=status.HTTP_400_BAD_REQUEST, data={'command': ['Неизвестная команда']})
 
-        response_data = {'total_count': total_count}
-        return Response(status=status.HTTP_200_OK, data=response_data)
+        return Response(status=status.HTTP_200_OK, data={'total_count': 0})
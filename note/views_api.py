@@ -1,3 +1,5 @@
+import hashlib
+import hmac
 from urllib.parse import unquote
 
 from django.conf import settings
@@ -8,14 +10,27 @@ from rest_framework.views import APIView
 
 from django_sy_framework.token.views import AllowAnyMixin, LoginRequiredMixin
 from note.adapters import get_storage_service
+from note.adapters.base_adapter import BaseAdapter
+from note.adapters.http_client import get_http_stats
+from note.adapters.github_adapter import GithubAdapter
+from note.models import NoteJob, NoteLink, NoteStorageServiceModel
+from note.render import render_cache
 from note.serializers import ERROR_NAME_MESSAGE
 from note.serializers_api import (
     NoteAddViewSerializer,
     NoteEditViewSerializer,
     ErroResponseSerializer,
+    NoteDanglingLinksResponseSerializer,
+    NoteDanglingLinksViewSerializer,
+    NoteJobSerializer,
+    NoteLinksResponseSerializer,
     NoteResponseSerializer,
     NoteSearchViewSerializer,
     NoteSearchResponseSerializer,
+    NoteSuggestResponseSerializer,
+    NoteSuggestViewSerializer,
+    NoteTagCountsResponseSerializer,
+    NoteTagCountsViewSerializer,
 )
 from utils.constants import (
     API,
@@ -29,7 +44,7 @@ from utils.constants import (
     DELETED,
     UPDATED,
 )
-from utils.hooks import note_hook
+from utils.hooks import hook_registry, note_hook
 from utils.hook_meta import CreatedNote, DeletedNote, UpdatedNote
 
 source_parametr = OpenApiParameter(
@@ -86,22 +101,29 @@ class NoteSearchView(AllowAnyMixin, APIView):
         file_content = query if search_by in ('content', 'all') else None
         fields = ('title', 'content') if fields == 'all' else (fields,)
 
+        with_count = data['count_mode'] == NoteSearchViewSerializer.COUNT_MODE_EXACT
         with get_storage_service(request.GET.get('source')) as (uploader, source):
-            notes, meta = uploader.search(
-                operator=data['operator'],
-                count_on_page=count_on_page,
-                page_number=page_number,
-                fields=fields,
-                file_name=file_name,
-                file_content=file_content,
-            )
+            if search_by == NoteSearchViewSerializer.SEARCH_BY_TAG:
+                notes, meta = uploader.search_by_tag(query, count_on_page, page_number, fields, with_count)
+            else:
+                search = uploader.search_fuzzy if data['fuzzy'] else uploader.search
+                notes, meta = search(
+                    operator=data['operator'],
+                    count_on_page=count_on_page,
+                    page_number=page_number,
+                    fields=fields,
+                    file_name=file_name,
+                    file_content=file_content,
+                    with_count=with_count,
+                )
             response_data = {
                 'results': notes,
                 'source': source,
                 'count_on_page': count_on_page,
                 'page_number': page_number,
-                'pages': meta['num_pages'],
-                'count': meta['count']
+                'pages': meta.get('num_pages'),
+                'count': meta.get('count'),
+                'has_next': meta['has_next'],
             }
 
         return Response(status=status.HTTP_200_OK, data=response_data)
@@ -128,6 +150,7 @@ class NoteView(LoginRequiredMixin, APIView):
                 return Response(status=status.HTTP_404_NOT_FOUND, data={'detail': 'Заметка не найдена'})
 
             note_data['source'] = source
+            note_data.pop('content_html', None)
             if note_data['user']:
                 note_data['user'] = note_data['user'].username
 
@@ -165,7 +188,7 @@ class NoteView(LoginRequiredMixin, APIView):
                 return Response(status=status.HTTP_422_UNPROCESSABLE_ENTITY, data=data)
 
             note_hook(BEFORE_CREATE, API, meta)
-            uploader.add(meta.title, meta.content, request.user)
+            meta.instance = uploader.add(meta.title, meta.content, request.user).get('instance')
             note_hook(CREATED, API, meta)
 
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -250,3 +273,203 @@ class NoteView(LoginRequiredMixin, APIView):
             note_hook(DELETED, API, meta)
 
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class NoteHookView(AllowAnyMixin, APIView):
+    """Класс метода хука Github для синхронизации заметок базы после push'а в её ветку"""
+
+    @staticmethod
+    def is_valid_signature(request, secret):
+        signature = 'sha256={}'.format(hmac.new(secret.encode(), request.body, hashlib.sha256).hexdigest())
+        return hmac.compare_digest(signature, request.headers.get('X-Hub-Signature-256', ''))
+
+    @extend_schema(
+        request=None,
+        parameters=[
+            OpenApiParameter(name='source', description='Название базы', location=OpenApiParameter.PATH),
+        ],
+        responses={200: None, 403: ErroResponseSerializer, 404: ErroResponseSerializer},
+        tags=['Заметки'],
+        summary='Хук Github',
+    )
+    def post(self, request, source):
+        """Метод синхронизации изменённых, добавленных и удалённых в push'е заметок"""
+        storage = NoteStorageServiceModel.objects.filter(source=source).first()
+        if not storage or storage.service != GithubAdapter.__name__[:-7]:
+            return Response(status=status.HTTP_404_NOT_FOUND, data={'detail': 'База Github не найдена'})
+
+        if request.headers.get('X-Github-Event') != 'push':
+            return Response(status=status.HTTP_200_OK, data={'updated': 0, 'removed': 0})
+
+        secret = storage.credentials.get('webhook_secret')
+        if not secret:
+            return Response(status=status.HTTP_403_FORBIDDEN, data={'detail': 'Секрет вебхука не задан для базы'})
+
+        if not self.is_valid_signature(request, secret):
+            return Response(status=status.HTTP_403_FORBIDDEN, data={'detail': 'Неверная подпись запроса'})
+
+        with get_storage_service(storage.source) as (uploader, _):
+            response_data = uploader.apply_push(request.data)
+
+        return Response(status=status.HTTP_200_OK, data=response_data)
+
+
+class NoteJobView(LoginRequiredMixin, APIView):
+    """Класс метода получения прогресса фоновой задачи"""
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='pk', description='Идентификатор задачи', location=OpenApiParameter.PATH),
+        ],
+        responses={200: NoteJobSerializer, 404: ErroResponseSerializer},
+        tags=['Заметки'],
+        summary='Получить прогресс задачи',
+    )
+    def get(self, request, pk):
+        """Метод получения прогресса задачи.
+
+        Клиент опрашивает метод до завершения задачи, поэтому запрос не занимает обработчик сервера надолго.
+        """
+        job = NoteJob.objects.filter(pk=pk, user=request.user).first()
+        if not job:
+            return Response(status=status.HTTP_404_NOT_FOUND, data={'detail': 'Задача не найдена'})
+
+        return Response(status=status.HTTP_200_OK, data=NoteJobSerializer(job).data)
+
+
+class NoteMetricsView(LoginRequiredMixin, APIView):
+    """Класс метода получения метрик производительности сервиса"""
+
+    @extend_schema(
+        responses={200: None, 403: ErroResponseSerializer},
+        tags=['Заметки'],
+        summary='Получить метрики производительности',
+    )
+    def get(self, request):
+        """Метод получения метрик. Доступен только сотрудникам"""
+        if not request.user.is_staff:
+            return Response(status=status.HTTP_403_FORBIDDEN, data={'detail': 'Нет прав для просмотра метрик'})
+
+        response_data = {
+            'render_cache': render_cache.stats(),
+            'http': get_http_stats(),
+            'hooks': hook_registry.stats(),
+        }
+        return Response(status=status.HTTP_200_OK, data=response_data)
+
+
+class NoteLinksView(AllowAnyMixin, APIView):
+    """Класс метода получения ссылок заметки"""
+
+    @extend_schema(
+        parameters=[
+            source_parametr,
+            OpenApiParameter(name='title', description='имя заметки', location=OpenApiParameter.PATH),
+        ],
+        responses={200: NoteLinksResponseSerializer},
+        tags=['Заметки'],
+        summary='Получить обратные и исходящие ссылки заметки',
+    )
+    def get(self, request, title):
+        """Метод получения заметок, которые ссылаются на заметку, и заметок, на которые она ссылается"""
+        title = unquote(title)
+        with get_storage_service(request.GET.get('source')) as (uploader, source):
+            backlinks = NoteLink.get_backlinks(source, title).values_list('storage__source', 'title')
+            outgoing = NoteLink.get_outgoing(uploader.storage, title).values_list(
+                'target_source', 'target_title', 'is_existed',
+            )
+            response_data = {
+                'source': source,
+                'title': title,
+                'backlinks': [{'source': link_source, 'title': link_title} for link_source, link_title in backlinks],
+                'outgoing': [
+                    {'source': link_source, 'title': link_title, 'is_existed': is_existed}
+                    for link_source, link_title, is_existed in outgoing
+                ],
+            }
+
+        return Response(status=status.HTTP_200_OK, data=response_data)
+
+
+class NoteDanglingLinksView(AllowAnyMixin, APIView):
+    """Класс метода получения ссылок на несуществующие заметки"""
+
+    @extend_schema(
+        parameters=[source_parametr, NoteDanglingLinksViewSerializer],
+        responses={200: NoteDanglingLinksResponseSerializer},
+        tags=['Заметки'],
+        summary='Получить ссылки базы на несуществующие заметки',
+    )
+    def get(self, request):
+        """Метод получения ссылок заметок базы на несуществующие заметки"""
+        serializer = NoteDanglingLinksViewSerializer(data=request.GET)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        count_on_page = data['count_on_page']
+        page_number = data['page_number']
+        with get_storage_service(request.GET.get('source')) as (uploader, source):
+            links = NoteLink.get_dangling(uploader.storage).values_list('note__title', 'target_source', 'target_title')
+            links, meta = BaseAdapter.paginate(links, page_number, count_on_page)
+            response_data = {
+                'results': [
+                    {'title': title, 'target_source': target_source, 'target_title': target_title}
+                    for title, target_source, target_title in links
+                ],
+                'source': source,
+                'count_on_page': count_on_page,
+                'page_number': page_number,
+                'pages': meta['num_pages'],
+                'count': meta['count'],
+                'has_next': meta['has_next'],
+            }
+
+        return Response(status=status.HTTP_200_OK, data=response_data)
+
+
+class NoteTagCountsView(AllowAnyMixin, APIView):
+    """Класс метода получения самых используемых тегов"""
+
+    @extend_schema(
+        parameters=[source_parametr, NoteTagCountsViewSerializer],
+        responses={200: NoteTagCountsResponseSerializer},
+        tags=['Заметки'],
+        summary='Получить теги базы с количеством заметок',
+    )
+    def get(self, request):
+        """Метод получения тегов базы, упорядоченных по убыванию количества заметок с ними"""
+        serializer = NoteTagCountsViewSerializer(data=request.GET)
+        serializer.is_valid(raise_exception=True)
+        with get_storage_service(request.GET.get('source')) as (uploader, source):
+            response_data = {
+                'source': source,
+                'results': uploader.get_tag_counts(serializer.validated_data['limit']),
+            }
+
+        return Response(status=status.HTTP_200_OK, data=response_data)
+
+
+class NoteSuggestView(AllowAnyMixin, APIView):
+    """Класс метода подсказки заголовков заметок"""
+
+    @extend_schema(
+        parameters=[
+            source_parametr,
+            NoteSuggestViewSerializer,
+            OpenApiParameter(name='prefix', description='начало заголовка', location=OpenApiParameter.PATH),
+        ],
+        responses={200: NoteSuggestResponseSerializer},
+        tags=['Заметки'],
+        summary='Подсказать заголовки заметок по началу',
+    )
+    def get(self, request, prefix):
+        """Метод получения заголовков заметок, которые начинаются с префикса без учёта регистра"""
+        serializer = NoteSuggestViewSerializer(data=request.GET)
+        serializer.is_valid(raise_exception=True)
+        with get_storage_service(request.GET.get('source')) as (uploader, source):
+            response_data = {
+                'source': source,
+                'results': uploader.suggest(unquote(prefix), serializer.validated_data['limit']),
+            }
+
+        return Response(status=status.HTTP_200_OK, data=response_data)
@@ -11,6 +11,7 @@ class CreatedNote:
     request: 'django.http.HttpRequest' = None
     adapter: 'note.adapters.base_adapter.BaseAdapter' = None
     errors: dict = field(default_factory=dict)
+    instance: 'note.models.Note' = None
 
 
 @dataclass
@@ -48,3 +49,4 @@ class ViewPageNote:
     request: 'django.http.HttpRequest' = None
     has_access_to_edit: bool = True
     user: get_user_model() = None
+    storage: 'note.models.NoteStorageServiceModel' = None
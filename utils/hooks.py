@@ -1,8 +1,12 @@
+import threading
+import time
+
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.utils.module_loading import import_string
 
 from django_sy_framework.linker.utils import link_instance_from_request
-from note.models import Note, NoteStorageServiceModel
+from note.models import NoteStorageServiceModel
 from utils.constants import (
     API,
     BEFORE_CREATE,
@@ -60,12 +64,12 @@ class LinkerHook:
 
     @staticmethod
     def created(context, meta):
+        """The note is linked by the instance created by the adapter, storages of other services have no instance"""
         source = meta.source
-        if context == WEB:
+        if context == WEB and meta.instance is not None:
             link_to = meta.request.GET.get('link_to') or (source[1:] if source.startswith('.project-') else None)
             if link_to:
-                instance = Note.objects.filter(title=meta.title, storage=meta.adapter.storage).first()
-                link_instance_from_request(instance, link_to)
+                link_instance_from_request(meta.instance, link_to)
 
 
 class AccessHook:
@@ -81,7 +85,7 @@ class AccessHook:
 
     def before_open_view_page(self, context, meta):
         if context == WEB:
-            storage = NoteStorageServiceModel.objects.filter(source=meta.source).first()
+            storage = meta.storage or NoteStorageServiceModel.objects.filter(source=meta.source).first()
             if not self.has_access_to_storage(meta.request, storage):
                 meta.has_access_to_edit = False
             elif not self.has_access_to_note(meta.request, meta):
@@ -129,16 +133,84 @@ class HiddenFileHook:
             meta.errors['title'] = [self.ERROR_NAME_MESSAGE]
 
 
-def note_hook(lifecycle, context, meta):
-    hook_classes = [HiddenFileHook, AccessHook, LinkerHook]
-    hook_method_name = HOOK_METHOD_NAMES[lifecycle]
-    for hook_class in hook_classes:
-        if hasattr(hook_class, hook_method_name):
-            hook = hook_class()
-            getattr(hook, hook_method_name)(context, meta)
+DEFAULT_HOOKS = (
+    'utils.hooks.HiddenFileHook',
+    'utils.hooks.AccessHook',
+    'utils.hooks.LinkerHook',
+)
+
+
+class HookRegistry:
+    """Dispatch table of hooks of notes' lifecycle.
+
+    Hooks are instantiated once, and the table of their bound methods by lifecycles is built once,
+    by default from `NOTE_HOOKS` setting containing import paths of hook classes. Hooks are called in the order
+    of the setting, till a hook denies access or adds errors. Time spent by every hook method is recorded.
+    """
+
+    def __init__(self, hook_paths=None):
+        self.hook_paths = hook_paths
+        self.table = None
+        self.lock = threading.Lock()
+        self.timings = {}
+
+    def build(self):
+        hook_paths = self.hook_paths
+        if hook_paths is None:
+            hook_paths = getattr(settings, 'NOTE_HOOKS', DEFAULT_HOOKS)
+
+        table = {lifecycle: [] for lifecycle in HOOK_METHOD_NAMES}
+        for hook_path in hook_paths:
+            self.add_to_table(table, import_string(hook_path))
+
+        self.table = table
+        return table
+
+    @staticmethod
+    def add_to_table(table, hook_class):
+        hook = hook_class()
+        for lifecycle, method_name in HOOK_METHOD_NAMES.items():
+            method = getattr(hook, method_name, None)
+            if method is not None:
+                table[lifecycle].append((f'{hook_class.__name__}.{method_name}', method))
+
+    def register(self, hook_class):
+        """Add a hook after the hooks of the setting"""
+        with self.lock:
+            self.add_to_table(self.table or self.build(), hook_class)
+
+    def dispatch(self, lifecycle, context, meta):
+        table = self.table or self.build()
+        for name, method in table[lifecycle]:
+            start_time = time.perf_counter()
+            try:
+                method(context, meta)
+            finally:
+                self.record_timing(name, time.perf_counter() - start_time)
+
             success = (
                 getattr(meta, 'has_access_to_edit', True) and not getattr(meta, 'errors', False)
             )
             if not success:
                 break
 
+    def record_timing(self, name, elapsed_time):
+        with self.lock:
+            timing = self.timings.setdefault(name, {'calls': 0, 'total_time': 0.0, 'max_time': 0.0})
+            timing['calls'] += 1
+            timing['total_time'] += elapsed_time
+            timing['max_time'] = max(timing['max_time'], elapsed_time)
+
+    def stats(self):
+        with self.lock:
+            return {
+                name: {**timing, 'average_time': timing['total_time'] / timing['calls']}
+                for name, timing in self.timings.items()
+            }
+
+
+hook_registry = HookRegistry()
+
+
+def note_hook(lifecycle, context, meta):
+    hook_registry.dispatch(lifecycle, context, meta)
@@ -1,3 +1,4 @@
+import re
 from urllib.parse import urlparse, parse_qs
 
 from django.conf import settings
@@ -8,6 +9,39 @@ from markdown.treeprocessors import Treeprocessor
 from note.models import NoteStorageServiceModel
 from django_sy_framework.utils.logger import logger
 
+OBSIDIAN_URL_PATTERN = re.compile(r'obsidian://open\?([^\s()<>"\']+)')
+
+
+def collect_vaults(text):
+    """Return names of vaults from Obsidian links of Markdown text without parsing"""
+    vaults = set()
+    for match in OBSIDIAN_URL_PATTERN.finditer(text):
+        vaults.update(parse_qs(match.group(1).replace('&amp;', '&')).get('vault', ()))
+
+    return vaults
+
+
+def collect_obsidian_links(text):
+    """Return pairs `(vault, title)` of Obsidian links of Markdown text without parsing"""
+    links = set()
+    for match in OBSIDIAN_URL_PATTERN.finditer(text):
+        query = parse_qs(match.group(1).replace('&amp;', '&'))
+        vault = query.get('vault')
+        file = query.get('file')
+        if vault and file:
+            title = file[0][:-3] if file[0].endswith('.md') else file[0]
+            links.add((vault[0], title))
+
+    return links
+
+
+def resolve_sources(sources):
+    """Return `dict` like `{source: is_existed}`"""
+    existed_sources = set(
+        NoteStorageServiceModel.objects.filter(source__in=sources).values_list('source', flat=True),
+    )
+    return {source: source in existed_sources for source in sources}
+
 
 def collect_link_elements(root):
     links = []
@@ -37,11 +71,14 @@ def collect_link_elements(root):
 class ObsidianLinksTreeprocessor(Treeprocessor):
     def run(self, root):
         links, sources = collect_link_elements(root)
-        existed_sources = set(
-            NoteStorageServiceModel.objects.filter(source__in=sources).values_list('source', flat=True),
-        )
+        # sources may be resolved beforehand for a batch of notes, see `note.render.safe_markdown_batch`
+        resolved_sources = getattr(self.md, 'resolved_sources', None) or {}
+        unresolved_sources = sources - resolved_sources.keys()
+        if unresolved_sources:
+            resolved_sources = {**resolved_sources, **resolve_sources(unresolved_sources)}
+
         for link, title, source in links:
-            if source in existed_sources:
+            if resolved_sources[source]:
                 new_url = resolve_url('note_editor2', source=source, quoted_title=title[:-3])
                 link.set('href', new_url)
 
@@ -6,6 +6,7 @@ from markdown.preprocessors import Preprocessor
 from markdown.extensions import Extension
 
 TAG_PATTERN = rf'(?:^|[\s])(#[a-zA-Zа-яА-ЯёЁ][a-zA-Z0-9а-яА-ЯёЁ_-]*)'
+TAG_REGEX = re.compile(TAG_PATTERN)
 
 
 class TagsLikeLinksInlineProcessor(Preprocessor):
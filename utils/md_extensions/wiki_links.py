@@ -1,8 +1,25 @@
+import re
+
 from django.shortcuts import resolve_url
 from markdown.inlinepatterns import InlineProcessor
 from markdown.extensions import Extension
 import xml.etree.ElementTree as etree
 
+NOT_VERT_PATTERN = r'(?:[^|]|\\\|)'
+LINK_PATTERN = rf'\[\[({NOT_VERT_PATTERN}*?)(\|{NOT_VERT_PATTERN}*?)?\]\]'  # like [[note title]] or [[note title|view title]]
+LINK_REGEX = re.compile(LINK_PATTERN)
+
+
+def collect_wiki_titles(text):
+    """Return titles of notes linked by wiki links of Markdown text without parsing"""
+    titles = set()
+    for match in LINK_REGEX.finditer(text):
+        title = (match.group(1) or '').strip().replace('\\|', '|')
+        if title:
+            titles.add(title)
+
+    return titles
+
 
 class WikiLinksInlineProcessor(InlineProcessor):
     def __init__(self, pattern, md, source):
@@ -45,7 +62,5 @@ class WikiLinksExtension(Extension):
         </ul>
         ```
         """
-        NOT_VERT_PATTERN = r'(?:[^|]|\\\|)'
-        LINK_PATTERN = rf'\[\[({NOT_VERT_PATTERN}*?)(\|{NOT_VERT_PATTERN}*?)?\]\]'  # like [[note title]] or [[note title|view title]]
         source = self.getConfig('source')
         md.inlinePatterns.register(WikiLinksInlineProcessor(LINK_PATTERN, md, source), 'wiki_links', 10)